@@ -0,0 +1,410 @@
+from SdpDefs import SdpTerms
+
+# A hand-written, line oriented alternative to the grammar in PyParsingSdpDefs.  Each line is split off on its
+#  own, dispatched on its 'x=' type character and turned into the same nested (dict/list/string) structure the
+#  pyparsing grammar produces, so the objects in Sdp.py can be built from either one.
+# For every input the pyparsing grammar parses completely this gives the same result.  Things to note:
+#  - a typed a= line (rtpmap, mid, group, etc.) whose value doesn't fit that attribute's grammar becomes a
+#    generic application line, just like the MatchFirst alternation in the grammar falls through to
+#    application_line_generic
+#  - fields are bounded by the end of their line, so a malformed line raises a ValueError instead of pyparsing
+#    silently stopping at it and dropping everything after it
+
+# Generic types
+nettypes = ("IN",)
+addrtypes = ("IP4", "IP6")
+directions = ("sendonly", "sendrecv", "recvonly")
+alpha_chars = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+alphanum_chars = alpha_chars | frozenset("0123456789")
+ice_chars = alphanum_chars | frozenset("+/")
+token_chars = alphanum_chars | frozenset("-")
+# The characters of an RFC 4566 token (codec names like telephone-event or flexfec-03 are tokens)
+rfc_token_chars = alphanum_chars | frozenset("!#$%&'*+-.^_`{|}~")
+
+def is_word(value, chars=alphanum_chars):
+    return bool(value) and chars.issuperset(value)
+
+def is_ip_addr(value):
+    octets = value.split(".")
+    return len(octets) == 4 and all(octet.isdigit() and len(octet) <= 3 for octet in octets)
+
+def split_fields(line, value, count):
+    fields = value.split()
+    if len(fields) != count:
+        raise ValueError("Expected %d fields in line '%s'" % (count, line))
+    return fields
+
+# ---- Session level lines ----
+def parse_version_line(line):
+    return {"VERSION_NUMBER": line[2:].strip()}
+
+def parse_originator_line(line):
+    username, session_id, session_version, nettype, addrtype, ip_addr = split_fields(line, line[2:], 6)
+    return {"USERNAME": username,
+            "SESSION_ID": session_id,
+            "SESSION_VERSION": session_version,
+            "NETTYPE": nettype,
+            "ADDRTYPE": addrtype,
+            "IP_ADDR": ip_addr}
+
+def parse_session_name_line(line):
+    return {"SESSION_NAME": line[2:]}
+
+def parse_session_information_line(line):
+    return {"SESSION_INFORMATION": line[2:]}
+
+def parse_uri_line(line):
+    return {"URI": line[2:]}
+
+def parse_email_address_line(line):
+    return {"EMAIL_ADDRESS": line[2:]}
+
+def parse_phone_number_line(line):
+    return {"PHONE_NUMBER": line[2:]}
+
+def parse_connection_information_line(line):
+    nettype, addrtype, ip_addr = split_fields(line, line[2:], 3)
+    return {"NETTYPE": nettype,
+            "ADDRTYPE": addrtype,
+            "IP_ADDR": ip_addr}
+
+def parse_bandwidth_information_line(line):
+    bwtype, sep, bw = line[2:].partition(":")
+    if not sep:
+        raise ValueError("Expected '<bwtype>:<bandwidth>' in line '%s'" % line)
+    return {"BWTYPE": bwtype.strip(),
+            "BW": bw.strip()}
+
+def parse_time_description_line(line):
+    start_time, stop_time = split_fields(line, line[2:], 2)
+    return {"START_TIME": start_time,
+            "STOP_TIME": stop_time}
+
+def parse_media_description_line(line):
+    fields = line[2:].split()
+    if len(fields) < 4:
+        raise ValueError("Expected media type, port, proto and at least one format in line '%s'" % line)
+    return {"MEDIA_TYPE": fields[0],
+            "PORT": fields[1],
+            "PROTO": fields[2],
+            "FORMATS": fields[3:]}
+
+# ---- Application line ----
+# Each attribute parser takes the value after the 'name:' prefix and returns the sub-line fields, or None if
+#  the value doesn't fit that attribute (in which case the line is treated as a generic application line)
+def parse_rtcp_attribute(value):
+    fields = value.split()
+    if not fields or not fields[0].isdigit():
+        return None
+    res = {"PORT": fields[0]}
+    # The trailing fields are each optional, but the ones that are there have to appear in this order
+    optional_fields = [("NETTYPE", lambda x: x in nettypes),
+                       ("ADDRTYPE", lambda x: x in addrtypes),
+                       ("IP_ADDR", is_ip_addr)]
+    for field in fields[1:]:
+        while optional_fields and not optional_fields[0][1](field):
+            optional_fields.pop(0)
+        if not optional_fields:
+            return None
+        res[optional_fields.pop(0)[0]] = field
+    return res
+
+def parse_ice_ufrag_attribute(value):
+    value = value.strip()
+    return {"USERNAME": value} if is_word(value, ice_chars) else None
+
+def parse_ice_pwd_attribute(value):
+    value = value.strip()
+    return {"PASSWORD": value} if is_word(value, ice_chars) else None
+
+def parse_group_attribute(value):
+    fields = value.split()
+    if len(fields) < 2 or not all(is_word(field) for field in fields):
+        return None
+    return {"PURPOSE": fields[0],
+            "IDS": fields[1:]}
+
+def parse_mid_attribute(value):
+    value = value.strip()
+    return {"ID": value} if is_word(value) else None
+
+def parse_rtpmap_attribute(value):
+    pt, _, codec_info = value.lstrip().partition(" ")
+    if not pt.isdigit():
+        return None
+    encoding_name, sep, rest = codec_info.lstrip().partition("/")
+    if not sep or not is_word(encoding_name, rfc_token_chars):
+        return None
+    clock_rate, sep, encoding_parameters = rest.partition("/")
+    if not clock_rate.isdigit():
+        return None
+    codec_info = {"ENCODING_NAME": encoding_name,
+                  "CLOCK_RATE": clock_rate}
+    if sep:
+        codec_info["ENCODING_PARAMETERS"] = encoding_parameters
+    return {"PT": pt,
+            SdpTerms.RTPMAP_CODEC_INFO: codec_info}
+
+# The fields of a candidate attribute's value: (the fields, raddr, rport, tcptype, extensions), the optional ones None
+#  if they aren't there.  The first eight fields are the foundation, component, transport, priority, address, port,
+#  "typ" and type.  None if the value isn't a candidate
+def split_candidate_attribute(value):
+    fields = value.split()
+    # (Split fields are never empty, so issuperset does the same as is_word here)
+    if (len(fields) < 8 or fields[6] != "typ" or not fields[1].isdigit() or not fields[3].isdigit() or
+            not fields[5].isdigit() or not ice_chars.issuperset(fields[0]) or not alphanum_chars.issuperset(fields[2]) or
+            not alphanum_chars.issuperset(fields[7])):
+        return None
+    # Then raddr, rport and tcptype, each optional but in that order, and the rest are extension attribute
+    #  name/value pairs
+    raddr = rport = tcptype = extensions = None
+    pos = 8
+    count = len(fields)
+    if pos + 1 < count and fields[pos] == "raddr":
+        raddr = fields[pos + 1]
+        pos += 2
+    if pos + 1 < count and fields[pos] == "rport" and fields[pos + 1].isdigit():
+        rport = fields[pos + 1]
+        pos += 2
+    if pos + 1 < count and fields[pos] == "tcptype" and is_word(fields[pos + 1]):
+        tcptype = fields[pos + 1]
+        pos += 2
+    if (count - pos) % 2:
+        return None
+    if pos < count:
+        extensions = fields[pos:]
+    return fields, raddr, rport, tcptype, extensions
+
+def parse_candidate_attribute(value):
+    candidate = split_candidate_attribute(value)
+    if candidate is None:
+        return None
+    fields, raddr, rport, tcptype, extensions = candidate
+    res = {"FOUNDATION": fields[0],
+           "COMPONENT": fields[1],
+           "TRANSPORT": fields[2],
+           "PRIORITY": fields[3],
+           "ADDRESS": fields[4],
+           "PORT": fields[5],
+           "TYPE": fields[7]}
+    if raddr is not None:
+        res["RADDR"] = raddr
+    if rport is not None:
+        res["RPORT"] = rport
+    if tcptype is not None:
+        res["TCPTYPE"] = tcptype
+    if extensions is not None:
+        res["EXTENSIONS"] = extensions
+    return res
+
+def parse_fmtp_attribute(value):
+    fields = value.split(None, 1)
+    if len(fields) != 2 or not fields[0].isdigit():
+        return None
+    return {"PT": fields[0],
+            "PARAMETERS": fields[1].strip()}
+
+def parse_rtcp_fb_attribute(value):
+    fields = value.split(None, 2)
+    if len(fields) < 2 or not (fields[0].isdigit() or fields[0] == "*") or not is_word(fields[1], token_chars):
+        return None
+    res = {"PT": fields[0],
+           "TYPE": fields[1]}
+    if len(fields) == 3:
+        res["PARAMETERS"] = fields[2].strip()
+    return res
+
+def parse_extmap_attribute(value):
+    fields = value.split(None, 2)
+    if len(fields) < 2:
+        return None
+    extension_id, sep, direction = fields[0].partition("/")
+    if not extension_id.isdigit() or (sep and not is_word(direction, alpha_chars)):
+        return None
+    res = {"ID": extension_id,
+           "URI": fields[1]}
+    if sep:
+        res["DIRECTION"] = direction
+    if len(fields) == 3:
+        res["ATTRIBUTES"] = fields[2].strip()
+    return res
+
+def parse_ssrc_attribute(value):
+    fields = value.split(None, 1)
+    if len(fields) != 2 or not fields[0].isdigit():
+        return None
+    attribute, sep, attribute_value = fields[1].rstrip().partition(":")
+    attribute_value = attribute_value.strip()
+    if not is_word(attribute, token_chars) or (sep and not attribute_value):
+        return None
+    res = {"SSRC": fields[0],
+           "ATTRIBUTE": attribute}
+    if sep:
+        res["VALUE"] = attribute_value
+    return res
+
+def parse_ssrc_group_attribute(value):
+    fields = value.split()
+    if len(fields) < 2 or not is_word(fields[0], token_chars) or not all(field.isdigit() for field in fields[1:]):
+        return None
+    return {"SEMANTICS": fields[0],
+            "SSRCS": fields[1:]}
+
+# Attributes of the form 'a=<name>:<value>' (and property attributes, 'a=<name>', registered through
+#  Sdp.register_attribute; their parser gets an empty value), keyed by name
+value_attribute_parsers = {"rtcp": (SdpTerms.RTCP_APPLICATION_LINE, parse_rtcp_attribute),
+                           "ice-ufrag": (SdpTerms.ICE_UFRAG_APPLICATION_LINE, parse_ice_ufrag_attribute),
+                           "ice-pwd": (SdpTerms.ICE_PWD_APPLICATION_LINE, parse_ice_pwd_attribute),
+                           "group": (SdpTerms.GROUP_APPLICATION_LINE, parse_group_attribute),
+                           "mid": (SdpTerms.MID_APPLICATION_LINE, parse_mid_attribute),
+                           "rtpmap": (SdpTerms.RTPMAP_APPLICATION_LINE, parse_rtpmap_attribute),
+                           "candidate": (SdpTerms.CANDIDATE_APPLICATION_LINE, parse_candidate_attribute),
+                           "fmtp": (SdpTerms.FMTP_APPLICATION_LINE, parse_fmtp_attribute),
+                           "rtcp-fb": (SdpTerms.RTCP_FB_APPLICATION_LINE, parse_rtcp_fb_attribute),
+                           "extmap": (SdpTerms.EXTMAP_APPLICATION_LINE, parse_extmap_attribute),
+                           "ssrc": (SdpTerms.SSRC_APPLICATION_LINE, parse_ssrc_attribute),
+                           "ssrc-group": (SdpTerms.SSRC_GROUP_APPLICATION_LINE, parse_ssrc_group_attribute)}
+
+def register_attribute_parser(name, term, parser):
+    value_attribute_parsers[name] = (term, parser)
+
+def parse_application_line(line):
+    content = line[2:]
+    stripped = content.strip()
+    if stripped in directions:
+        return {SdpTerms.DIRECTION_APPLICATION_LINE: {"DIRECTION": stripped}}
+    if stripped == "rtcp-mux":
+        return {SdpTerms.RTCP_MUX_APPLICATION_LINE: {"RTCP_MUX": stripped}}
+    name, sep, value = content.partition(":")
+    if not sep:
+        name = stripped
+    if name in value_attribute_parsers:
+        term, parser = value_attribute_parsers[name]
+        res = parser(value)
+        if res is not None:
+            return {term: res}
+    return {SdpTerms.GENERIC_APPLICATION_LINE: {"CONTENT": content}}
+
+# ---- Sections ----
+# (line type, SdpTerm the line is stored under, whether it may repeat, line parser) in the order the lines
+#  have to appear in
+session_section_lines = [("v", SdpTerms.VERSION_LINE, False, parse_version_line),
+                         ("o", SdpTerms.ORIGINATOR_LINE, False, parse_originator_line),
+                         ("s", SdpTerms.SESSION_NAME_LINE, False, parse_session_name_line),
+                         ("i", SdpTerms.SESSION_INFORMATION_LINE, False, parse_session_information_line),
+                         ("u", SdpTerms.URI_LINE, False, parse_uri_line),
+                         ("e", SdpTerms.EMAIL_ADDRESS_LINE, False, parse_email_address_line),
+                         ("p", SdpTerms.PHONE_NUMBER_LINE, False, parse_phone_number_line),
+                         ("c", SdpTerms.CONNECTION_INFORMATION_LINE, False, parse_connection_information_line),
+                         ("b", SdpTerms.BANDWIDTH_INFORMATION_LINES, True, parse_bandwidth_information_line),
+                         ("t", SdpTerms.TIME_DESCRIPTION_LINES, True, parse_time_description_line),
+                         ("a", SdpTerms.APPLICATION_LINES, True, parse_application_line)]
+session_section_required = ("v", "o", "s", "t")
+
+media_section_lines = [("m", SdpTerms.MEDIA_DESCRIPTION_LINE, False, parse_media_description_line),
+                       ("i", SdpTerms.SESSION_INFORMATION_LINE, False, parse_session_information_line),
+                       ("c", SdpTerms.CONNECTION_INFORMATION_LINE, False, parse_connection_information_line),
+                       ("b", SdpTerms.BANDWIDTH_INFORMATION_LINES, True, parse_bandwidth_information_line),
+                       ("a", SdpTerms.APPLICATION_LINES, True, parse_application_line)]
+media_section_required = ("m",)
+
+def build_section_table(section_lines):
+    return dict((line_type, (position, term, repeated, parser))
+                for position, (line_type, term, repeated, parser) in enumerate(section_lines))
+
+session_section_table = build_section_table(session_section_lines)
+media_section_table = build_section_table(media_section_lines)
+
+def split_lines(sdp_string):
+    # Accept both CRLF (what the RFC mandates) and bare LF line endings, and skip blank lines
+    return [line.rstrip("\r") for line in sdp_string.split("\n") if line.strip()]
+
+def parse_section(lines, section_table, required):
+    res = {}
+    last_position = -1
+    for line in lines:
+        if len(line) < 2 or line[1] != "=" or line[0] not in section_table:
+            raise ValueError("Unexpected line '%s'" % line)
+        position, term, repeated, parser = section_table[line[0]]
+        if position < last_position or (position == last_position and not repeated):
+            raise ValueError("Line '%s' is out of order" % line)
+        last_position = position
+        if repeated:
+            res.setdefault(term, []).append(parser(line))
+        else:
+            res[term] = parser(line)
+    for line_type in required:
+        if section_table[line_type][1] not in res:
+            raise ValueError("Missing required '%s=' line" % line_type)
+    return res
+
+def parse_session_section(sdp_string):
+    return parse_section(split_lines(sdp_string), session_section_table, session_section_required)
+
+def parse_media_section(sdp_string):
+    return parse_section(split_lines(sdp_string), media_section_table, media_section_required)
+
+def split_sections(lines):
+    # Every 'm=' line starts a new media section, everything before the first one is the session section
+    sections = [[]]
+    for line in lines:
+        if line.startswith("m="):
+            sections.append([])
+        sections[-1].append(line)
+    return sections
+
+def split_section_spans(data, media_line_start="\nm="):
+    # The (start, end) offsets of each section in the raw body, which is cut at every m= line (without splitting it
+    #  into lines); the first one is the session section.  Works on anything with a find() (a str, or with
+    #  media_line_start=b"\nm=", bytes, a bytearray or an mmap)
+    starts = [0]
+    pos = data.find(media_line_start)
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = data.find(media_line_start, pos + 1)
+    starts.append(len(data))
+    return list(zip(starts, starts[1:]))
+
+def split_section_strings(sdp_string):
+    return [sdp_string[start:end] for start, end in split_section_spans(sdp_string)]
+
+def find_attribute(data, attribute_name, start=0, end=None, newline="\n"):
+    # The (start, end) offsets of the value of the first 'a=<attribute_name>:<value>' line between start and end
+    #  (None if there isn't one).  For bytes (or a bytearray or an mmap), pass newline=b"\n"
+    end = len(data) if end is None else end
+    prefix = "\na=%s:" % attribute_name
+    if not isinstance(newline, str):
+        prefix = prefix.encode("ascii")
+    value_start = data.find(prefix, start, end)
+    if value_start == -1:
+        return None
+    value_start += len(prefix)
+    value_end = data.find(newline, value_start, end)
+    return value_start, value_end if value_end != -1 else end
+
+def find_attributes(data, attribute_name, start=0, end=None, newline="\n"):
+    # Like find_attribute, but the spans of the values of all of the matching lines
+    spans = []
+    span = find_attribute(data, attribute_name, start, end, newline)
+    while span is not None:
+        spans.append(span)
+        span = find_attribute(data, attribute_name, span[1], end, newline)
+    return spans
+
+def peek_ssrc(value):
+    # The ssrc an 'a=ssrc:' line is for, from its raw value (None if it doesn't start with one)
+    fields = value.split(None, 1)
+    return fields[0] if fields and fields[0].isdigit() else None
+
+def peek_attribute(section_string, attribute_name):
+    # The value of the first 'a=<attribute_name>:<value>' line in the raw text of a section, without parsing it
+    span = find_attribute(section_string, attribute_name)
+    if span is None:
+        return None
+    return section_string[span[0]:span[1]].rstrip("\r")
+
+def parse_sdp(sdp_string):
+    sections = split_sections(split_lines(sdp_string))
+    return {SdpTerms.SESSION_SECTION: parse_section(sections[0], session_section_table, session_section_required),
+            SdpTerms.MEDIA_SECTIONS: [parse_section(section, media_section_table, media_section_required)
+                                      for section in sections[1:]]}
@@ -8,6 +8,8 @@ addrtype = (Literal("IP4") | Literal("IP6")).setName("ADDRTYPE")
 octet = Word(nums, max=3)
 ip_addr = Combine(octet + Literal(".") + octet + Literal(".") + octet + Literal(".") + octet).setName("IP_ADDR")
 port = number.setName("PORT")
+# The characters of an RFC 4566 token (codec names like telephone-event or flexfec-03 are tokens)
+rfc_token_chars = alphanums + "!#$%&'*+-.^_`{|}~"
 
 # ---- Version line ----
 # Prefix
@@ -88,15 +90,18 @@ application_line_direction = Group(direction("DIRECTION").setName("APPLICATION_L
 # Rtcp Line
 application_line_rtcp = Group(Suppress(Literal("rtcp:").setName("APPLICATION_LINE_RTCP_PREFIX")) + port("PORT") + Optional(nettype("NETTYPE")) + Optional(addrtype("ADDRTYPE")) + Optional(ip_addr("IP_ADDR")))
 # ice-ufrag
-application_line_ice_ufrag = Group(Suppress(Literal("ice-ufrag:").setName("APPLICATION_LINE_ICE_UFRAG_PREFIX")) + Word(alphanums + "+")("USERNAME"))
+application_line_ice_ufrag = Group(Suppress(Literal("ice-ufrag:").setName("APPLICATION_LINE_ICE_UFRAG_PREFIX")) + Word(alphanums + "+/")("USERNAME"))
 # ice-pwd
-application_line_ice_pwd = Group(Suppress(Literal("ice-pwd:").setName("APPLICATION_LINE_ICE_PWD_PREFIX")) + Word(alphanums + "+")("PASSWORD"))
+application_line_ice_pwd = Group(Suppress(Literal("ice-pwd:").setName("APPLICATION_LINE_ICE_PWD_PREFIX")) + Word(alphanums + "+/")("PASSWORD"))
 # group
-application_line_group = Group(Suppress(Literal("group:").setName("APPLICATION_LINE_GROUP_PREFIX")) + Word(alphanums)("PURPOSE") + OneOrMore(Word(alphanums).setResultsName("IDS", listAllMatches=True)))
+# NOTE: The ~LineEnd() keeps the ids on this line, otherwise the type character of the next line (the 'a' in 'a=...') gets taken as another id
+application_line_group = Group(Suppress(Literal("group:").setName("APPLICATION_LINE_GROUP_PREFIX")) + Word(alphanums)("PURPOSE") + OneOrMore(~LineEnd() + Word(alphanums).setResultsName("IDS", listAllMatches=True)))
 # mid
 application_line_mid = Group(Suppress(Literal("mid:").setName("APPLICATION_LINE_MID_PREFIX")) + Word(alphanums)("ID"))
 # rtcp-mux
 application_line_rtcp_mux = Group(Literal("rtcp-mux")("RTCP_MUX").setName("APPLICATION_LINE_RTCP_MUX"))
+# restOfLine without the '\r' of a CRLF line ending
+rest_of_line = Regex(r"[^\r\n]*").leaveWhitespace()
 # rtpmap
 #TODO: it's tempting to 'group' the encoding name/clock rate/encoding parameters but, since it then creates a list of parse results, it's a bit hard to detect
 # when parsing things.  (it would show up as a list, which currently we detect as a repeated field, so we'd need to check that it was ParseResults objects in
@@ -104,23 +109,108 @@ application_line_rtcp_mux = Group(Literal("rtcp-mux")("RTCP_MUX").setName("APPLI
 # the object gets duplicate member variables in the wrong places...
 application_line_rtpmap = Group(Suppress(Literal("rtpmap:").setName("APPLICATION_LINE_RTPMAP_PREFIX")) + 
                                 number("PT") + 
-                                Group(Word(alphanums)("ENCODING_NAME") + 
+                                Group(Word(rfc_token_chars)("ENCODING_NAME") + 
                                       Suppress(Literal("/")) + 
                                       number("CLOCK_RATE") + 
                                       Optional(Suppress(Literal("/")) + 
-                                      restOfLine("ENCODING_PARAMETERS")))("RTPMAP_CODEC_INFO"))
+                                      rest_of_line("ENCODING_PARAMETERS")))("RTPMAP_CODEC_INFO"))
+# candidate (RFC 8839).  tcptype is really just one of the extension attributes, but it's the one everybody puts first
+# NOTE: ~LineEnd() keeps the optional trailing fields on this line (see group)
+candidate_token = Word(printables)
+application_line_candidate = Group(Suppress(Literal("candidate:").setName("APPLICATION_LINE_CANDIDATE_PREFIX")) +
+                                   Word(alphanums + "+/")("FOUNDATION") +
+                                   number("COMPONENT") +
+                                   Word(alphanums)("TRANSPORT") +
+                                   number("PRIORITY") +
+                                   candidate_token("ADDRESS") +
+                                   port("PORT") +
+                                   Suppress(Keyword("typ")) + Word(alphanums)("TYPE") +
+                                   Optional(~LineEnd() + Suppress(Keyword("raddr")) + ~LineEnd() + candidate_token("RADDR")) +
+                                   Optional(~LineEnd() + Suppress(Keyword("rport")) + ~LineEnd() + port("RPORT")) +
+                                   Optional(~LineEnd() + Suppress(Keyword("tcptype")) + ~LineEnd() + Word(alphanums)("TCPTYPE")) +
+                                   ZeroOrMore(~LineEnd() + candidate_token.setResultsName("EXTENSIONS", listAllMatches=True) +
+                                              ~LineEnd() + candidate_token.setResultsName("EXTENSIONS", listAllMatches=True)))
+# The rest of the line with the whitespace around it trimmed (unlike restOfLine, which keeps a trailing '\r')
+# NOTE: Guarded with ~LineEnd() wherever it's used, it skips leading whitespace (newlines included) before matching
+line_text = Regex(r"\S(?:[^\r\n]*\S)?")
+# fmtp (RFC 4566), the format specific parameters are kept as written
+application_line_fmtp = Group(Suppress(Literal("fmtp:").setName("APPLICATION_LINE_FMTP_PREFIX")) + number("PT") +
+                              ~LineEnd() + line_text("PARAMETERS"))
+# rtcp-fb (RFC 4585), for one payload type or for all of them ('*')
+feedback_type = Word(alphanums + "-")
+application_line_rtcp_fb = Group(Suppress(Literal("rtcp-fb:").setName("APPLICATION_LINE_RTCP_FB_PREFIX")) +
+                                 (number | Literal("*"))("PT") +
+                                 feedback_type("TYPE") +
+                                 Optional(~LineEnd() + line_text("PARAMETERS")))
+# extmap (RFC 8285)
+application_line_extmap = Group(Suppress(Literal("extmap:").setName("APPLICATION_LINE_EXTMAP_PREFIX")) +
+                                number("ID") +
+                                Optional(Suppress(Literal("/")) + Word(alphas)("DIRECTION")) +
+                                Word(printables)("URI") +
+                                Optional(~LineEnd() + line_text("ATTRIBUTES")))
+# ssrc and ssrc-group (RFC 5576)
+application_line_ssrc = Group(Suppress(Literal("ssrc:").setName("APPLICATION_LINE_SSRC_PREFIX")) +
+                              number("SSRC") +
+                              Word(alphanums + "-")("ATTRIBUTE") +
+                              Optional(Suppress(Literal(":")) + ~LineEnd() + line_text("VALUE")))
+application_line_ssrc_group = Group(Suppress(Literal("ssrc-group:").setName("APPLICATION_LINE_SSRC_GROUP_PREFIX")) +
+                                    Word(alphanums + "-")("SEMANTICS") +
+                                    OneOrMore(~LineEnd() + number.setResultsName("SSRCS", listAllMatches=True)))
 # Generic app line
-application_line_generic = Group(restOfLine("CONTENT").setName("APPLICATION_LINE_GENERIC"))
+application_line_generic = Group(rest_of_line("CONTENT").setName("APPLICATION_LINE_GENERIC"))
 # Line
-application_line = Group(application_line_prefix + (application_line_direction(SdpTerms.DIRECTION_APPLICATION_LINE) | 
-                                                    application_line_rtcp(SdpTerms.RTCP_APPLICATION_LINE) | 
-                                                    application_line_ice_ufrag(SdpTerms.ICE_UFRAG_APPLICATION_LINE) |
-                                                    application_line_ice_pwd(SdpTerms.ICE_PWD_APPLICATION_LINE) |
-                                                    application_line_group(SdpTerms.GROUP_APPLICATION_LINE) |
-                                                    application_line_mid(SdpTerms.MID_APPLICATION_LINE) |
-                                                    application_line_rtpmap(SdpTerms.RTPMAP_APPLICATION_LINE) |
-                                                    application_line_rtcp_mux(SdpTerms.RTCP_MUX_APPLICATION_LINE) |
-                                                    application_line_generic(SdpTerms.GENERIC_APPLICATION_LINE)).setName("APPLICATION_LINE"))
+# Rather than trying each of the grammars above in turn, the attribute name (the part before the ':', or the whole
+#  line for property attributes like a=sendrecv) picks the one to try.  If there isn't one for that name, or the line
+#  doesn't fit it up to the end of the line, it's a generic application line
+class AttributeDispatch(Token):
+    def __init__(self, attributes, fallback):
+        super(AttributeDispatch, self).__init__()
+        self.attributes = attributes
+        self.fallback = fallback
+        self.mayReturnEmpty = True
+        self.mayIndexError = False
+        self.setName("APPLICATION_LINE")
+
+    def parseImpl(self, instring, loc, doActions=True):
+        line_end = instring.find("\n", loc)
+        if line_end == -1:
+            line_end = len(instring)
+        name_end = instring.find(":", loc, line_end)
+        name = instring[loc:line_end if name_end == -1 else name_end].strip()
+        expr = self.attributes.get(name)
+        if expr is not None:
+            try:
+                end, tokens = expr._parse(instring, loc, doActions)
+                if not instring[end:line_end].strip():
+                    return end, tokens
+            except ParseException:
+                pass
+        return self.fallback._parse(instring, loc, doActions)
+
+# Attribute name -> the grammar for the line (named with the SdpTerm its results go under)
+application_line_attributes = {}
+
+def register_attribute_grammar(name, term, expr):
+    application_line_attributes[name] = expr(term)
+
+for direction_name in ["sendonly", "sendrecv", "recvonly"]:
+    register_attribute_grammar(direction_name, SdpTerms.DIRECTION_APPLICATION_LINE, application_line_direction)
+register_attribute_grammar("rtcp", SdpTerms.RTCP_APPLICATION_LINE, application_line_rtcp)
+register_attribute_grammar("ice-ufrag", SdpTerms.ICE_UFRAG_APPLICATION_LINE, application_line_ice_ufrag)
+register_attribute_grammar("ice-pwd", SdpTerms.ICE_PWD_APPLICATION_LINE, application_line_ice_pwd)
+register_attribute_grammar("group", SdpTerms.GROUP_APPLICATION_LINE, application_line_group)
+register_attribute_grammar("mid", SdpTerms.MID_APPLICATION_LINE, application_line_mid)
+register_attribute_grammar("rtpmap", SdpTerms.RTPMAP_APPLICATION_LINE, application_line_rtpmap)
+register_attribute_grammar("rtcp-mux", SdpTerms.RTCP_MUX_APPLICATION_LINE, application_line_rtcp_mux)
+register_attribute_grammar("candidate", SdpTerms.CANDIDATE_APPLICATION_LINE, application_line_candidate)
+register_attribute_grammar("fmtp", SdpTerms.FMTP_APPLICATION_LINE, application_line_fmtp)
+register_attribute_grammar("rtcp-fb", SdpTerms.RTCP_FB_APPLICATION_LINE, application_line_rtcp_fb)
+register_attribute_grammar("extmap", SdpTerms.EXTMAP_APPLICATION_LINE, application_line_extmap)
+register_attribute_grammar("ssrc", SdpTerms.SSRC_APPLICATION_LINE, application_line_ssrc)
+register_attribute_grammar("ssrc-group", SdpTerms.SSRC_GROUP_APPLICATION_LINE, application_line_ssrc_group)
+
+application_line = Group(application_line_prefix + AttributeDispatch(application_line_attributes,
+                                                                     application_line_generic(SdpTerms.GENERIC_APPLICATION_LINE)))
 
 # ---- Media Description line ----
 # Prefix
@@ -128,10 +218,14 @@ media_description_line_prefix = Suppress(Literal("m="))
 # Fields
 media_type = (Literal("audio") | Literal("video") | Literal("text") | Literal("application") | Literal("message")).setName("MEDIA_TYPE")
 # NOTE: Had to put "RTP/SAVPF" in front of "RTP/SAVP" or else the latter will take the match (even if the string is "RTP/SAVPF") Wonder if there's a way around that...
-proto = (Literal("udp") | Literal("RTP/AVP") | Literal("RTP/SAVPF") | Literal("RTP/SAVP")).setName("PROTO")
-fmt = number.setName("FORMAT")
+# (The SCTP ones are for data channels, RFC 8841)
+proto = (Literal("udp") | Literal("RTP/AVP") | Literal("RTP/SAVPF") | Literal("RTP/SAVP") | Literal("UDP/TLS/RTP/SAVPF") | Literal("UDP/TLS/RTP/SAVP") |
+         Literal("UDP/DTLS/SCTP") | Literal("TCP/DTLS/SCTP") | Literal("DTLS/SCTP")).setName("PROTO")
+# A payload type for RTP, otherwise a token (e.g. webrtc-datachannel)
+fmt = Word(rfc_token_chars).setName("FORMAT")
 # Line
-media_description_line = Group(media_description_line_prefix + media_type("MEDIA_TYPE") + port("PORT") + proto("PROTO") + OneOrMore(fmt.setResultsName("FORMATS", listAllMatches=True))).setName(SdpTerms.MEDIA_DESCRIPTION_LINE)
+# NOTE: ~LineEnd() keeps the formats on this line (see group)
+media_description_line = Group(media_description_line_prefix + media_type("MEDIA_TYPE") + port("PORT") + proto("PROTO") + OneOrMore(~LineEnd() + fmt.setResultsName("FORMATS", listAllMatches=True))).setName(SdpTerms.MEDIA_DESCRIPTION_LINE)
 
 # ---- Session section ----
 session_section = version_line(SdpTerms.VERSION_LINE) + \
@@ -155,5 +249,6 @@ media_section = media_description_line(SdpTerms.MEDIA_DESCRIPTION_LINE) + \
 
 
 # ---- SDP ----
-sdp = session_section(SdpTerms.SESSION_SECTION) + \
-      ZeroOrMore(media_section.setResultsName(SdpTerms.MEDIA_SECTIONS, listAllMatches=True))
+# The sections are grouped so that each one keeps its own set of named lines
+sdp = Group(session_section)(SdpTerms.SESSION_SECTION) + \
+      ZeroOrMore(Group(media_section).setResultsName(SdpTerms.MEDIA_SECTIONS, listAllMatches=True))
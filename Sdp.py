@@ -1,53 +1,256 @@
+import copy
+import logging
+import sys
+from collections import OrderedDict, namedtuple
 from SdpDefs import SdpTerms
-import PyParsingSdpDefs as grammar
+import FastSdpDefs as fast
+import SdpIntern
+import SdpValidation
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+# The parsers log (at debug level) the optional fields a section doesn't have
+logger = logging.getLogger(__name__)
 
 # ------ PyParsing-related base classes ------
 
+# Assigns an attribute without going through SdpLine.__setattr__
+set_slot = object.__setattr__
+
+# The names of the slots of a class and all of its bases
+slot_names = {}
+unset = object()
+
+def all_slots(cls):
+    names = slot_names.get(cls)
+    if names is None:
+        names = slot_names[cls] = [name for klass in cls.__mro__ for name in klass.__dict__.get("__slots__", ())]
+    return names
+
+# Bookkeeping shared by all the line classes so they can be written back out as sdp.  A line that was parsed gets
+#  handed its raw text by its section; as long as none of its fields are assigned to after that, to_sdp() returns
+#  the raw text as-is instead of formatting the fields again.  (Only assignment is noticed, a repeated field has
+#  to be replaced rather than changed in place.)
+# The line classes all use __slots__ (each one lists its fields) instead of a per-instance __dict__, since an sdp
+#  is mostly made up of line objects
+# A line can also be frozen (see Sdp.freeze), after which assigning to it raises.  A frozen line is never modified,
+#  so that's kept in the same slot: _modified is None once the line is frozen
+class SdpLine(object):
+    __slots__ = ("_raw", "_modified")
+    # A str.format template applied to the line object, for lines where that's all it takes to write them out
+    sdp_format = None
+    # How the fields are stored when the line is built from a parse (see slot_setters): int_fields hold numbers
+    #  (ports, payload types, clock rates) as ints, interned_fields go through SdpIntern.tokens and shared_fields
+    #  through SdpIntern.values
+    int_fields = ()
+    interned_fields = ()
+    shared_fields = ()
+
+    def __setattr__(self, name, value):
+        check_not_frozen(self)
+        if name in self.int_fields:
+            value = [to_int(item) for item in value] if isinstance(value, list) else to_int(value)
+        set_slot(self, name, value)
+        if not name.startswith("_"):
+            set_slot(self, "_modified", True)
+
+    def field_names(self):
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+    def is_modified(self):
+        return bool(self._modified)
+
+    def is_frozen(self):
+        # (Checked from __setattr__, which unpickling and copying go through before _modified has been set)
+        return hasattr(self, "_modified") and self._modified is None
+
+    def freeze(self):
+        # Once frozen the line can't say it was modified any more, so drop the raw text it no longer matches
+        if self.is_modified():
+            set_slot(self, "_raw", None)
+        set_slot(self, "_modified", None)
+
+    def format_sdp(self):
+        return self.sdp_format.format(self)
+
+    def to_sdp(self):
+        if self._raw is not None and not self.is_modified():
+            return self._raw
+        return self.format_sdp()
+
+    # The debug dump (see Sdp.to_string) is written a piece at a time with write (a file's write method, or a list's
+    #  append to join them afterwards) rather than built up one string per level, so that a big sdp can be dumped
+    #  straight to a file and each piece is copied once
+    def to_string(self, prefix=""):
+        return join_pieces(self.write_string, prefix)
+
+    # Pickled as the slots that are set, and restored directly rather than through __setattr__ (which would mark
+    #  the line modified, refuse a frozen line, and is a lot slower)
+    def __getstate__(self):
+        state = {}
+        for name in all_slots(type(self)):
+            value = getattr(self, name, unset)
+            if value is not unset:
+                state[name] = value
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            set_slot(self, name, value)
+
+    # A copy of the line that isn't frozen, even if this one is.  Its nested lines and repeated fields are copied
+    #  along with it, everything else is immutable and shared
+    def copy(self):
+        line = type(self).__new__(type(self))
+        for name, value in self.__getstate__().items():
+            if isinstance(value, SdpLine):
+                value = value.copy()
+            elif isinstance(value, list):
+                value = list(value)
+            set_slot(line, name, value)
+        set_slot(line, "_modified", bool(self._modified))
+        return line
+
+def check_not_frozen(obj):
+    if obj.is_frozen():
+        raise AttributeError("Can't modify a frozen %s" % type(obj).__name__)
+
+# A number as an int ("96" -> 96).  Anything that isn't a plain number ("*", "webrtc-datachannel", a port with a
+#  count like "9/2") is left as it is, so this is also how a payload type given as either is looked up
+def to_int(value):
+    return int(value) if isinstance(value, basestring) and value.isdigit() else value
+
+# The address type (for c= and o= lines) of an address
+def address_type(address):
+    return "IP6" if ":" in address else "IP4"
+
+# For each line class, the setters of its slots keyed by the name of the parse result that goes in them
+#  ("FOUNDATION" -> foundation).  Calling a slot's setter is quite a bit quicker than set_slot
+slot_setters_by_class = {}
+
+def slot_setters(cls):
+    setters = slot_setters_by_class.get(cls)
+    if setters is None:
+        setters = slot_setters_by_class[cls] = dict((name.upper(), getattr(cls, name).__set__) for name in all_slots(cls))
+    return setters
+
+# For each line class, (is numeric, intern pool) for the fields that are converted to ints and/or interned as the
+#  line is built (see SdpLine.int_fields), keyed like slot_setters.  Fields that are neither aren't in it
+field_conversions_by_class = {}
+
+def field_conversions(cls):
+    conversions = field_conversions_by_class.get(cls)
+    if conversions is None:
+        conversions = field_conversions_by_class[cls] = {}
+        for name in all_slots(cls):
+            numeric = name in cls.int_fields
+            pool = SdpIntern.tokens if name in cls.interned_fields else SdpIntern.values if name in cls.shared_fields else None
+            if numeric or pool is not None:
+                conversions[name.upper()] = (numeric, pool)
+    return conversions
+
+# (The values coming out of a parse are always strings, or lists of them.  The pool's intern is looked up each time
+#  since it changes when the pool starts tracking stats)
+def convert_field(value, numeric, pool):
+    if isinstance(value, list):
+        if numeric:
+            value = [int(item) if item.isdigit() else item for item in value]
+        if pool is not None:
+            intern = pool.intern
+            value = [intern(item) for item in value]
+        return value
+    if numeric and value.isdigit():
+        value = int(value)
+    return pool.intern(value) if pool is not None else value
+
+set_raw = SdpLine._raw.__set__
+set_modified = SdpLine._modified.__set__
+
 # Parse a single line.  Just take the fields and assign them as member variables
-class PyParsedLine(object):
+class PyParsedLine(SdpLine):
+    __slots__ = ()
+
     def __init__(self, parsed_line):
-        for field in parsed_line.keys():
-            value = parsed_line[field]
+        set_raw(self, None)
+        set_modified(self, False)
+        setters = slot_setters(type(self))
+        conversions = field_conversions(type(self))
+        for field, value in parsed_line.items():
+            conversion = conversions.get(field)
             if not isinstance(value, basestring):
                 # Only instance where we don't have a string here is if it was a repeated field so we have a ParseResults
-                #  object which contains the list.  Grab the raw list instead
-                value = value.asList()
-            setattr(self, field.lower(), value)
+                #  object which contains the list (or already a list, from the fast parser).  Grab the raw list instead
+                value = value.asList() if hasattr(value, "asList") else list(value)
+                if conversion is not None:
+                    value = convert_field(value, *conversion)
+            elif conversion is not None:
+                # (convert_field, inlined: most fields are converted, and this runs for every one of them)
+                numeric, pool = conversion
+                if numeric and value.isdigit():
+                    value = int(value)
+                if pool is not None:
+                    value = pool.intern(value)
+            # Set directly so that building the line doesn't count as modifying it
+            setter = setters.get(field)
+            if setter is None:
+                set_slot(self, field.lower(), value)
+            else:
+                setter(self, value)
 
-    def to_string(self, prefix=""):
-        str = ""
-        for var in vars(self).keys():
-            str += "%s%s: %s\n" % (prefix, var, getattr(self, var))
-        return str
+    def write_string(self, write, prefix=""):
+        for var in self.field_names():
+            write("%s%s: %s\n" % (prefix, var, getattr(self, var)))
 
 # Used for lines that have lines 'within' them (application lines).  This is basically to handle a line
 #  that isn't parsed as just a dictionary (the bottom of the chain) but is still a ParseResults object
-class PyParsedMetaLine(object):
+class PyParsedMetaLine(SdpLine):
+    __slots__ = ()
+
     def __init__(self, parsed_line):
         #print("creating object from meta line %s" % parsed_line.dump())
+        set_slot(self, "_raw", None)
+        set_slot(self, "_modified", False)
+        conversions = field_conversions(type(self))
         for sub_line_name in parsed_line.keys():
             #print("looking at sub line: %s" % sub_line_name)
             sub_line = parsed_line[sub_line_name]
             # Meta line can be a mixture of sub-lines and direct fields
             if isinstance(sub_line, basestring):
-                setattr(self, sub_line_name.lower(), sub_line)
+                conversion = conversions.get(sub_line_name)
+                set_slot(self, sub_line_name.lower(), convert_field(sub_line, *conversion) if conversion else sub_line)
             else:
                 #print("setting attr %s to parsed meta line result" % sub_line_name.lower())
-                setattr(self, sub_line_name.lower(), SdpObjectMapping[sub_line_name](sub_line))
+                set_slot(self, sub_line_name.lower(), SdpObjectMapping[sub_line_name](sub_line))
 
-    def to_string(self, prefix=""):
-        str = ""
-        for var in vars(self).keys():
+    def nested_lines(self):
+        return [getattr(self, name) for name in self.field_names() if isinstance(getattr(self, name), SdpLine)]
+
+    def is_modified(self):
+        return bool(self._modified) or any(line.is_modified() for line in self.nested_lines())
+
+    def freeze(self):
+        super(PyParsedMetaLine, self).freeze()
+        for line in self.nested_lines():
+            line.freeze()
+
+    def write_string(self, write, prefix=""):
+        for var in self.field_names():
             attr = getattr(self, var)
-            if isinstance(attr, basestring):
-                str += (prefix + var + ": " + attr + "\n")
+            # (Direct fields aren't necessarily strings, an rtpmap's payload type is an int)
+            if isinstance(attr, SdpLine):
+                write("%s%s:\n" % (prefix, var))
+                attr.write_string(write, prefix + "  ")
             else:
-                str += (var + ":\n" + attr.to_string(prefix + "  "))
-        return str
+                write("%s%s: %s\n" % (prefix, var, attr))
 
 # Used for lines that may be repeated more than once.  Takes the 'single line' type so that it can
 #  create an instance of it for each line
 class PyParsedMultiLine(object):
+    __slots__ = ("sub_lines",)
+
     def __init__(self, sub_line_type, parsed_lines):
         self.sub_lines = []
         for line in parsed_lines:
@@ -56,27 +259,308 @@ class PyParsedMultiLine(object):
     def __iter__(self):
         return iter(self.sub_lines)
 
-    def to_string(self, prefix=""):
-        str = ""
+    def __len__(self):
+        return len(self.sub_lines)
+
+    # (Python 2's pickle protocols 0 and 1 don't know about slots)
+    def __getstate__(self):
+        return (self.sub_lines,)
+
+    def __setstate__(self, state):
+        self.sub_lines, = state
+
+    def freeze(self):
+        # A tuple so that lines can't be added or removed either
+        self.sub_lines = tuple(self.sub_lines)
+        for line in self.sub_lines:
+            line.freeze()
+
+    # A container of its own with copies of the lines (see SdpLine.copy)
+    def copy(self):
+        lines = type(self).__new__(type(self))
+        lines.sub_lines = [line.copy() for line in self.sub_lines]
+        return lines
+
+    def write_string(self, write, prefix=""):
         for i, line in enumerate(self.sub_lines):
-            str += "%sline %d:\n%s" % (prefix, i, line.to_string(prefix + "  "))
-        return str
+            write("%sline %d:\n" % (prefix, i))
+            line.write_string(write, prefix + "  ")
+
+    def to_string(self, prefix=""):
+        return join_pieces(self.write_string, prefix)
+
+def join_pieces(write_string, prefix):
+    pieces = []
+    write_string(pieces.append, prefix)
+    return "".join(pieces)
+
+# A section's raw text in wire format with line_ending: as it was received if its lines already end in line_ending,
+#  otherwise with their line endings changed to it (so that the raw sections and the formatted lines of an sdp agree).
+#  The last line gets a line ending if it doesn't have one.  With line_ending=None it's the one the text was received
+#  with
+def terminate_section(section_string, line_ending=None):
+    received_line_ending = "\r\n" if "\r\n" in section_string else "\n"
+    line_ending = line_ending or received_line_ending
+    if line_ending != received_line_ending:
+        section_string = section_string.replace("\r\n", "\n")
+        if line_ending != "\n":
+            section_string = section_string.replace("\n", line_ending)
+    return section_string if section_string.endswith("\n") else section_string + line_ending
+
+# The lines of a terminated section, each with its line ending.  (Not str.splitlines, which also splits at characters
+#  like form feeds that an attribute value could contain)
+def wire_lines(section_string):
+    start = 0
+    while start < len(section_string):
+        end = section_string.index("\n", start) + 1
+        yield section_string[start:end]
+        start = end
 
 class PyParsedSection(object):
+    _raw = None
+    _raw_line_count = 0
+    _frozen = False
+    # The lines the section shares with its clones (see clone), keyed by field name along with the indexes of them.
+    #  They're kept out of the section's attributes, and swapped for copies of its own when they're first accessed
+    _shared = None
+    # The indexes that hold application lines
+    line_indexes = ("attribute_index",)
+
     def __init__(self, parsed_section, fields):
         for field in fields:
             if field in parsed_section:
                 setattr(self, field.lower(), SdpObjectMapping[field](parsed_section[field]))
             else:
-                print("Field missing: %s" % field)
+                logger.debug("Field missing: %s", field)
+        self.reindex()
+        SdpIntern.trim()
+
+    # Build the lookup tables for the section's lines.  Done when the section is created; after adding, removing or
+    #  replacing lines directly it has to be called again
+    def reindex(self):
+        self.attribute_index = {}
+        for app_line in getattr(self, "application_lines", ()):
+            self.attribute_index.setdefault(app_line.attribute_name, []).append(app_line)
+
+    # The application lines for the given attribute name ("rtpmap", "candidate", "sendrecv", ...)
+    def attribute_lines(self, attribute_name):
+        return self.attribute_index.get(attribute_name, [])
+
+    # The lines the attribute's application lines hold, leaving out the ones that aren't of line_type (a line that
+    #  didn't fit the attribute's grammar is a generic application line)
+    def typed_attribute_lines(self, attribute_name, line_type):
+        return [app_line._sub_line for app_line in self.attribute_lines(attribute_name) if isinstance(app_line._sub_line, line_type)]
+
+    # ---- Changing the section ----
+    # These only touch the lines they have to, so everything else is still written out exactly as it was parsed (see
+    #  to_sdp).  They reindex the section when they're done
+
+    # Remove the application lines remove(app_line) is true for, returns how many were removed
+    def remove_application_lines(self, remove):
+        check_not_frozen(self)
+        app_lines = getattr(self, "application_lines", None)
+        if app_lines is None:
+            return 0
+        kept = [app_line for app_line in app_lines if not remove(app_line)]
+        removed = len(app_lines) - len(kept)
+        if removed:
+            app_lines.sub_lines = kept
+            self.reindex()
+        return removed
+
+    # Remove all the lines for an attribute (e.g. "candidate" to drop the candidates)
+    def remove_attribute(self, attribute_name):
+        return self.remove_application_lines(lambda app_line: app_line.attribute_name == attribute_name)
+
+    # Add an application line ("a=..." or just the part after the 'a='), at the end unless a position is given
+    def add_application_line(self, line, position=None):
+        check_not_frozen(self)
+        app_line = ApplicationLine(fast.parse_application_line(line if line.startswith("a=") else "a=" + line))
+        if getattr(self, "application_lines", None) is None:
+            self.application_lines = ApplicationLines([])
+        sub_lines = self.application_lines.sub_lines
+        sub_lines.insert(len(sub_lines) if position is None else position, app_line)
+        self.reindex()
+        return app_line
+
+    # Point the c= line at address (adding one if the section doesn't have it).  The address type is worked out
+    #  from the address if it isn't given
+    def set_connection(self, address, addrtype=None):
+        check_not_frozen(self)
+        addrtype = addrtype or address_type(address)
+        line = getattr(self, "connection_information_line", None)
+        if line is None:
+            self.connection_information_line = ConnectionInformationLine(
+                fast.parse_connection_information_line("c=IN %s %s" % (addrtype, address)))
+            return
+        if line.addrtype != addrtype or line.ip_addr != address:
+            line = self.own_line("connection_information_line")
+            line.addrtype = addrtype
+            line.ip_addr = address
+
+    # The line in the given field (e.g. "media_description_line"), ready to be changed.  (A line that's shared with a
+    #  clone is already copied as it's accessed, see clone)
+    def own_line(self, field_name):
+        check_not_frozen(self)
+        return getattr(self, field_name)
+
+    # A copy of the section that shares all of its lines (see Sdp.clone).  Until one of the two sections accesses a
+    #  line (or the indexes of its application lines) they both hold the same one, then that section gets a copy of its
+    #  own (see __getattr__), so changing either section doesn't change the other.  Lines got from the section before
+    #  it was cloned are still shared, get them again
+    def clone(self):
+        state = vars(self)
+        shared = dict(self._shared or ())
+        for field in self.fields:
+            value = state.get(field.lower())
+            if value is not None:
+                shared[field.lower()] = value
+        if "application_lines" in shared:
+            for name in self.line_indexes:
+                if name in state:
+                    shared[name] = state[name]
+        section = type(self).__new__(type(self))
+        vars(section).update((name, value) for name, value in state.items() if name not in shared)
+        vars(section).pop("_frozen", None)
+        object.__setattr__(section, "_shared", dict(shared))
+        # A frozen section's lines are never changed, it can keep them
+        if not self._frozen:
+            for name in shared:
+                state.pop(name, None)
+            object.__setattr__(self, "_shared", shared)
+        return section
+
+    # (Only called for attributes the section doesn't have, see clone)
+    def __getattr__(self, name):
+        shared = self._shared
+        if not shared or name not in shared:
+            raise AttributeError(name)
+        if name in self.line_indexes and "application_lines" in shared:
+            self.application_lines
+            return object.__getattribute__(self, name)
+        value = shared.pop(name)
+        if isinstance(value, (SdpLine, PyParsedMultiLine)):
+            lines = value
+            value = lines.copy()
+            if name == "application_lines":
+                self.remap_line_indexes(lines, value)
+        object.__setattr__(self, name, value)
+        return value
+
+    # Point the indexes of the shared application lines at the copies of them
+    def remap_line_indexes(self, shared_lines, lines):
+        copies = {}
+        for shared_line, line in zip(shared_lines, lines):
+            copies[id(shared_line)] = line
+            if shared_line._sub_line is not None:
+                copies[id(shared_line._sub_line)] = line._sub_line
+        for name in self.line_indexes:
+            index = self._shared.pop(name, None)
+            if index is not None:
+                object.__setattr__(self, name, dict(
+                    (key, [copies.get(id(line), line) for line in value] if isinstance(value, list)
+                          else copies.get(id(value), value))
+                    for key, value in index.items()))
+
+    # The value of a field for reading it, without copying it if it's shared
+    def peek(self, name):
+        value = self.__dict__.get(name)
+        if value is None and self._shared:
+            value = self._shared.get(name)
+        return value
+
+    # All the line objects in the section, in the order they're written out in
+    def lines(self):
+        for field in self.fields:
+            value = self.peek(field.lower())
+            if isinstance(value, PyParsedMultiLine):
+                for line in value:
+                    yield line
+            elif value is not None:
+                yield value
+
+    def __setattr__(self, name, value):
+        check_not_frozen(self)
+        object.__setattr__(self, name, value)
+        # (Replacing a shared value rather than copying it)
+        if self._shared and name in self._shared:
+            del self._shared[name]
 
-    def to_string(self, prefix="", field_order=None):
+    def is_frozen(self):
+        return self._frozen
+
+    def freeze(self):
+        for field in self.fields:
+            value = getattr(self, field.lower(), None)
+            if value is not None:
+                value.freeze()
+        self._frozen = True
+
+    def attach_raw(self, section_string):
+        # The lines were parsed in the same order as self.fields, so the raw lines can be handed out in order.  If
+        #  they don't line up a parser stopped early, at a line it couldn't parse
+        raw_lines = [line.rstrip("\r") for line in section_string.split("\n") if line.strip()]
+        lines = list(self.lines())
+        if len(raw_lines) != len(lines):
+            raise ValueError("Couldn't parse line %d of the section: %s" %
+                             (len(lines) + 1, SdpValidation.excerpt(raw_lines[min(len(lines), len(raw_lines) - 1)])))
+        # (Lines like "a=rtcp-mux" or "c=IN IP4 0.0.0.0" show up in most sdps, so their text is shared too)
+        intern = SdpIntern.values.intern
+        for line, raw_line in zip(lines, raw_lines):
+            set_slot(line, "_raw", intern(raw_line))
+        self._raw = section_string
+        self._raw_line_count = len(lines)
+
+    def is_modified(self):
+        if self._raw is None:
+            return True
+        count = 0
+        for line in self.lines():
+            if line._raw is None or line.is_modified():
+                return True
+            count += 1
+        return count != self._raw_line_count
+
+    # The line ending the section was received with (CRLF, like on the wire, if it wasn't parsed from text).  The
+    #  default for writing it out
+    @property
+    def line_ending(self):
+        return "\n" if self._raw is not None and "\r\n" not in self._raw else "\r\n"
+
+    # The section in wire format, in pieces: its raw text in one go if it hasn't been modified, otherwise a line (and
+    #  then its line ending) at a time
+    def iter_sdp(self, line_ending=None):
+        line_ending = line_ending or self.line_ending
+        if not self.is_modified():
+            yield terminate_section(self._raw, line_ending)
+            return
+        for line in self.lines():
+            yield line.to_sdp()
+            yield line_ending
+
+    # The section in wire format a line at a time, each with its line ending
+    def iter_lines(self, line_ending=None):
+        line_ending = line_ending or self.line_ending
+        if not self.is_modified():
+            for line in wire_lines(terminate_section(self._raw, line_ending)):
+                yield line
+            return
+        for line in self.lines():
+            yield line.to_sdp() + line_ending
+
+    def to_sdp(self, line_ending=None):
+        return "".join(self.iter_sdp(line_ending))
+
+    def write_string(self, write, prefix="", field_order=None):
         fields = field_order if field_order else vars(self).keys()
-        str = ""
         for field in fields:
             if hasattr(self, field):
-                str += "%s%s:\n%s\n" % (prefix, field, getattr(self, field).to_string(prefix + "  "))
-        return str
+                write("%s%s:\n" % (prefix, field))
+                getattr(self, field).write_string(write, prefix + "  ")
+                write("\n")
+
+    def to_string(self, prefix=""):
+        return join_pieces(self.write_string, prefix)
 
 class PyParsedMultiSection(object):
     def __init__(self, sub_section_type, parsed_sections):
@@ -87,95 +571,406 @@ class PyParsedMultiSection(object):
     def __iter__(self):
         return iter(self.sub_sections)
 
-    def to_string(self, prefix=""):
-        str = ""
+    def __getitem__(self, index):
+        return self.sub_sections[index]
+
+    def __len__(self):
+        return len(self.sub_sections)
+
+    def iter_sdp(self, line_ending=None):
+        for section in self:
+            for piece in section.iter_sdp(line_ending):
+                yield piece
+
+    def iter_lines(self, line_ending=None):
+        for section in self:
+            for line in section.iter_lines(line_ending):
+                yield line
+
+    def to_sdp(self, line_ending=None):
+        return "".join(self.iter_sdp(line_ending))
+
+    def freeze(self):
+        self.sub_sections = tuple(self.sub_sections)
+        for section in self.sub_sections:
+            section.freeze()
+
+    def write_string(self, write, prefix=""):
         for i, section in enumerate(self.sub_sections):
-            str += "%ssection %d:\n%s" % (prefix, i, section.to_string(prefix + "  "))
-        return str
+            write("%ssection %d:\n" % (prefix, i))
+            section.write_string(write, prefix + "  ")
+
+    def to_string(self, prefix=""):
+        return join_pieces(self.write_string, prefix)
 
 
 # ------ SDP Line classes ------
 
 class VersionLine(PyParsedLine):
-    pass
+    __slots__ = ("version_number",)
+    interned_fields = ("version_number",)
+    sdp_format = "v={0.version_number}"
 
 class OriginatorLine(PyParsedLine):
-    pass
+    __slots__ = ("username", "session_id", "session_version", "nettype", "addrtype", "ip_addr")
+    interned_fields = ("username", "nettype", "addrtype")
+    shared_fields = ("ip_addr",)
+    sdp_format = "o={0.username} {0.session_id} {0.session_version} {0.nettype} {0.addrtype} {0.ip_addr}"
 
 class SessionNameLine(PyParsedLine):
-    pass
+    __slots__ = ("session_name",)
+    shared_fields = ("session_name",)
+    sdp_format = "s={0.session_name}"
 
 class SessionInformationLine(PyParsedLine):
-    pass
+    __slots__ = ("session_information",)
+    sdp_format = "i={0.session_information}"
 
 class UriLine(PyParsedLine):
-    pass
+    __slots__ = ("uri",)
+    sdp_format = "u={0.uri}"
 
 class EmailAddressLine(PyParsedLine):
-    pass
+    __slots__ = ("email_address",)
+    sdp_format = "e={0.email_address}"
 
 class PhoneNumberLine(PyParsedLine):
-    pass
+    __slots__ = ("phone_number",)
+    sdp_format = "p={0.phone_number}"
 
 class ConnectionInformationLine(PyParsedLine):
-    pass
+    __slots__ = ("nettype", "addrtype", "ip_addr")
+    interned_fields = ("nettype", "addrtype")
+    shared_fields = ("ip_addr",)
+    sdp_format = "c={0.nettype} {0.addrtype} {0.ip_addr}"
 
 class BandwidthInformationLine(PyParsedLine):
-    pass
+    __slots__ = ("bwtype", "bw")
+    interned_fields = ("bwtype", "bw")
+    sdp_format = "b={0.bwtype}:{0.bw}"
 
 class BandwidthInformationLines(PyParsedMultiLine):
+    __slots__ = ()
+
     def __init__(self, parsed_lines):
         super(BandwidthInformationLines, self).__init__(BandwidthInformationLine, parsed_lines)
 
 class TimeDescriptionLine(PyParsedLine):
-    pass
+    __slots__ = ("start_time", "stop_time")
+    interned_fields = ("start_time", "stop_time")
+    sdp_format = "t={0.start_time} {0.stop_time}"
 
 class TimeDescriptionLines(PyParsedMultiLine):
+    __slots__ = ()
+
     def __init__(self, parsed_lines):
         super(TimeDescriptionLines, self).__init__(TimeDescriptionLine, parsed_lines)
 
+# The application line classes below format just the part after the 'a=', ApplicationLine adds the prefix.  Each
+#  one has an attribute_name: the name of the sdp attribute (the part before the ':') it holds
 class IceUfragApplicationLine(PyParsedLine):
-    pass
+    __slots__ = ("username",)
+    attribute_name = "ice-ufrag"
+    sdp_format = "ice-ufrag:{0.username}"
 
 class IcePwdApplicationLine(PyParsedLine):
-    pass
+    __slots__ = ("password",)
+    attribute_name = "ice-pwd"
+    sdp_format = "ice-pwd:{0.password}"
 
 class GroupApplicationLine(PyParsedLine):
-    pass
+    __slots__ = ("purpose", "ids")
+    interned_fields = ("purpose", "ids")
+    attribute_name = "group"
+
+    def format_sdp(self):
+        return "group:%s %s" % (self.purpose, " ".join(self.ids))
 
 class MidApplicationLine(PyParsedLine):
-    pass
+    __slots__ = ("id",)
+    interned_fields = ("id",)
+    attribute_name = "mid"
+    sdp_format = "mid:{0.id}"
 
 class RtcpMuxApplicationLine(PyParsedLine):
-    pass
+    __slots__ = ("rtcp_mux",)
+    interned_fields = ("rtcp_mux",)
+    attribute_name = "rtcp-mux"
+    sdp_format = "{0.rtcp_mux}"
 
 class DirectionApplicationLine(PyParsedLine):
-    pass
+    __slots__ = ("direction",)
+    interned_fields = ("direction",)
+    sdp_format = "{0.direction}"
+
+    @property
+    def attribute_name(self):
+        return self.direction
 
 class RtcpApplicationLine(PyParsedLine):
-    pass
+    __slots__ = ("port", "nettype", "addrtype", "ip_addr")
+    int_fields = ("port",)
+    interned_fields = ("nettype", "addrtype")
+    shared_fields = ("ip_addr",)
+    attribute_name = "rtcp"
+
+    def format_sdp(self):
+        # Everything after the port is optional
+        fields = [str(getattr(self, name)) for name in ["port", "nettype", "addrtype", "ip_addr"] if hasattr(self, name)]
+        return "rtcp:" + " ".join(fields)
 
 class RtpMapApplicationLine(PyParsedMetaLine):
-    pass
+    __slots__ = ("pt", "rtpmap_codec_info")
+    int_fields = ("pt",)
+    attribute_name = "rtpmap"
+
+    def format_sdp(self):
+        return "rtpmap:%s %s" % (self.pt, self.rtpmap_codec_info.format_sdp())
 
 # Helper class to model the codec-info sub field of an rtpmap line
 class RtpMapCodecInfo(PyParsedLine):
-    pass
+    __slots__ = ("encoding_name", "clock_rate", "encoding_parameters")
+    int_fields = ("clock_rate",)
+    interned_fields = ("encoding_name", "clock_rate", "encoding_parameters")
+
+    def format_sdp(self):
+        codec_info = "%s/%s" % (self.encoding_name, self.clock_rate)
+        if hasattr(self, "encoding_parameters"):
+            codec_info += "/%s" % self.encoding_parameters
+        return codec_info
+
+class CandidateApplicationLine(PyParsedLine):
+    __slots__ = ("foundation", "component", "transport", "priority", "address", "port", "type", "raddr", "rport",
+                 "tcptype", "extensions")
+    int_fields = ("port", "rport")
+    interned_fields = ("component", "transport", "type", "tcptype")
+    shared_fields = ("raddr", "extensions")
+    attribute_name = "candidate"
+
+    def format_sdp(self):
+        candidate = "candidate:%s %s %s %s %s %s typ %s" % (self.foundation, self.component, self.transport, self.priority,
+                                                            self.address, self.port, self.type)
+        for name in ["raddr", "rport", "tcptype"]:
+            if hasattr(self, name):
+                candidate += " %s %s" % (name, getattr(self, name))
+        return " ".join([candidate] + getattr(self, "extensions", []))
+
+    # The value of an extension attribute ("generation", "network-id", "ufrag", ...), None if it isn't there
+    def extension(self, name):
+        extensions = getattr(self, "extensions", [])
+        for i in range(0, len(extensions), 2):
+            if extensions[i] == name:
+                return extensions[i + 1]
+        return None
+
+class FmtpApplicationLine(PyParsedLine):
+    __slots__ = ("pt", "parameters")
+    int_fields = ("pt",)
+    shared_fields = ("parameters",)
+    attribute_name = "fmtp"
+    sdp_format = "fmtp:{0.pt} {0.parameters}"
+
+    def parameter_dict(self):
+        return parse_format_parameters(self.parameters)
+
+# Split the parameters of an fmtp line up into a dict ("minptime=10;useinbandfec=1" -> {"minptime": "10",
+#  "useinbandfec": "1"}).  A parameter that isn't a name=value pair (like telephone-event's "0-15") maps to None
+def parse_format_parameters(parameters):
+    res = {}
+    intern = SdpIntern.tokens.intern
+    for parameter in parameters.split(";"):
+        name, sep, value = parameter.partition("=")
+        name = name.strip()
+        if name:
+            res[intern(name)] = intern(value.strip()) if sep else None
+    return res
+
+class RtcpFbApplicationLine(PyParsedLine):
+    __slots__ = ("pt", "type", "parameters")
+    int_fields = ("pt",)
+    interned_fields = ("type", "parameters")
+    attribute_name = "rtcp-fb"
+
+    def format_sdp(self):
+        return "rtcp-fb:%s %s" % (self.pt, self.feedback())
+
+    # The type of feedback along with its parameters, if it has any ("nack pli", "goog-remb", ...)
+    def feedback(self):
+        return "%s %s" % (self.type, self.parameters) if hasattr(self, "parameters") else self.type
+
+class ExtmapApplicationLine(PyParsedLine):
+    __slots__ = ("id", "direction", "uri", "attributes")
+    interned_fields = ("id", "direction", "uri")
+    shared_fields = ("attributes",)
+    attribute_name = "extmap"
+
+    def format_sdp(self):
+        extmap = "extmap:%s" % self.id
+        if hasattr(self, "direction"):
+            extmap += "/%s" % self.direction
+        extmap += " %s" % self.uri
+        if hasattr(self, "attributes"):
+            extmap += " %s" % self.attributes
+        return extmap
+
+class SsrcApplicationLine(PyParsedLine):
+    __slots__ = ("ssrc", "attribute", "value")
+    interned_fields = ("attribute",)
+    shared_fields = ("value",)
+    attribute_name = "ssrc"
+
+    def format_sdp(self):
+        ssrc = "ssrc:%s %s" % (self.ssrc, self.attribute)
+        return "%s:%s" % (ssrc, self.value) if hasattr(self, "value") else ssrc
+
+class SsrcGroupApplicationLine(PyParsedLine):
+    __slots__ = ("semantics", "ssrcs")
+    interned_fields = ("semantics",)
+    attribute_name = "ssrc-group"
+
+    def format_sdp(self):
+        return "ssrc-group:%s %s" % (self.semantics, " ".join(self.ssrcs))
 
 class GenericApplicationLine(PyParsedLine):
-    pass
+    __slots__ = ("content",)
+    shared_fields = ("content",)
+    sdp_format = "{0.content}"
+
+    @property
+    def attribute_name(self):
+        return self.content.partition(":")[0]
+
+    # The part after the ':' (empty for property attributes like a=extmap-allow-mixed)
+    @property
+    def attribute_value(self):
+        return self.content.partition(":")[2]
 
+# An application line holds exactly one of the application line types above, available under the attribute named
+#  after its type (e.g. app_line.rtpmap_application_line).  Rather than a slot for every type it might be, it
+#  keeps the one it has along with its name
 class ApplicationLine(PyParsedMetaLine):
-    pass
+    __slots__ = ("_sub_line_name", "_sub_line")
+    # Term -> the name of the attribute it's kept under, so that every application line of a type shares one name
+    sub_line_names = {}
+
+    def __init__(self, parsed_line):
+        set_slot(self, "_raw", None)
+        set_slot(self, "_modified", False)
+        for sub_line_name in parsed_line.keys():
+            name = ApplicationLine.sub_line_names.get(sub_line_name)
+            if name is None:
+                name = ApplicationLine.sub_line_names[sub_line_name] = sub_line_name.lower()
+            set_slot(self, "_sub_line_name", name)
+            set_slot(self, "_sub_line", SdpObjectMapping[sub_line_name](parsed_line[sub_line_name]))
+
+    def __getattr__(self, name):
+        # Only called when the normal lookup fails
+        if not name.startswith("_") and name == self._sub_line_name:
+            return self._sub_line
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name == getattr(self, "_sub_line_name", None):
+            check_not_frozen(self)
+            set_slot(self, "_sub_line", value)
+            set_slot(self, "_modified", True)
+        else:
+            super(ApplicationLine, self).__setattr__(name, value)
+
+    def field_names(self):
+        return [self._sub_line_name]
+
+    # (The one nested line is known, no need to go looking for it like PyParsedMetaLine does)
+    def nested_lines(self):
+        return [self._sub_line]
+
+    def is_modified(self):
+        return bool(self._modified) or self._sub_line.is_modified()
+
+    @property
+    def attribute_name(self):
+        return self._sub_line.attribute_name
+
+    def format_sdp(self):
+        return "a=" + self._sub_line.format_sdp()
 
 class ApplicationLines(PyParsedMultiLine):
+    __slots__ = ()
+
     def __init__(self, parsed_lines):
         super(ApplicationLines, self).__init__(ApplicationLine, parsed_lines)
 
+# An a= line that was left out of the attributes to parse (see Projection), kept among the application lines as just
+#  its raw text.  It's written back out as it was, and can be found and removed by its attribute name, but there's
+#  nothing else to it (its _sub_line is None, so it isn't any of the typed lines)
+class UnparsedApplicationLine(SdpLine):
+    __slots__ = ()
+    _sub_line = None
+
+    def __init__(self, raw_line):
+        set_slot(self, "_raw", raw_line)
+        set_slot(self, "_modified", False)
+
+    @property
+    def attribute_name(self):
+        return self._raw[2:].partition(":")[0].strip()
+
+    @property
+    def attribute_value(self):
+        return self._raw[2:].partition(":")[2]
+
+    def format_sdp(self):
+        return self._raw
+
+    def write_string(self, write, prefix=""):
+        write("%sunparsed: %s\n" % (prefix, self._raw))
+
 class MediaDescriptionLine(PyParsedLine):
-    pass
+    __slots__ = ("media_type", "port", "proto", "formats")
+    int_fields = ("port", "formats")
+    interned_fields = ("media_type", "proto", "formats")
+
+    def format_sdp(self):
+        return "m=%s %s %s %s" % (self.media_type, self.port, self.proto, " ".join(str(fmt) for fmt in self.formats))
 
 # ------ SDP section classes ------
+# A codec offered in a media section: its rtpmap line (or, for a static payload type without one, the RFC 3551
+#  defaults) joined with the fmtp and rtcp-fb lines for the same payload type.  parameters is the fmtp line's
+#  parameters as a dict (empty if there isn't one) and rtcp_feedback the feedback from the rtcp-fb lines for the
+#  payload type and for '*', in the order they appear in
+Codec = namedtuple("Codec", ["pt", "encoding_name", "clock_rate", "encoding_parameters", "parameters", "rtcp_feedback"])
+
+media_directions = fast.directions + ("inactive",)
+
+# The attributes that are for one payload type (or for '*'), the first thing in their value
+format_attributes = ("rtpmap", "fmtp", "rtcp-fb")
+
+# The payload type an application line is for, None if it isn't for one
+def line_format(app_line):
+    if app_line.attribute_name not in format_attributes:
+        return None
+    sub_line = app_line._sub_line
+    if sub_line is None or isinstance(sub_line, GenericApplicationLine):
+        fields = (sub_line or app_line).attribute_value.split(None, 1)
+        return to_int(fields[0]) if fields else None
+    return sub_line.pt
+
+# What a media section's a=ssrc lines say about one of its ssrcs.  msid falls back to the section's a=msid line for an
+#  ssrc that doesn't have an msid of its own
+SsrcInfo = namedtuple("SsrcInfo", ["ssrc", "cname", "msid"])
+
+# The ssrcs of an a=ssrc-group:SIM line (one per simulcast layer) and, for each one, the ssrc of its retransmission
+#  stream (from the FID groups, None for a layer without one)
+SimulcastGroup = namedtuple("SimulcastGroup", ["ssrcs", "rtx_ssrcs"])
+
+# The static payload types (RFC 3551) that tend to be offered without an rtpmap line
+static_payload_types = {0: ("PCMU", 8000, None),
+                        3: ("GSM", 8000, None),
+                        4: ("G723", 8000, None),
+                        8: ("PCMA", 8000, None),
+                        9: ("G722", 8000, None),
+                        18: ("G729", 8000, None)}
+
 class SessionSection(PyParsedSection):
     fields = [SdpTerms.VERSION_LINE, SdpTerms.ORIGINATOR_LINE, SdpTerms.SESSION_NAME_LINE, SdpTerms.SESSION_INFORMATION_LINE, 
               SdpTerms.URI_LINE, SdpTerms.EMAIL_ADDRESS_LINE, SdpTerms.PHONE_NUMBER_LINE, SdpTerms.CONNECTION_INFORMATION_LINE,
@@ -183,57 +978,718 @@ class SessionSection(PyParsedSection):
     def __init__(self, parsed_session_section):
         super(SessionSection, self).__init__(parsed_session_section, SessionSection.fields)
 
-    def to_string(self, prefix=""):
-        return super(SessionSection, self).to_string(prefix, [x.lower() for x in SessionSection.fields])
+    def write_string(self, write, prefix=""):
+        super(SessionSection, self).write_string(write, prefix, [x.lower() for x in SessionSection.fields])
 
 class MediaSection(PyParsedSection):
     fields = [SdpTerms.MEDIA_DESCRIPTION_LINE, SdpTerms.SESSION_INFORMATION_LINE, SdpTerms.CONNECTION_INFORMATION_LINE,
               SdpTerms.BANDWIDTH_INFORMATION_LINES, SdpTerms.APPLICATION_LINES]
+    line_indexes = ("attribute_index", "rtpmap_index", "fmtp_index")
+
     def __init__(self, parsed_media_section):
         super(MediaSection, self).__init__(parsed_media_section, MediaSection.fields)
 
+    def reindex(self):
+        super(MediaSection, self).reindex()
+        self.rtpmap_index = {}
+        for rtpmap in self.typed_attribute_lines("rtpmap", RtpMapApplicationLine):
+            self.rtpmap_index.setdefault(rtpmap.pt, rtpmap)
+        self.fmtp_index = {}
+        for fmtp in self.typed_attribute_lines("fmtp", FmtpApplicationLine):
+            self.fmtp_index.setdefault(fmtp.pt, fmtp)
+        self.index_codecs()
+        self.index_ssrcs()
+
+    # Join the rtpmap, fmtp and rtcp-fb lines up into a Codec for each payload type on the m= line, so that looking a
+    #  codec up doesn't involve going through (and splitting up) the lines again
+    def index_codecs(self):
+        intern = SdpIntern.tokens.intern
+        feedback = {}
+        for rtcp_fb in self.typed_attribute_lines("rtcp-fb", RtcpFbApplicationLine):
+            feedback.setdefault(rtcp_fb.pt, []).append(intern(rtcp_fb.feedback()))
+        all_pt_feedback = feedback.get("*", [])
+        self.codec_index = OrderedDict()
+        self.codec_name_index = {}
+        for pt in self.media_description_line.formats:
+            rtpmap = self.rtpmap_index.get(pt)
+            if rtpmap is not None:
+                codec_info = rtpmap.rtpmap_codec_info
+                encoding = (codec_info.encoding_name, codec_info.clock_rate, getattr(codec_info, "encoding_parameters", None))
+            elif pt in static_payload_types:
+                encoding = static_payload_types[pt]
+            else:
+                continue
+            fmtp = self.fmtp_index.get(pt)
+            codec = Codec(pt, encoding[0], encoding[1], encoding[2], fmtp.parameter_dict() if fmtp is not None else {},
+                          tuple(feedback.get(pt, []) + all_pt_feedback))
+            self.codec_index.setdefault(pt, codec)
+            self.codec_name_index.setdefault(intern(codec.encoding_name.lower()), []).append(codec)
+
+    # An SsrcInfo for each ssrc with a=ssrc lines, the rtx ssrc paired with each primary one by the FID groups and the
+    #  simulcast groups, all in one pass over the section's ssrc lines
+    def index_ssrcs(self):
+        msid_lines = self.typed_attribute_lines("msid", GenericApplicationLine)
+        section_msid = msid_lines[0].attribute_value.strip() if msid_lines else None
+        sources = {}
+        for ssrc_line in self.typed_attribute_lines("ssrc", SsrcApplicationLine):
+            source = sources.get(ssrc_line.ssrc)
+            if source is None:
+                source = sources[ssrc_line.ssrc] = [None, section_msid]
+            if ssrc_line.attribute == "cname":
+                source[0] = getattr(ssrc_line, "value", None)
+            elif ssrc_line.attribute == "msid":
+                source[1] = getattr(ssrc_line, "value", None)
+        self.ssrc_index = dict((ssrc, SsrcInfo(ssrc, cname, msid)) for ssrc, (cname, msid) in sources.items())
+        self.fid_index = {}
+        simulcast_ssrcs = []
+        for group in self.typed_attribute_lines("ssrc-group", SsrcGroupApplicationLine):
+            if group.semantics == "FID" and len(group.ssrcs) == 2:
+                self.fid_index.setdefault(group.ssrcs[0], group.ssrcs[1])
+            elif group.semantics == "SIM":
+                simulcast_ssrcs.append(tuple(group.ssrcs))
+        self.simulcast_groups = [SimulcastGroup(ssrcs, tuple(self.fid_index.get(ssrc) for ssrc in ssrcs))
+                                 for ssrcs in simulcast_ssrcs]
+
+    def ssrc_info(self, ssrc):
+        return self.ssrc_index.get(str(ssrc))
+
+    # The ssrc of the retransmission stream for the given one, None if it doesn't have one
+    def rtx_ssrc(self, ssrc):
+        return self.fid_index.get(str(ssrc))
+
+    # (The payload type can be given as an int or a string)
+    def rtpmap(self, pt):
+        return self.rtpmap_index.get(to_int(pt))
+
+    def fmtp(self, pt):
+        return self.fmtp_index.get(to_int(pt))
+
+    def codec(self, pt):
+        return self.codec_index.get(to_int(pt))
+
+    # The section's codecs, in order of preference (the order of the m= line)
+    @property
+    def codecs(self):
+        return list(self.codec_index.values())
+
+    # The codecs with the given encoding name (not case sensitive) and, if one is given, clock rate
+    def find_codecs(self, encoding_name, clock_rate=None):
+        codecs = self.codec_name_index.get(encoding_name.lower(), [])
+        if clock_rate is None:
+            return codecs
+        return [codec for codec in codecs if codec.clock_rate == to_int(clock_rate)]
+
+    # (The properties that read the section's lines peek at them, so they don't copy lines it shares, see clone)
     @property
     def direction(self):
-        for app_line in self.application_lines:
-            if hasattr(app_line, "direction_application_line"):
-                return app_line.direction_application_line.direction
+        attribute_index = self.peek("attribute_index")
+        for direction in media_directions:
+            if direction in attribute_index:
+                return direction
 
-    def to_string(self, prefix=""):
-        return super(MediaSection, self).to_string(prefix, [x.lower() for x in MediaSection.fields])
+    # ---- Changing the media section ----
+    # Drop payload type pt: from the m= line, its rtpmap, fmtp and rtcp-fb lines, and the rtx codec for it along with
+    #  it
+    def remove_codec(self, pt):
+        pt = to_int(pt)
+        rtx_pts = [codec.pt for codec in self.codecs
+                   if codec.encoding_name.lower() == "rtx" and to_int(codec.parameters.get("apt")) == pt]
+        self.retain_formats([fmt for fmt in self.media_description_line.formats if fmt != pt and fmt not in rtx_pts])
+
+    # Keep only the given payload types (in the order they're already in), dropping the rest from the m= line along
+    #  with their rtpmap, fmtp and rtcp-fb lines.  An m= line needs at least one format, so this raises a ValueError
+    #  instead of removing all of them (to turn a section down, set its port to 0)
+    def retain_formats(self, formats):
+        check_not_frozen(self)
+        keep = set(to_int(fmt) for fmt in formats)
+        media_description_line = self.media_description_line
+        retained = [fmt for fmt in media_description_line.formats if fmt in keep]
+        if not retained:
+            raise ValueError("None of %s are in the m= line '%s'" % (sorted(keep, key=str), media_description_line.to_sdp()))
+        if retained == media_description_line.formats:
+            return
+        self.own_line("media_description_line").formats = retained
+
+        def dropped(app_line):
+            fmt = line_format(app_line)
+            return fmt is not None and fmt != "*" and fmt not in keep
+        # (The codec table has to be rebuilt either way)
+        if not self.remove_application_lines(dropped):
+            self.reindex()
+
+    # Replace the section's direction attribute (or add one if it doesn't have it). Only RTP sections have a
+    #  direction: an m=application data channel (SCTP) doesn't
+    def set_direction(self, direction):
+        if direction not in media_directions:
+            raise ValueError("Unknown direction '%s', expected one of: %s" % (direction, ", ".join(media_directions)))
+        if not self.is_rtp:
+            raise ValueError("Can't set a direction on the non-RTP m= line '%s'" % self.peek("media_description_line").to_sdp())
+        check_not_frozen(self)
+        direction_lines = [app_line for name in media_directions for app_line in self.attribute_lines(name)]
+        if [app_line.attribute_name for app_line in direction_lines] == [direction]:
+            return
+        if not direction_lines:
+            self.add_application_line(direction)
+            return
+        # The new line goes where the (first) old one was
+        sub_lines = self.application_lines.sub_lines
+        position = min(sub_lines.index(app_line) for app_line in direction_lines)
+        sub_lines = [app_line for app_line in sub_lines if app_line.attribute_name not in media_directions]
+        sub_lines.insert(position, ApplicationLine(fast.parse_application_line("a=" + direction)))
+        self.application_lines.sub_lines = sub_lines
+        self.reindex()
+
+    def set_port(self, port):
+        check_not_frozen(self)
+        port = to_int(port)
+        if self.media_description_line.port != port:
+            self.own_line("media_description_line").port = port
+
+    @property
+    def media_type(self):
+        return self.peek("media_description_line").media_type
+
+    # Whether the section carries RTP (audio, video), rather than e.g. an SCTP data channel
+    @property
+    def is_rtp(self):
+        return "RTP/" in self.peek("media_description_line").proto
+
+    @property
+    def mid(self):
+        for app_line in self.peek("attribute_index").get("mid", []):
+            if hasattr(app_line, "mid_application_line"):
+                return app_line.mid_application_line.id
+            # (A generic application line, or one that wasn't parsed)
+            return getattr(app_line, "generic_application_line", app_line).attribute_value.strip()
+
+    def write_string(self, write, prefix=""):
+        super(MediaSection, self).write_string(write, prefix, [x.lower() for x in MediaSection.fields])
 
 class MediaSections(PyParsedMultiSection):
     def __init__(self, parsed_media_sections):
         super(MediaSections, self).__init__(MediaSection, parsed_media_sections)
-    
+
+    def media_type(self, index):
+        return self.sub_sections[index].media_type
+
+    def mid(self, index):
+        return self.sub_sections[index].mid
+
+    def ssrcs(self, index):
+        return self.sub_sections[index].ssrc_index.keys()
+
+    # The text the section at index was parsed from, as long as it still matches it (None if it doesn't)
+    def unmodified_section_string(self, index):
+        # (self[index] rather than sub_sections, which lazy media sections would have to parse all of)
+        section = self[index]
+        return None if section.is_modified() else section._raw
+
+    def clone(self):
+        sections = MediaSections([])
+        sections.sub_sections = [section.clone() for section in self.sub_sections]
+        return sections
+
+def build_media_section(parse_media_section, section_string, projection=None):
+    if projection is not None:
+        section = projection.build_section(MediaSection, parse_media_section, section_string)
+    else:
+        section = MediaSection(parse_media_section(section_string))
+    section.attach_raw(section_string)
+    return section
+
+# Which parts of an sdp to parse (see Sdp): the media sections of the types in include_media, and the a= lines for the
+#  attributes in include_attributes (named the way attribute_name names them: "rtpmap", "mid", "sendrecv",
+#  "rtcp-mux", ...), all of them if either is None.  A media section of another type is kept as its raw text, like
+#  with lazy=True, and is only parsed if it's accessed.  The other a= lines are taken out of a section's text before
+#  it's handed to the parser and put back afterwards as UnparsedApplicationLines, in the section's own application
+#  lines, so the sdp is still written out as it was received
+class Projection(object):
+    def __init__(self, include_media=None, include_attributes=None):
+        self.include_media = frozenset(include_media) if include_media is not None else None
+        self.include_attributes = frozenset(include_attributes) if include_attributes is not None else None
+
+    def includes_media(self, media_type):
+        return self.include_media is None or media_type in self.include_media
+
+    def build_section(self, section_type, parse_section, section_string):
+        if self.include_attributes is None:
+            return section_type(parse_section(section_string))
+        # The lines to parse, and for each a= line in order, the raw text of the ones that are left out (None for the
+        #  others).  The a= lines come last in a section, after all the others
+        kept_lines = []
+        app_lines = []
+        for line in section_string.split("\n"):
+            if line.startswith("a="):
+                raw_line = line.rstrip("\r")
+                if raw_line[2:].partition(":")[0].strip() not in self.include_attributes:
+                    app_lines.append(raw_line)
+                    continue
+                app_lines.append(None)
+            kept_lines.append(line)
+        section = section_type(parse_section("\n".join(kept_lines)))
+        parsed_lines = getattr(section, "application_lines", None) or ()
+        # If the parser stopped early there's nothing to line the left out lines up with (attach_raw raises then)
+        if len(app_lines) == len(parsed_lines) or len(parsed_lines) != app_lines.count(None):
+            return section
+        parsed_lines = iter(list(parsed_lines))
+        sub_lines = [next(parsed_lines) if raw_line is None else UnparsedApplicationLine(raw_line) for raw_line in app_lines]
+        if getattr(section, "application_lines", None) is None:
+            section.application_lines = ApplicationLines([])
+        section.application_lines.sub_lines = sub_lines
+        section.reindex()
+        return section
+
+# Parse an sdp a section at a time as its lines come in (from a file, a socket's makefile(), or any other iterable of
+#  lines), yielding the SessionSection and then each MediaSection as soon as its last line has been read.  Only the
+#  lines of the section being read are held on to.  Lines are expected to still have their line endings (CRLF is
+#  added to the ones that don't), bytes are decoded as utf-8.
+def iter_sections(lines, engine="pyparsing"):
+    engine = get_engine(engine)
+    section_lines = []
+    in_session_section = True
+    for line in lines:
+        if not isinstance(line, basestring):
+            line = line.decode("utf-8")
+        if not line.endswith("\n"):
+            line += "\r\n"
+        if line.startswith("m="):
+            yield build_section(engine, "".join(section_lines), in_session_section)
+            section_lines = []
+            in_session_section = False
+        section_lines.append(line)
+    yield build_section(engine, "".join(section_lines), in_session_section)
+
+def build_section(engine, section_string, session_section, projection=None):
+    if not session_section:
+        return build_media_section(engine.parse_media_section, section_string, projection)
+    if projection is not None:
+        section = projection.build_section(SessionSection, engine.parse_session_section, section_string)
+    else:
+        section = SessionSection(engine.parse_session_section(section_string))
+    section.attach_raw(section_string)
+    return section
+
+# Media sections that are only parsed the first time they're accessed.  Holds on to the raw text of each section
+#  until then, so a section that is never looked at is never parsed
+class LazyMediaSections(MediaSections):
+    # What the sections are parsed with (see Projection), all of it if it's None
+    projection = None
+
+    def __init__(self, parse_media_section, media_section_strings, projection=None):
+        self.parse_media_section = parse_media_section
+        self.section_strings = list(media_section_strings)
+        self.parsed_sections = [None] * len(self.section_strings)
+        self.frozen = False
+        self.projection = projection
+
+    # The raw text of a section that hasn't been parsed yet
+    def section_string(self, index):
+        return self.section_strings[index]
+
+    def __getitem__(self, index):
+        section = self.parsed_sections[index]
+        if section is None:
+            section = build_media_section(self.parse_media_section, self.section_string(index), self.projection)
+            if self.frozen:
+                section.freeze()
+            self.parsed_sections[index] = section
+            # The parsed section has everything the raw text had, no need to hold on to both
+            self.section_strings[index] = None
+        return section
+
+    def __iter__(self):
+        for index in range(len(self.parsed_sections)):
+            yield self[index]
+
+    def __len__(self):
+        return len(self.parsed_sections)
+
+    @property
+    def sub_sections(self):
+        return list(self)
+
+    def freeze(self):
+        # Sections that haven't been parsed yet get frozen when they are
+        self.frozen = True
+        for section in self.parsed_sections:
+            if section is not None:
+                section.freeze()
+
+    # The clone parses the sections that haven't been parsed yet on its own, the text of each one is shared
+    def clone(self):
+        sections = copy.copy(self)
+        sections.section_strings = list(self.section_strings)
+        sections.parsed_sections = [section.clone() if section is not None else None for section in self.parsed_sections]
+        sections.frozen = False
+        return sections
+
+    def media_type(self, index):
+        # Peek at the m= line instead of parsing the whole section
+        if self.parsed_sections[index] is None:
+            return self.section_strings[index][2:].split(None, 1)[0]
+        return self.parsed_sections[index].media_type
+
+    def mid(self, index):
+        if self.parsed_sections[index] is None:
+            value = fast.peek_attribute(self.section_strings[index], "mid")
+            return value.strip() if value is not None else None
+        return self.parsed_sections[index].mid
+
+    def ssrcs(self, index):
+        if self.parsed_sections[index] is None:
+            section_string = self.section_strings[index]
+            return unique_ssrcs(section_string[start:end] for start, end in fast.find_attributes(section_string, "ssrc"))
+        return self.parsed_sections[index].ssrc_index.keys()
+
+    def unmodified_section_string(self, index):
+        if self.parsed_sections[index] is None:
+            return self.section_string(index)
+        return super(LazyMediaSections, self).unmodified_section_string(index)
+
+    # A section that was never parsed can't have been modified, so its raw text is written out as-is (and it still
+    #  isn't parsed)
+    def iter_sdp(self, line_ending=None):
+        for index, section in enumerate(self.parsed_sections):
+            if section is None:
+                yield terminate_section(self.section_string(index), line_ending)
+            else:
+                for piece in section.iter_sdp(line_ending):
+                    yield piece
+
+    def iter_lines(self, line_ending=None):
+        for index, section in enumerate(self.parsed_sections):
+            if section is None:
+                for line in wire_lines(terminate_section(self.section_string(index), line_ending)):
+                    yield line
+            else:
+                for line in section.iter_lines(line_ending):
+                    yield line
+
+# Lazy media sections that are left in the bytes-like buffer the sdp was parsed from (see Sdp.from_buffer) until
+#  they're accessed, only their offsets are kept.  Peeking at the media type or mid decodes just that bit of the buffer
+class BufferMediaSections(LazyMediaSections):
+    def __init__(self, parse_media_section, buffer, section_spans, encoding):
+        super(BufferMediaSections, self).__init__(parse_media_section, [None] * len(section_spans))
+        self.buffer = buffer
+        self.section_spans = section_spans
+        self.encoding = encoding
+
+    def decode(self, start, end):
+        return self.buffer[start:end].decode(self.encoding)
+
+    def section_string(self, index):
+        return self.decode(*self.section_spans[index])
+
+    def media_type(self, index):
+        if self.parsed_sections[index] is None:
+            start, end = self.section_spans[index]
+            line_end = self.buffer.find(b"\n", start, end)
+            return self.decode(start + 2, end if line_end == -1 else line_end).split(None, 1)[0]
+        return self.parsed_sections[index].media_type
+
+    def mid(self, index):
+        if self.parsed_sections[index] is None:
+            span = fast.find_attribute(self.buffer, "mid", *self.section_spans[index], newline=b"\n")
+            return self.decode(*span).strip() if span is not None else None
+        return self.parsed_sections[index].mid
+
+    def ssrcs(self, index):
+        if self.parsed_sections[index] is None:
+            spans = fast.find_attributes(self.buffer, "ssrc", *self.section_spans[index], newline=b"\n")
+            return unique_ssrcs(self.decode(start, end) for start, end in spans)
+        return self.parsed_sections[index].ssrc_index.keys()
+
+# The ssrcs the raw values of a section's a=ssrc lines are for, each one once
+def unique_ssrcs(ssrc_values):
+    ssrcs = []
+    seen = set()
+    for value in ssrc_values:
+        ssrc = fast.peek_ssrc(value)
+        if ssrc is not None and ssrc not in seen:
+            seen.add(ssrc)
+            ssrcs.append(ssrc)
+    return ssrcs
+
+# Something bytes-like that can be searched in place: a memoryview is swapped for the object it's a view of (as long
+#  as it covers all of it, otherwise it has to be copied)
+def searchable_buffer(data):
+    if isinstance(data, memoryview):
+        obj = getattr(data, "obj", None)
+        if obj is not None and hasattr(obj, "find") and data.nbytes == len(obj):
+            return obj
+        return data.tobytes()
+    return data
+
 # ------ SDP top level class ------
-class Sdp:
+# What Sdp.reparse had to parse again: whether the session section changed, the indexes of the media sections that
+#  changed (or were added) and the indexes of the ones that were removed
+SdpChanges = namedtuple("SdpChanges", ["session_section", "media_sections", "removed_media_sections"])
+
+class Sdp(object):
     fields = [SdpTerms.SESSION_SECTION, SdpTerms.MEDIA_SECTIONS]
-    def __init__(self, sdp_string):
-        res = grammar.sdp.parseString(sdp_string)
-        for field in Sdp.fields:
-            setattr(self, field.lower(), SdpObjectMapping[field](res[field]))
+    _frozen = False
+    # Set on an sdp that came from reparse
+    changes = None
+    # Set on an sdp that was only partly parsed (see Projection)
+    projection = None
+
+    # With lazy=True only the session section is parsed up front, each media section is parsed the first time it's
+    #  accessed (so a malformed media section won't raise until then).  With limits (an SdpValidation.Limits) the
+    #  body is pre-scanned against them first, and a SdpValidation.ValidationError raised if it's rejected.
+    #  include_media and include_attributes (sets of media types and attribute names) say which parts of the sdp to
+    #  parse if it isn't all of it, see Projection.  The media sections of other types are left unparsed (even without
+    #  lazy=True), so they're best left alone too: find the ones to look at with by_media_type rather than going
+    #  through all of media_sections
+    def __init__(self, sdp_string, engine="pyparsing", lazy=False, limits=None, include_media=None, include_attributes=None):
+        if limits is not None:
+            SdpValidation.prescan(sdp_string, limits)
+        self.engine = engine
+        engine = get_engine(engine)
+        # Lines that have to be formatted when writing the sdp back out use the same line ending as the input
+        self.line_ending = "\r\n" if "\r\n" in sdp_string else "\n"
+        section_strings = fast.split_section_strings(sdp_string)
+        if include_media is not None or include_attributes is not None:
+            self.projection = Projection(include_media, include_attributes)
+        if lazy or self.projection is not None:
+            self.session_section = build_section(engine, section_strings[0], True, self.projection)
+            self.media_sections = LazyMediaSections(engine.parse_media_section, section_strings[1:], self.projection)
+            if not lazy:
+                for index in range(len(self.media_sections)):
+                    if self.projection.includes_media(self.media_sections.media_type(index)):
+                        self.media_sections[index]
+        else:
+            res = engine.parse_sdp(sdp_string)
+            for field in Sdp.fields:
+                # An sdp without any m= lines won't have a MEDIA_SECTIONS result at all
+                setattr(self, field.lower(), SdpObjectMapping[field](res[field] if field in res else []))
+            self.session_section.attach_raw(section_strings[0])
+            # If the parser stopped early (at a line it couldn't parse) there are fewer sections than slices
+            if len(self.media_sections) != len(section_strings) - 1:
+                raise ValueError("Couldn't parse media section %d: %s" %
+                                 (len(self.media_sections) + 1,
+                                  SdpValidation.excerpt(section_strings[len(self.media_sections) + 1].split("\n", 1)[0])))
+            for section, section_string in zip(self.media_sections, section_strings[1:]):
+                section.attach_raw(section_string)
+        self.reindex()
+
+    # Parse an sdp straight out of a bytes-like buffer (bytes, a bytearray, a memoryview or an mmap, e.g. a message
+    #  body as it came off the wire) without decoding and copying all of it first.  Only the session section is
+    #  decoded and parsed up front; for the media sections just their offsets are recorded, each one is decoded and
+    #  parsed the first time it's accessed (like with lazy=True).  The buffer has to stay as it is for as long as the
+    #  sdp is in use
+    @staticmethod
+    def from_buffer(data, engine="pyparsing", encoding="utf-8"):
+        parser = get_engine(engine)
+        buffer = searchable_buffer(data)
+        section_spans = fast.split_section_spans(buffer, b"\nm=")
+        session_start, session_end = section_spans[0]
+        session_string = buffer[session_start:session_end].decode(encoding)
+        sdp = Sdp.__new__(Sdp)
+        sdp.engine = engine
+        sdp.line_ending = "\r\n" if "\r\n" in session_string else "\n"
+        sdp.session_section = SessionSection(parser.parse_session_section(session_string))
+        sdp.session_section.attach_raw(session_string)
+        sdp.media_sections = BufferMediaSections(parser.parse_media_section, buffer, section_spans[1:], encoding)
+        sdp.reindex()
+        return sdp
+
+    # Parse a new version of this sdp (e.g. a re-offer during renegotiation), reusing the section objects of the
+    #  sections whose text hasn't changed and only parsing the rest.  Sections are compared by position.  The new sdp
+    #  is lazy if this one is, and its changes attribute says which sections had to be parsed.  Reused sections are
+    #  clones (see Sdp.clone), so changing one of the sdps doesn't change the other
+    def reparse(self, sdp_string):
+        engine = SdpEngines[self.engine]
+        section_strings = fast.split_section_strings(sdp_string)
+        new_sdp = Sdp.__new__(Sdp)
+        new_sdp.engine = self.engine
+        new_sdp.line_ending = "\r\n" if "\r\n" in sdp_string else "\n"
+        new_sdp.projection = self.projection
+
+        session_changed = self.session_section.is_modified() or self.session_section._raw != section_strings[0]
+        if session_changed:
+            new_sdp.session_section = build_section(engine, section_strings[0], True, self.projection)
+        else:
+            new_sdp.session_section = self.session_section.clone()
+
+        old_sections = self.media_sections
+        lazy = isinstance(old_sections, LazyMediaSections)
+        sections = []
+        changed = []
+        for index, section_string in enumerate(section_strings[1:]):
+            if index < len(old_sections) and old_sections.unmodified_section_string(index) == section_string:
+                section = old_sections.parsed_sections[index] if lazy else old_sections[index]
+                sections.append(section.clone() if section is not None else None)
+            else:
+                changed.append(index)
+                sections.append(None if lazy else build_media_section(engine.parse_media_section, section_string, self.projection))
+        if lazy:
+            # Like LazyMediaSections does itself, only hold on to the text of the sections that haven't been parsed
+            new_sdp.media_sections = LazyMediaSections(engine.parse_media_section,
+                                                       [section_string if section is None else None
+                                                        for section, section_string in zip(sections, section_strings[1:])],
+                                                       self.projection)
+            new_sdp.media_sections.parsed_sections = sections
+        else:
+            new_sdp.media_sections = MediaSections([])
+            new_sdp.media_sections.sub_sections = sections
+        new_sdp.changes = SdpChanges(session_changed, changed, list(range(len(sections), len(old_sections))))
+        new_sdp.reindex()
+        return new_sdp
+
+    # Parse an sdp, going through an SdpCache.SdpCache if one is given (the sdp that comes back is frozen then)
+    @staticmethod
+    def parse(sdp_string, cache=None, **kwargs):
+        if cache is None:
+            return Sdp(sdp_string, **kwargs)
+        return cache.parse(sdp_string, **kwargs)
+
+    # await Sdp.parse_async(sdp_string) parses an sdp without blocking the asyncio event loop (python 3.6+, see
+    #  SdpAsync, which it's imported from when it's first used so that this module still imports on python 2).  The
+    #  other keyword arguments (limits, include_media, include_attributes) are passed on to the Sdp
+    @staticmethod
+    def parse_async(sdp_string, engine="pyparsing", lazy=False, parser=None, **options):
+        import SdpAsync
+        return SdpAsync.parse_async(sdp_string, engine, lazy, parser, **options)
+
+    def __setattr__(self, name, value):
+        check_not_frozen(self)
+        object.__setattr__(self, name, value)
+
+    def is_frozen(self):
+        return self._frozen
+
+    # Make the sdp read-only: assigning to it, any of its sections or any of their lines raises from then on
+    def freeze(self):
+        self.session_section.freeze()
+        self.media_sections.freeze()
+        self._frozen = True
+
+    # A copy of the sdp that can be changed without affecting this one, for making a variant of it (e.g. one per
+    #  participant when an offer is fanned out).  Rather than copying everything, the clone shares this sdp's lines:
+    #  only the sections are new, and a line is only copied once it's got from one of the sections sharing it (see
+    #  PyParsedSection.clone).  Writing either sdp out doesn't copy any.  Clones can be cloned in turn
+    def clone(self):
+        sdp = Sdp.__new__(Sdp)
+        sdp.engine = self.engine
+        sdp.line_ending = self.line_ending
+        sdp.projection = self.projection
+        sdp.session_section = self.session_section.clone()
+        sdp.media_sections = self.media_sections.clone()
+        sdp.media_type_index = self.media_type_index
+        sdp.mid_index = self.mid_index
+        sdp.ssrc_index = self.ssrc_index
+        return sdp
+
+    # Build the media section lookup tables (by media type, by mid and by ssrc).  Done when the sdp is created; after
+    #  adding, removing or changing media sections directly it has to be called again.  The tables hold indexes into
+    #  media_sections, so (with lazy=True) a section is still only parsed once it's looked up
+    def reindex(self):
+        self.media_type_index = {}
+        self.mid_index = {}
+        self.ssrc_index = {}
+        for index in range(len(self.media_sections)):
+            self.media_type_index.setdefault(self.media_sections.media_type(index), []).append(index)
+            mid = self.media_sections.mid(index)
+            if mid is not None:
+                self.mid_index.setdefault(mid, index)
+            for ssrc in self.media_sections.ssrcs(index):
+                self.ssrc_index.setdefault(ssrc, index)
+
+    def by_mid(self, mid):
+        index = self.mid_index.get(mid)
+        return self.media_sections[index] if index is not None else None
+
+    def by_ssrc(self, ssrc):
+        index = self.ssrc_index.get(str(ssrc))
+        return self.media_sections[index] if index is not None else None
+
+    # The SsrcInfo for an ssrc from the media section it's in, None if none of them have it
+    def ssrc_info(self, ssrc):
+        section = self.by_ssrc(ssrc)
+        return section.ssrc_info(ssrc) if section is not None else None
+
+    # ---- Changing the sdp ----
+    # Like the section methods they call, these only touch the lines they have to
+
+    # Point the c= lines at address: all of them, or the session one if there aren't any
+    def set_connection(self, address, addrtype=None):
+        sections = [section for section in [self.session_section] + list(self.media_sections)
+                    if getattr(section, "connection_information_line", None) is not None]
+        for section in sections or [self.session_section]:
+            section.set_connection(address, addrtype)
+
+    # Set the direction of the RTP sections (the data channel section, if there is one, doesn't have a direction)
+    def set_direction(self, direction):
+        for section in self.media_sections:
+            if section.is_rtp:
+                section.set_direction(direction)
+
+    # Remove all the lines for an attribute from all of the sections (e.g. "candidate"), returns how many were removed
+    def remove_attribute(self, attribute_name):
+        removed = sum(section.remove_attribute(attribute_name) for section in [self.session_section] + list(self.media_sections))
+        if removed:
+            self.reindex()
+        return removed
+
+    def by_media_type(self, media_type):
+        return [self.media_sections[index] for index in self.media_type_index.get(media_type, [])]
+
+    def find_media_section(self, media_type):
+        indexes = self.media_type_index.get(media_type)
+        return self.media_sections[indexes[0]] if indexes else None
 
     @property
     def audio(self):
-        for media_section in self.media_sections:
-            if media_section.media_description_line.media_type == "audio":
-                return media_section
-        return None
+        return self.find_media_section("audio")
 
     @property
     def video(self):
-        for media_section in self.media_sections:
-            if media_section.media_description_line.media_type == "video":
-                return media_section
-        return None
+        return self.find_media_section("video")
 
-    def to_string(self, prefix=""):
-        str = ""
+    # Write the sdp out in wire format.  Sections that haven't been modified since they were parsed are written
+    #  out exactly as they were received, unless line_ending isn't the one the sdp was received with (then every line
+    #  ends in line_ending)
+    def to_sdp(self, line_ending=None):
+        return "".join(self.iter_sdp(line_ending))
+
+    serialize = to_sdp
+
+    # The wire format in the pieces to_sdp joins: an unmodified section as one piece, a modified one a line at a time
+    def iter_sdp(self, line_ending=None):
+        line_ending = line_ending or self.line_ending
+        for piece in self.session_section.iter_sdp(line_ending):
+            yield piece
+        for piece in self.media_sections.iter_sdp(line_ending):
+            yield piece
+
+    # The wire format a line at a time, each line with its line ending
+    def iter_lines(self, line_ending=None):
+        line_ending = line_ending or self.line_ending
+        for line in self.session_section.iter_lines(line_ending):
+            yield line
+        for line in self.media_sections.iter_lines(line_ending):
+            yield line
+
+    # Writes the wire format to fp (anything with a write method that takes a str) without building the whole sdp as
+    #  one string first
+    def write(self, fp, line_ending=None):
+        for piece in self.iter_sdp(line_ending):
+            fp.write(piece)
+
+    def write_string(self, write, prefix=""):
         for field in Sdp.fields:
             if hasattr(self, field.lower()):
-                str += "%s:\n%s\n" % (field, getattr(self, field.lower()).to_string("  "))
-        return str
-        
+                write("%s:\n" % field)
+                getattr(self, field.lower()).write_string(write, "  ")
+                write("\n")
+
+    def to_string(self, prefix=""):
+        return join_pieces(self.write_string, prefix)
+
+    # Writes the debug dump (to_string) to fp
+    def dump(self, fp):
+        self.write_string(fp.write)
+
 
 # Map Sdp terms to their corresponding object
 SdpObjectMapping = {SdpTerms.VERSION_LINE: VersionLine,
@@ -256,7 +1712,112 @@ SdpObjectMapping = {SdpTerms.VERSION_LINE: VersionLine,
                     SdpTerms.RTCP_MUX_APPLICATION_LINE: RtcpMuxApplicationLine,
                     SdpTerms.RTPMAP_APPLICATION_LINE: RtpMapApplicationLine,
                     SdpTerms.RTPMAP_CODEC_INFO: RtpMapCodecInfo,
+                    SdpTerms.CANDIDATE_APPLICATION_LINE: CandidateApplicationLine,
+                    SdpTerms.FMTP_APPLICATION_LINE: FmtpApplicationLine,
+                    SdpTerms.RTCP_FB_APPLICATION_LINE: RtcpFbApplicationLine,
+                    SdpTerms.EXTMAP_APPLICATION_LINE: ExtmapApplicationLine,
+                    SdpTerms.SSRC_APPLICATION_LINE: SsrcApplicationLine,
+                    SdpTerms.SSRC_GROUP_APPLICATION_LINE: SsrcGroupApplicationLine,
                     SdpTerms.GENERIC_APPLICATION_LINE: GenericApplicationLine,
                     SdpTerms.MEDIA_DESCRIPTION_LINE: MediaDescriptionLine,
                     SdpTerms.SESSION_SECTION: SessionSection,
                     SdpTerms.MEDIA_SECTIONS: MediaSections}
+
+# The pyparsing grammar takes a while to build (and pyparsing a while to import), so that's left until the first time
+#  something is parsed with it.  Sdps that only ever use the fast engine never import pyparsing at all
+def pyparsing_grammar():
+    import PyParsingSdpDefs
+    while pending_attribute_grammars:
+        register_attribute_grammar(PyParsingSdpDefs, *pending_attribute_grammars.pop(0))
+    return PyParsingSdpDefs
+
+# Attributes registered before the pyparsing grammar was built, added to it when it is (see register_attribute)
+pending_attribute_grammars = []
+
+def register_attribute_grammar(grammar, name, term, parser):
+    if not hasattr(parser, "parseString"):
+        parser = parser(grammar)
+    grammar.register_attribute_grammar(name, term, grammar.Group(parser))
+
+# (A class rather than a closure so that it can be pickled along with a LazyMediaSections)
+class GrammarParser(object):
+    def __init__(self, element_name):
+        self.element_name = element_name
+
+    def __call__(self, sdp_string):
+        return getattr(pyparsing_grammar(), self.element_name).parseString(sdp_string)
+
+# The parsers an Sdp can be built with.  Both produce the same structure of named results, which the objects
+#  above are built from
+SdpEngine = namedtuple("SdpEngine", ["parse_sdp", "parse_session_section", "parse_media_section"])
+SdpEngines = {"pyparsing": SdpEngine(GrammarParser("sdp"), GrammarParser("session_section"), GrammarParser("media_section")),
+              "fast": SdpEngine(fast.parse_sdp, fast.parse_session_section, fast.parse_media_section)}
+
+def get_engine(engine):
+    if engine not in SdpEngines:
+        raise ValueError("Unknown engine '%s', expected one of: %s" % (engine, ", ".join(sorted(SdpEngines))))
+    return SdpEngines[engine]
+
+# Parse a single ICE candidate (e.g. one trickled in on its own) straight into a CandidateApplicationLine, without
+#  going through an Sdp.  Takes the line with or without the 'a=' (as in an RTCIceCandidate's candidate string)
+#  The line is built straight from the fields, converting them the way PyParsedLine.__init__ would (see
+#  CandidateApplicationLine), which is most of the time taken for a line that goes through that
+def parse_candidate(line):
+    value = line[12:] if line.startswith("a=candidate:") else line[10:] if line.startswith("candidate:") else None
+    parsed = fast.split_candidate_attribute(value) if value is not None else None
+    if parsed is None:
+        raise ValueError("Not a valid candidate line: '%s'" % line)
+    fields, raddr, rport, tcptype, extensions = parsed
+    intern_token = SdpIntern.tokens.intern
+    intern_value = SdpIntern.values.intern
+    candidate = new_candidate(CandidateApplicationLine)
+    set_raw(candidate, None)
+    set_modified(candidate, False)
+    set_foundation(candidate, fields[0])
+    set_component(candidate, intern_token(fields[1]))
+    set_transport(candidate, intern_token(fields[2]))
+    set_priority(candidate, fields[3])
+    set_address(candidate, fields[4])
+    set_port(candidate, int(fields[5]))
+    set_type(candidate, intern_token(fields[7]))
+    if raddr is not None:
+        set_raddr(candidate, intern_value(raddr))
+    if rport is not None:
+        set_rport(candidate, int(rport))
+    if tcptype is not None:
+        set_tcptype(candidate, intern_token(tcptype))
+    if extensions is not None:
+        set_extensions(candidate, list(map(intern_value, extensions)))
+    return candidate
+
+new_candidate = object.__new__
+(set_foundation, set_component, set_transport, set_priority, set_address, set_port, set_type, set_raddr, set_rport,
+ set_tcptype, set_extensions) = [getattr(CandidateApplicationLine, name).__set__ for name in CandidateApplicationLine.__slots__]
+
+# Add a typed application line for the attribute 'a=<name>:<value>' (or 'a=<name>' for a property attribute).
+#  parser is the pyparsing grammar for the part of the line after the 'a=' with a results name for each field (like
+#  the application_line_* grammars in PyParsingSdpDefs), and cls the line class the results are turned into: like the
+#  application line classes above, a PyParsedLine with a slot for each field, an attribute_name and a way of writing
+#  itself back out (sdp_format or format_sdp).  The line is then available as
+#  app_line.<name>_application_line (with '-' turned into '_').  parser can also be a function that takes the
+#  PyParsingSdpDefs module and returns the grammar, so that it isn't built until the pyparsing engine is used.
+# The fast engine runs the same grammar over the line, unless it's given a fast_parser: a function that takes the part
+#  after the '<name>:' and returns a dict of the fields (or None if the value doesn't fit, like the attribute parsers
+#  in FastSdpDefs).  Either way a line that doesn't fit is a generic application line.
+# Registering doesn't import pyparsing: if the grammar hasn't been built yet, the attribute is added to it when it is
+def register_attribute(name, parser, cls, fast_parser=None):
+    term = "%s_APPLICATION_LINE" % name.upper().replace("-", "_")
+    if fast_parser is None:
+        def fast_parser(value):
+            grammar = pyparsing_grammar()
+            try:
+                return grammar.application_line_attributes[name].parseString("%s:%s" % (name, value) if value else name,
+                                                                             parseAll=True)[0]
+            except grammar.ParseException:
+                return None
+    if "PyParsingSdpDefs" in sys.modules:
+        register_attribute_grammar(pyparsing_grammar(), name, term, parser)
+    else:
+        pending_attribute_grammars.append((name, term, parser))
+    fast.register_attribute_parser(name, term, fast_parser)
+    SdpObjectMapping[term] = cls
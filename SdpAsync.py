@@ -0,0 +1,96 @@
+import asyncio
+import collections
+import os
+import weakref
+from Sdp import Sdp
+
+# Parsing sdps from asyncio code (python 3.6+) without blocking the event loop: a big offer takes milliseconds to
+#  parse (tens of them with the pyparsing engine), so parses are handed to an executor, a limited number at a time.
+#  A coroutine that wants to parse while that many parses are already running waits for one of them to finish, which
+#  is how a busy signaling server gets backpressure instead of a queue of parses that keeps growing.  Small sdps are
+#  parsed on the event loop itself, since parsing them takes about as long as handing them to an executor.
+
+# How big (in characters) an sdp parsed inline can be, per engine: with the fast engine a 1KB sdp parses in a few
+#  hundred microseconds, the pyparsing engine takes about that long for a small session section alone
+default_inline_max_bytes = {"fast": 1024, "pyparsing": 128}
+
+# Run in the executor, a module level function so that it can be sent to a ProcessPoolExecutor.  options are the
+#  rest of the Sdp constructor's keyword arguments (limits, include_media, include_attributes)
+def parse_sdp(sdp_string, engine, lazy, options):
+    return Sdp(sdp_string, engine=engine, lazy=lazy, **options)
+
+def get_running_loop():
+    get_loop = getattr(asyncio, "get_running_loop", None)
+    return get_loop() if get_loop is not None else asyncio.get_event_loop()
+
+class AsyncParser(object):
+    # executor is a concurrent.futures ThreadPoolExecutor or ProcessPoolExecutor to parse on, the event loop's default
+    #  executor (threads) if it's None.  Threads keep the event loop responsive but, because of the GIL, don't parse
+    #  any faster than the loop would; processes parse in parallel but the parsed Sdp has to be pickled back.
+    #  max_concurrency is how many parses can be in the executor at once (one per cpu by default), and sdps of up to
+    #  inline_max_bytes (default_inline_max_bytes for the engine if it's None, 0 to always use the executor) are
+    #  parsed inline
+    def __init__(self, executor=None, max_concurrency=None, inline_max_bytes=None):
+        self.executor = executor
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.inline_max_bytes = inline_max_bytes
+        # A semaphore belongs to the event loop it's first used on, so there's one per loop
+        self.semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self, loop):
+        semaphore = self.semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self.semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def parses_inline(self, sdp_string, engine):
+        inline_max_bytes = self.inline_max_bytes
+        if inline_max_bytes is None:
+            inline_max_bytes = default_inline_max_bytes.get(engine, 0)
+        return len(sdp_string) <= inline_max_bytes
+
+    # Parses sdp_string like Sdp(sdp_string, engine=engine, lazy=lazy, **options) does, inline or in the executor.
+    #  (With limits, a body that's rejected is rejected either way)
+    async def parse(self, sdp_string, engine="pyparsing", lazy=False, **options):
+        if self.parses_inline(sdp_string, engine):
+            return parse_sdp(sdp_string, engine, lazy, options)
+        loop = get_running_loop()
+        async with self.semaphore(loop):
+            return await loop.run_in_executor(self.executor, parse_sdp, sdp_string, engine, lazy, options)
+
+    # Yields an Sdp for each sdp string from source (an iterable or an async iterable), in order.  Up to
+    #  max_concurrency sdps are parsed ahead of the one that's being waited for; source isn't read any further ahead
+    #  than that.  If an sdp fails to parse, its exception is raised when its turn comes
+    async def parse_stream(self, source, engine="pyparsing", lazy=False, **options):
+        loop = get_running_loop()
+        pending = collections.deque()
+        try:
+            async for sdp_string in iterate(source):
+                if len(pending) >= self.max_concurrency:
+                    yield await pending.popleft()
+                pending.append(loop.create_task(self.parse(sdp_string, engine, lazy, **options)))
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+async def iterate(source):
+    if hasattr(source, "__aiter__"):
+        async for item in source:
+            yield item
+    else:
+        for item in source:
+            yield item
+
+# Shared by parse_async and parse_stream_async when they aren't given a parser
+default_parser = AsyncParser()
+
+# await parse_async(sdp_string) parses sdp_string like Sdp(sdp_string, engine=engine, lazy=lazy, **options) does,
+#  with parser (an AsyncParser) or the default one
+async def parse_async(sdp_string, engine="pyparsing", lazy=False, parser=None, **options):
+    return await (parser or default_parser).parse(sdp_string, engine, lazy, **options)
+
+# async for sdp in parse_stream_async(source): see AsyncParser.parse_stream
+def parse_stream_async(source, engine="pyparsing", lazy=False, parser=None, **options):
+    return (parser or default_parser).parse_stream(source, engine, lazy, **options)
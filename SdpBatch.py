@@ -0,0 +1,43 @@
+import multiprocessing
+from collections import namedtuple
+from Sdp import Sdp
+
+# Parse a large number of sdps (e.g. a corpus pulled out of call logs) on a pool of worker processes.
+# One BatchResult comes back per input sdp, in the same order as the input: value is the parsed Sdp (or whatever
+#  transform turned it into) and error is None, or, if parsing failed, value is None and error describes why.  A bad
+#  sdp doesn't stop the rest of the batch.
+BatchResult = namedtuple("BatchResult", ["value", "error"])
+
+# Set in each worker process by init_worker
+worker_options = None
+
+def init_worker(engine, lazy, transform):
+    global worker_options
+    worker_options = (engine, lazy, transform)
+
+def parse_one(sdp_string):
+    engine, lazy, transform = worker_options
+    try:
+        sdp = Sdp(sdp_string, engine=engine, lazy=lazy)
+        return BatchResult(sdp if transform is None else transform(sdp), None)
+    except Exception as e:
+        return BatchResult(None, "%s: %s" % (type(e).__name__, e))
+
+# Yields a BatchResult for each of sdp_strings, in order.  The sdps are handed to the workers (workers of them, one per
+#  cpu by default) chunksize at a time; parsed sdps have to be pickled to be sent back, so for big batches it pays to
+#  pass a transform (a module level function, applied to each Sdp in the worker) that boils them down to what's
+#  needed.  With workers=0 everything is parsed in this process instead.
+def parse_many(sdp_strings, workers=None, chunksize=32, engine="pyparsing", lazy=False, transform=None):
+    if workers == 0:
+        init_worker(engine, lazy, transform)
+        for sdp_string in sdp_strings:
+            yield parse_one(sdp_string)
+        return
+    pool = multiprocessing.Pool(workers, init_worker, (engine, lazy, transform))
+    try:
+        for result in pool.imap(parse_one, sdp_strings, chunksize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
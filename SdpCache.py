@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from Sdp import Sdp
+import SdpValidation
+
+# include_media and include_attributes as part of a cache key: any iterable of names goes, in any order
+def projection_key(names):
+    if names is None:
+        return None
+    return frozenset(names)
+
+# An LRU cache of parsed sdps, keyed on the body (along with the options it was parsed with), for traffic where the
+#  same sdp shows up over and over (retransmissions, re-INVITEs, ...).  Since every caller that asks for the same
+#  body gets the same object back, the cached sdps are frozen (see Sdp.freeze).
+# max_entries limits the number of cached sdps and max_bytes (if given) the total length of their bodies; the
+#  least recently used ones are evicted to stay under both.  A body longer than max_bytes is parsed but not cached.
+# With limits (see Sdp) the body is pre-scanned before it's looked up, so a cached sdp is only handed to callers
+#  whose limits it passes.  Sdps parsed with include_media or include_attributes are cached separately for each
+#  projection.
+class SdpCache(object):
+    def __init__(self, max_entries=1024, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def parse(self, sdp_string, engine="pyparsing", lazy=False, limits=None, include_media=None,
+              include_attributes=None):
+        if limits is not None:
+            SdpValidation.prescan(sdp_string, limits)
+        key = (engine, lazy, projection_key(include_media), projection_key(include_attributes), sdp_string)
+        sdp = self.entries.pop(key, None)
+        if sdp is not None:
+            self.hits += 1
+            # Re-insert it to make it the most recently used
+            self.entries[key] = sdp
+            return sdp
+        self.misses += 1
+        sdp = Sdp(sdp_string, engine=engine, lazy=lazy, include_media=include_media,
+                  include_attributes=include_attributes)
+        sdp.freeze()
+        if self.max_bytes is None or len(sdp_string) <= self.max_bytes:
+            self.entries[key] = sdp
+            self.bytes += len(sdp_string)
+            self.evict()
+        return sdp
+
+    def evict(self):
+        while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            key, _ = self.entries.popitem(last=False)
+            self.bytes -= len(key[-1])
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {"entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
@@ -21,6 +21,12 @@ class SdpTerms:
     RTCP_MUX_APPLICATION_LINE = "RTCP_MUX_APPLICATION_LINE"
     RTPMAP_APPLICATION_LINE = "RTPMAP_APPLICATION_LINE"
     RTPMAP_CODEC_INFO = "RTPMAP_CODEC_INFO"
+    CANDIDATE_APPLICATION_LINE = "CANDIDATE_APPLICATION_LINE"
+    FMTP_APPLICATION_LINE = "FMTP_APPLICATION_LINE"
+    RTCP_FB_APPLICATION_LINE = "RTCP_FB_APPLICATION_LINE"
+    EXTMAP_APPLICATION_LINE = "EXTMAP_APPLICATION_LINE"
+    SSRC_APPLICATION_LINE = "SSRC_APPLICATION_LINE"
+    SSRC_GROUP_APPLICATION_LINE = "SSRC_GROUP_APPLICATION_LINE"
     MEDIA_DESCRIPTION_LINE = "MEDIA_DESCRIPTION_LINE"
     SESSION_SECTION = "SESSION_SECTION"
     MEDIA_SECTIONS = "MEDIA_SECTIONS"
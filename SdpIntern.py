@@ -0,0 +1,90 @@
+import sys
+
+# Most of what's in a parsed sdp is the same handful of strings over and over ("IN", "IP4", "UDP/TLS/RTP/SAVPF",
+#  "opus", "sendrecv", "a=rtcp-mux", the same fmtp parameters, ...), and without interning every sdp that's kept
+#  around holds its own copy of each.  The line classes say which of their fields go through a pool as they're built
+#  (see SdpLine.interned_fields and SdpLine.shared_fields), so that equal values end up as one shared object.
+# A pool is bounded: once it holds more than max_entries values (it's checked each time a section has been built)
+#  it's emptied and starts over.  Values that are still in use stay shared by the lines holding them, they just
+#  won't be handed out again.  A pool with max_entries 0 doesn't intern anything.
+# Interning is a dict lookup per value, counting what it saves is a bit more than that, so the stats are only kept
+#  once they've been asked for with track_stats(True)
+class InternPool(object):
+    def __init__(self, max_entries, track_stats=False):
+        self.max_entries = max_entries
+        self.entries = PoolEntries()
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+        # The size of the values that were dropped in favor of one that was already in the pool
+        self.saved_bytes = 0
+        self.track_stats(track_stats)
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Sets self.intern, which is what the line classes call: returns the pooled value equal to the one it's given,
+    #  pooling that one if there isn't one yet
+    def track_stats(self, enabled):
+        if self.max_entries <= 0:
+            self.intern = no_interning
+        elif enabled:
+            self.intern = self.counting_intern
+        else:
+            self.intern = self.entries.__getitem__
+
+    def counting_intern(self, value):
+        existing = self.entries.get(value)
+        if existing is None:
+            self.misses += 1
+            self.entries[value] = value
+            return value
+        if existing is not value:
+            self.hits += 1
+            self.saved_bytes += sys.getsizeof(value)
+        return existing
+
+    def trim(self):
+        if len(self.entries) > self.max_entries:
+            self.entries.clear()
+            self.resets += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {"entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "resets": self.resets,
+                "saved_bytes": self.saved_bytes}
+
+# A value maps to itself, and one that isn't there yet is added on the way, so that interning a value that's
+#  already pooled (most of them) doesn't involve any python code
+class PoolEntries(dict):
+    def __missing__(self, value):
+        self[value] = value
+        return value
+
+def no_interning(value):
+    return value
+
+# Protocol tokens, codec names, clock rates, directions, mids and the like: a small set of values, so the bound is
+#  just there to catch a field that turns out not to be
+tokens = InternPool(4096)
+# Addresses, fmtp parameters, generic attribute values and the text of whole lines: far more of them, and most only
+#  show up a few times
+values = InternPool(16384)
+
+pools = {"tokens": tokens, "values": values}
+
+def trim():
+    tokens.trim()
+    values.trim()
+
+def track_stats(enabled=True):
+    for pool in pools.values():
+        pool.track_stats(enabled)
+
+def stats():
+    return dict((name, pool.stats()) for name, pool in pools.items())
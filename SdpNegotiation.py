@@ -0,0 +1,175 @@
+import time
+from Sdp import ExtmapApplicationLine, GroupApplicationLine, Sdp, address_type, to_int
+
+# Offer/answer (RFC 3264): answer an offer with what the local side supports.  The local capabilities are compiled
+#  once into hashed lookup tables (a Capabilities), after which answering an offer is a lookup per offered codec.
+#  The answer uses the offer's payload types, turns the offered directions around and keeps the accepted sections
+#  bundled.  Sections that don't have any codec in common (or a media type without any local codecs, like a data
+#  channel) are rejected with port 0.
+
+# The fmtp parameters that make two codecs with the same encoding name and clock rate different codecs: H264's
+#  packetization mode and profile (the first two bytes of profile-level-id; the level isn't part of it), VP9's and
+#  AV1's profile.  Missing ones get their default values
+def codec_profile(encoding_name, parameters):
+    if encoding_name == "h264":
+        return (parameters.get("packetization-mode") or "0", (parameters.get("profile-level-id") or "420010")[:4].lower())
+    if encoding_name == "vp9":
+        return (parameters.get("profile-id") or "0",)
+    if encoding_name == "av1":
+        return (parameters.get("profile") or "0",)
+    return ()
+
+# What has to be the same for an offered codec to be a local one: encoding name (not case sensitive), clock rate,
+#  channels (1 if they aren't given) and profile
+def codec_key(codec):
+    encoding_name = codec.encoding_name.lower()
+    return (encoding_name, to_int(codec.clock_rate), str(codec.encoding_parameters or "1"),
+            codec_profile(encoding_name, codec.parameters))
+
+# direction -> (sends, receives)
+direction_flags = {"sendrecv": (True, True),
+                   "sendonly": (True, False),
+                   "recvonly": (False, True),
+                   "inactive": (False, False)}
+flag_directions = dict((flags, direction) for direction, flags in direction_flags.items())
+
+# The direction to answer an offered one with: send only what the offerer receives and receive only what it sends,
+#  as far as the local side can
+def answer_direction(offered_direction, local_direction):
+    offer_sends, offer_receives = direction_flags[offered_direction]
+    local_sends, local_receives = direction_flags[local_direction]
+    return flag_directions[(offer_receives and local_sends, offer_sends and local_receives)]
+
+def offered_direction(section):
+    return section.direction or "sendrecv"
+
+def format_parameters(parameters):
+    return ";".join(name if value is None else "%s=%s" % (name, value) for name, value in sorted(parameters.items()))
+
+class Capabilities(object):
+    # codecs maps each media type to the Codecs supported for it, most preferred first (their payload types don't
+    #  matter, the answer uses the offer's).  An rtx codec means retransmissions are supported at its clock rate.
+    #  header_extensions are the uris of the supported rtp header extensions, directions maps a media type to what
+    #  the local side can do with it (sendrecv if it isn't there)
+    def __init__(self, codecs, header_extensions=(), directions=None):
+        # media type -> codec key -> (preference, local codec, its rtcp feedback)
+        self.codec_index = {}
+        # media type -> the clock rates rtx is supported at
+        self.rtx_index = {}
+        for media_type, media_codecs in codecs.items():
+            codec_index = self.codec_index[media_type] = {}
+            for preference, codec in enumerate(media_codecs):
+                if codec.encoding_name.lower() == "rtx":
+                    self.rtx_index.setdefault(media_type, set()).add(to_int(codec.clock_rate))
+                else:
+                    codec_index.setdefault(codec_key(codec), (preference, codec, frozenset(codec.rtcp_feedback)))
+        self.header_extensions = frozenset(header_extensions)
+        self.directions = dict(directions or {})
+
+    # The capabilities an sdp describes (say, a local offer): the codecs, header extensions and direction of each
+    #  of its media sections
+    @staticmethod
+    def from_sdp(sdp):
+        codecs = {}
+        header_extensions = set()
+        directions = {}
+        for section in sdp.media_sections:
+            media_type = section.media_description_line.media_type
+            codecs.setdefault(media_type, []).extend(section.codecs)
+            header_extensions.update(extmap.uri for extmap in section.typed_attribute_lines("extmap", ExtmapApplicationLine))
+            directions.setdefault(media_type, offered_direction(section))
+        return Capabilities(codecs, header_extensions, directions)
+
+    # (preference, local codec, rtcp feedback) for an offered codec, None if it isn't supported
+    def match(self, media_type, codec):
+        codec_index = self.codec_index.get(media_type)
+        return codec_index.get(codec_key(codec)) if codec_index is not None else None
+
+    def supports_rtx(self, media_type, clock_rate):
+        return to_int(clock_rate) in self.rtx_index.get(media_type, ())
+
+    def direction(self, media_type):
+        return self.directions.get(media_type, "sendrecv")
+
+# The offered codecs the answer accepts, in local order of preference, each followed by its rtx codec if that's
+#  accepted too: a list of (offered codec, fmtp parameters, rtcp feedback)
+def accept_codecs(section, local_caps, media_type):
+    accepted = []
+    rtx_codecs = {}
+    for codec in section.codecs:
+        if codec.encoding_name.lower() == "rtx":
+            apt = to_int(codec.parameters.get("apt"))
+            if apt is not None and local_caps.supports_rtx(media_type, codec.clock_rate):
+                rtx_codecs.setdefault(apt, codec)
+            continue
+        match = local_caps.match(media_type, codec)
+        if match is not None:
+            preference, local_codec, local_feedback = match
+            feedback = [fb for fb in codec.rtcp_feedback if fb in local_feedback]
+            accepted.append((preference, codec, local_codec.parameters, feedback))
+    accepted.sort(key=lambda accepted_codec: accepted_codec[0])
+    codecs = []
+    for preference, codec, parameters, feedback in accepted:
+        codecs.append((codec, parameters, feedback))
+        rtx_codec = rtx_codecs.get(codec.pt)
+        if rtx_codec is not None:
+            codecs.append((rtx_codec, {"apt": codec.pt}, []))
+    return codecs
+
+def answer_media_section(section, local_caps, address, port, transport_attributes):
+    media_description_line = section.media_description_line
+    media_type = media_description_line.media_type
+    mid = section.mid
+    codecs = accept_codecs(section, local_caps, media_type) if media_description_line.port != 0 else []
+    if not codecs:
+        # Rejected, which still takes a format (RFC 3264 section 6)
+        lines = ["m=%s 0 %s %s" % (media_type, media_description_line.proto, media_description_line.formats[0])]
+        if mid is not None:
+            lines.append("a=mid:%s" % mid)
+        return lines, False
+    lines = ["m=%s %s %s %s" % (media_type, port, media_description_line.proto, " ".join(str(codec.pt) for codec, _, _ in codecs)),
+             "c=IN %s %s" % (address_type(address), address)]
+    lines.extend("a=" + attribute for attribute in transport_attributes)
+    if mid is not None:
+        lines.append("a=mid:%s" % mid)
+    for extmap in section.typed_attribute_lines("extmap", ExtmapApplicationLine):
+        if extmap.uri in local_caps.header_extensions:
+            lines.append("a=extmap:%s %s" % (extmap.id, extmap.uri))
+    lines.append("a=" + answer_direction(offered_direction(section), local_caps.direction(media_type)))
+    if "rtcp-mux" in section.attribute_index:
+        lines.append("a=rtcp-mux")
+    for codec, parameters, feedback in codecs:
+        rtpmap = "a=rtpmap:%s %s/%s" % (codec.pt, codec.encoding_name, codec.clock_rate)
+        lines.append(rtpmap + "/%s" % codec.encoding_parameters if codec.encoding_parameters else rtpmap)
+        lines.extend("a=rtcp-fb:%s %s" % (codec.pt, fb) for fb in feedback)
+        if parameters:
+            lines.append("a=fmtp:%s %s" % (codec.pt, format_parameters(parameters)))
+    return lines, True
+
+# Answer offer_sdp (an Sdp) with what local_caps (a Capabilities) supports, as a new Sdp.  address and port go in the
+#  answer's c= and m= lines: the session has a c= line for address as well, since the rejected sections don't have one
+#  of their own and every section needs one (RFC 4566 section 5.7).  transport_attributes are attributes (like "ice-ufrag:...", "ice-pwd:...",
+#  "fingerprint:..." and "setup:active", without the 'a=') added to each accepted media section.  The answer is
+#  written out as text and parsed lazily (with the fast engine), since most of the time all that's done with it is
+#  sending it: its media sections are only parsed if they're accessed
+def negotiate(offer_sdp, local_caps, address="0.0.0.0", port=9, transport_attributes=(), session_id=None):
+    session_id = session_id if session_id is not None else int(time.time())
+    session_lines = ["v=0",
+                     "o=- %s 1 IN %s %s" % (session_id, address_type(address), address),
+                     "s=-",
+                     "c=IN %s %s" % (address_type(address), address),
+                     "t=0 0"]
+    media_lines = []
+    accepted_mids = set()
+    for section in offer_sdp.media_sections:
+        lines, accepted = answer_media_section(section, local_caps, address, port, transport_attributes)
+        media_lines.extend(lines)
+        if accepted and section.mid is not None:
+            accepted_mids.add(section.mid)
+    # Only the accepted sections stay in the bundle
+    for group in offer_sdp.session_section.typed_attribute_lines("group", GroupApplicationLine):
+        if group.purpose == "BUNDLE":
+            mids = [mid for mid in group.ids if mid in accepted_mids]
+            if mids:
+                session_lines.append("a=group:BUNDLE %s" % " ".join(mids))
+    return Sdp("\r\n".join(session_lines + media_lines) + "\r\n", engine="fast", lazy=True)
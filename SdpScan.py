@@ -0,0 +1,185 @@
+# Pull the sdp bodies out of SIP traces and logs and add up what's in them: the codecs offered, the mix of
+#  directions, how many media sections the sdps have, and how many of them didn't parse.  Files are read through mmap
+#  and only the bodies are looked at in python: finding them is a search for the v=0 lines they start with and a
+#  regular expression over their lines, both done in C, so the SIP headers and log lines around them cost about what
+#  reading them does.  Big files are split into chunks that are scanned on a pool of worker processes, each one mapping
+#  the file itself, so all that comes back from a worker is the counts for its chunk.
+#  python -m sdpy scan (see sdpy.py) runs this from the command line
+import mmap
+import multiprocessing
+import os
+import re
+from collections import Counter
+from Sdp import Sdp, RtpMapApplicationLine, media_directions
+
+# An sdp body: a v=0 line and the x= lines that follow it.  The body ends at the first line that isn't one (the blank
+#  line and start line of the next SIP message, a log line, ...) or at the next v=0 line, so that a body is found the
+#  same way whether or not the scan started ahead of it
+body_pattern = re.compile(br"v=0[^\n]*(?:\n|\Z)(?:[a-uw-z]=[^\n]*(?:\n|\Z))*")
+body_anchor = b"\nv=0"
+
+# Only the lines the stats come from are parsed (see Projection)
+scan_attributes = ("rtpmap",) + tuple(media_directions)
+
+# Yields the (start, end) offsets of the sdp bodies in buffer (bytes or an mmap) that start at or after start and
+#  before end.  A body that starts before end is followed past it, so splitting a buffer into chunks and scanning
+#  each one finds every body exactly once
+def find_bodies(buffer, start=0, end=None):
+    if end is None:
+        end = len(buffer)
+    search_from = max(start - 1, 0)
+    if start == 0 and end > 0 and buffer[0:3] == b"v=0":
+        body_end = body_pattern.match(buffer, 0).end()
+        yield 0, body_end
+        search_from = body_end - 1
+    while True:
+        # (The newline and v have to be before end, the rest of the anchor can be past it)
+        newline = buffer.find(body_anchor, search_from, end + len(body_anchor) - 2)
+        if newline < 0:
+            return
+        body_end = body_pattern.match(buffer, newline + 1).end()
+        yield newline + 1, body_end
+        search_from = body_end - 1
+
+# The counts for one or more files.  Stats for separate chunks are added up with merge
+class ScanStats(object):
+    # How many of the failures to keep the location and error of
+    max_failure_examples = 10
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.sdps = 0
+        self.failures = 0
+        # Exception type name -> count
+        self.failure_types = Counter()
+        # (path, offset, error) for the first few failures
+        self.failure_examples = []
+        # Number of m= lines -> number of sdps with that many
+        self.media_section_counts = Counter()
+        self.media_types = Counter()
+        # The direction of each media section (its own direction attribute, else the session's, else sendrecv, which
+        #  is what no direction attribute means)
+        self.directions = Counter()
+        # "encoding name/clock rate[/channels]" -> number of media sections that have an rtpmap for it
+        self.codecs = Counter()
+
+    def add_sdp(self, sdp):
+        self.sdps += 1
+        self.media_section_counts[len(sdp.media_sections)] += 1
+        session_direction = section_direction(sdp.session_section) or "sendrecv"
+        for section in sdp.media_sections:
+            self.media_types[section.media_description_line.media_type] += 1
+            self.directions[section_direction(section) or session_direction] += 1
+            for codec in set(rtpmap_codec(app_line) for app_line in section.attribute_lines("rtpmap")):
+                self.codecs[codec] += 1
+
+    def add_failure(self, path, offset, error):
+        self.failures += 1
+        self.failure_types[type(error).__name__] += 1
+        if len(self.failure_examples) < self.max_failure_examples:
+            self.failure_examples.append((path, offset, "%s: %s" % (type(error).__name__, error)))
+
+    def merge(self, other):
+        self.files += other.files
+        self.bytes += other.bytes
+        self.sdps += other.sdps
+        self.failures += other.failures
+        self.failure_types.update(other.failure_types)
+        self.failure_examples.extend(other.failure_examples[:self.max_failure_examples - len(self.failure_examples)])
+        self.media_section_counts.update(other.media_section_counts)
+        self.media_types.update(other.media_types)
+        self.directions.update(other.directions)
+        self.codecs.update(other.codecs)
+
+    def to_dict(self):
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "sdps": self.sdps,
+            "failures": self.failures,
+            "failure_types": dict(self.failure_types),
+            "failure_examples": [{"path": path, "offset": offset, "error": error}
+                                 for path, offset, error in self.failure_examples],
+            # (str keys, so that it's the same after a round trip through json)
+            "media_section_counts": dict((str(count), sdps) for count, sdps in self.media_section_counts.items()),
+            "media_types": dict(self.media_types),
+            "directions": dict(self.directions),
+            "codecs": dict(self.codecs),
+        }
+
+def section_direction(section):
+    for direction in media_directions:
+        if direction in section.attribute_index:
+            return direction
+
+# The codec an a=rtpmap line is for.  rtpmap lines that didn't fit the grammar (and so are generic application lines)
+#  are counted too
+def rtpmap_codec(app_line):
+    rtpmap = app_line._sub_line
+    if isinstance(rtpmap, RtpMapApplicationLine):
+        return rtpmap.rtpmap_codec_info.format_sdp()
+    return rtpmap.attribute_value.partition(" ")[2].strip()
+
+# Parse the bodies in buffer[start:end] (see find_bodies) and add them to stats
+def scan_buffer(buffer, stats, start=0, end=None, path=None, engine="fast", encoding="utf-8"):
+    for body_start, body_end in find_bodies(buffer, start, end):
+        body = buffer[body_start:body_end]
+        if not isinstance(body, str):
+            body = body.decode(encoding, "replace")
+        try:
+            sdp = Sdp(body, engine=engine, include_attributes=scan_attributes)
+        except Exception as e:
+            stats.add_failure(path, body_start, e)
+            continue
+        stats.add_sdp(sdp)
+    return stats
+
+# Scan one chunk of a file, in a worker process
+def scan_chunk(chunk):
+    path, start, end, engine = chunk
+    stats = ScanStats()
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            scan_buffer(buffer, stats, start, end, path, engine)
+        finally:
+            buffer.close()
+    return stats
+
+# The (path, start, end, engine) chunks to split the files into, chunk_size bytes each
+def plan_chunks(paths, chunk_size, engine):
+    chunks = []
+    for path in paths:
+        size = os.path.getsize(path)
+        for start in range(0, size, chunk_size):
+            chunks.append((path, start, min(start + chunk_size, size), engine))
+    return chunks
+
+# Chunks are no smaller than this however many workers there are to go round
+min_chunk_size = 1 << 20
+
+# Scan the files at paths and return the ScanStats for all of them.  The chunks are scanned on workers processes (one
+#  per cpu by default), or in this process with workers=0.  chunk_size is the most a chunk holds; files that are small
+#  enough to leave workers idle are split into smaller chunks, a few for each worker
+def scan(paths, workers=None, chunk_size=64 << 20, engine="fast"):
+    stats = ScanStats()
+    for path in paths:
+        stats.files += 1
+        stats.bytes += os.path.getsize(path)
+    if workers != 0:
+        chunk_size = max(min(chunk_size, stats.bytes // (4 * (workers or multiprocessing.cpu_count()))), min_chunk_size)
+    chunks = plan_chunks(paths, chunk_size, engine)
+    if workers == 0:
+        for chunk in chunks:
+            stats.merge(scan_chunk(chunk))
+        return stats
+    pool = multiprocessing.Pool(workers)
+    try:
+        for chunk_stats in pool.imap_unordered(scan_chunk, chunks):
+            stats.merge(chunk_stats)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return stats
@@ -0,0 +1,147 @@
+# A cheap check of an sdp body before it's parsed, for bodies that come from peers that can't be trusted: junk, bodies
+#  that are far too big, absurd numbers of lines or media sections, and lines out of the order RFC 4566 puts them in.
+#  Everything it looks at is bounded by the size of the input (a few passes over the string, the ones that reject
+#  oversized input done in C before anything is split up), so a bad body is rejected without going through either
+#  parser, and the pyparsing grammar never gets to backtrack over it.  Passing the pre-scan doesn't mean the body
+#  parses, only that it's worth trying: the values in the lines aren't looked at
+import re
+
+# The limits a body is checked against.  max_bytes is the length of the body as it's passed in (characters for a
+#  str), max_lines counts blank lines too, and max_line_length applies to every line (without its line ending), a=
+#  lines being the ones that get long.  A limit of None isn't checked
+class Limits(object):
+    def __init__(self, max_bytes=1 << 20, max_lines=20000, max_media_sections=1024, max_line_length=4096):
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.max_media_sections = max_media_sections
+        self.max_line_length = max_line_length
+
+default_limits = Limits()
+
+# Why a body was rejected (ValidationError.reason)
+TOO_LARGE = "too_large"
+TOO_MANY_LINES = "too_many_lines"
+TOO_MANY_MEDIA_SECTIONS = "too_many_media_sections"
+LINE_TOO_LONG = "line_too_long"
+MALFORMED_LINE = "malformed_line"
+UNKNOWN_LINE_TYPE = "unknown_line_type"
+OUT_OF_ORDER = "out_of_order"
+MISSING_LINE = "missing_line"
+
+# A ValueError (which is what the parsers raise for a body they can't parse) that says what was wrong in a way code
+#  can act on: reason is one of the constants above, line_number the (1-based, blank lines included) line it was
+#  found at if it's about a line, and limit and value the limit that was exceeded and by how much
+class ValidationError(ValueError):
+    def __init__(self, reason, message, line_number=None, limit=None, value=None):
+        super(ValidationError, self).__init__(message)
+        self.reason = reason
+        self.line_number = line_number
+        self.limit = limit
+        self.value = value
+
+    # (So that it can be pickled, e.g. to be sent back from a worker process)
+    def __reduce__(self):
+        return (ValidationError, (self.reason, str(self), self.line_number, self.limit, self.value))
+
+# The line types a section can have, in the order they have to appear in (RFC 4566 section 5), with whether the line
+#  can repeat.  An r= line repeats the t= line before it, so a t= line can also follow an r= line (see check_order).
+#  The parsers don't handle every one of these (r=, z= and k= lines aren't supported), that's up to them
+session_line_order = [("v", False), ("o", False), ("s", False), ("i", False), ("u", False), ("e", True),
+                      ("p", True), ("c", False), ("b", True), ("t", True), ("r", True), ("z", False), ("k", False),
+                      ("a", True)]
+session_required = ("v", "o", "s", "t")
+media_line_order = [("m", False), ("i", False), ("c", True), ("b", True), ("k", False), ("a", True)]
+
+def build_order_table(line_order):
+    return dict((line_type, (position, repeated)) for position, (line_type, repeated) in enumerate(line_order))
+
+session_order = build_order_table(session_line_order)
+media_order = build_order_table(media_line_order)
+
+# The same rules for the whole body as a regular expression over the types of its lines (one character per line), so
+#  that a body that's in order can be checked without looping over its lines in python more than once.  A body that
+#  doesn't match goes through check_order, which finds what's wrong with it and where
+line_type_order = re.compile(r"vosi?u?e*p*c?b*(?:tr*)+z?k?a*(?:mi?c*b*k?a*)*\Z")
+# The first two characters of a line that's fine as far as line_type_order is concerned (blank lines included)
+line_prefixes = frozenset([line_type + "=" for line_type in set(session_order) | set(media_order)] + ["", "\r"])
+
+# Quoted in error messages, without letting a hostile line make the message huge
+def excerpt(line, length=40):
+    line = line.rstrip("\r")
+    return repr(line if len(line) <= length else line[:length] + "...")
+
+def check_limit(reason, what, value, limit):
+    if limit is not None and value > limit:
+        raise ValidationError(reason, "The sdp has %d %s, the limit is %d" % (value, what, limit), limit=limit, value=value)
+
+# Raises a ValidationError if sdp_string is over one of the limits (default_limits if they're None) or has lines that
+#  aren't 'x=' lines or are out of order
+def prescan(sdp_string, limits=None):
+    limits = limits or default_limits
+    check_limit(TOO_LARGE, "bytes", len(sdp_string), limits.max_bytes)
+    check_limit(TOO_MANY_LINES, "lines", sdp_string.count("\n") + 1, limits.max_lines)
+    check_limit(TOO_MANY_MEDIA_SECTIONS, "media sections", sdp_string.count("\nm=") + sdp_string.startswith("m="),
+                limits.max_media_sections)
+    lines = sdp_string.split("\n")
+    check_line_lengths(lines, limits.max_line_length)
+    prefixes = [line[:2] for line in lines]
+    if not line_prefixes.issuperset(prefixes) or \
+            not line_type_order.match("".join(prefixes).replace("=", "").replace("\r", "")):
+        check_order(lines)
+
+def check_line_lengths(lines, max_line_length):
+    # Only go looking for the line that's too long (and take its \r into account) if one of them might be
+    if max_line_length is None or max(map(len, lines)) <= max_line_length:
+        return
+    for number, line in enumerate(lines, 1):
+        length = len(line.rstrip("\r"))
+        if length > max_line_length:
+            raise ValidationError(LINE_TOO_LONG, "Line %d (%s) is %d characters long, the limit is %d" %
+                                  (number, excerpt(line), length, max_line_length),
+                                  line_number=number, limit=max_line_length, value=length)
+
+def check_order(lines):
+    order = session_order
+    last_position = -1
+    last_type = None
+    session_types = set()
+    for number, line in enumerate(lines, 1):
+        if line[1:2] != "=":
+            # (Blank lines are skipped, like the parsers do)
+            if not line.strip():
+                continue
+            raise ValidationError(MALFORMED_LINE, "Line %d (%s) isn't an 'x=' line" % (number, excerpt(line)),
+                                  line_number=number)
+        line_type = line[0]
+        if line_type == "m":
+            if order is session_order:
+                check_required(session_types, number)
+                order = media_order
+            last_position = -1
+        entry = order.get(line_type)
+        if entry is None:
+            if line_type in session_order or line_type in media_order:
+                raise ValidationError(OUT_OF_ORDER, "Line %d (%s) can't be in a %s section" %
+                                      (number, excerpt(line), "session" if order is session_order else "media"),
+                                      line_number=number)
+            raise ValidationError(UNKNOWN_LINE_TYPE, "Line %d (%s) has an unknown type" % (number, excerpt(line)),
+                                  line_number=number)
+        position, repeated = entry
+        if position < last_position or (position == last_position and not repeated) or \
+                (line_type == "r" and last_type not in ("t", "r")):
+            # (A t= line after r= lines starts the next time description)
+            if not (line_type == "t" and last_type == "r"):
+                raise ValidationError(OUT_OF_ORDER, "Line %d (%s) is out of order" % (number, excerpt(line)),
+                                      line_number=number)
+        last_position = position
+        last_type = line_type
+        if order is session_order:
+            session_types.add(line_type)
+    if order is session_order:
+        check_required(session_types, len(lines))
+
+def check_required(session_types, line_number):
+    for line_type in session_required:
+        if line_type not in session_types:
+            raise ValidationError(MISSING_LINE, "The session section has no '%s=' line" % line_type,
+                                  line_number=line_number)
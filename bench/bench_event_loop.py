@@ -0,0 +1,64 @@
+# How much parsing delays everything else on an asyncio event loop (python 3.7+, run by bench_suite's event_loop
+#  benchmark): a ticker coroutine asks to be woken up every millisecond while a number of clients parse sdps, and
+#  how late it's woken up is the lag every other coroutine on the loop would see.  The parses are done inline (plain
+#  Sdp() calls in the coroutines), on threads, on processes, or by the default AsyncParser (threads, with small sdps
+#  inline)
+import asyncio
+import timeit
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import SdpAsync
+from Sdp import Sdp
+
+tick_seconds = 0.001
+
+async def ticker(lags, done):
+    loop = asyncio.get_running_loop()
+    while not done.is_set():
+        before = loop.time()
+        await asyncio.sleep(tick_seconds)
+        lags.append(loop.time() - before - tick_seconds)
+
+# Yields to the loop between parses, the way a client waiting for its next message would
+async def client(parse, sdp_string, parses):
+    for _ in range(parses):
+        await parse(sdp_string)
+        await asyncio.sleep(0)
+
+async def parse_under_load(parse, sdp_string, parses, clients):
+    lags = []
+    done = asyncio.Event()
+    tick_task = asyncio.get_running_loop().create_task(ticker(lags, done))
+    # Let the ticker get going
+    await asyncio.sleep(tick_seconds * 5)
+    start = timeit.default_timer()
+    await asyncio.gather(*[client(parse, sdp_string, max(1, parses // clients)) for _ in range(clients)])
+    seconds = timeit.default_timer() - start
+    done.set()
+    await tick_task
+    return seconds, lags
+
+def lag_percentile(lags, percent):
+    return lags[min(len(lags) - 1, int(len(lags) * percent / 100.0))] * 1e3 if lags else None
+
+def measure(sdp_string, mode, parses, clients, engine="fast"):
+    executor = ProcessPoolExecutor() if mode == "processes" else None
+    try:
+        if mode == "inline":
+            async def parse(s):
+                return Sdp(s, engine=engine)
+        else:
+            parser = SdpAsync.AsyncParser(executor, inline_max_bytes=None if mode == "auto" else 0)
+            async def parse(s):
+                return await parser.parse(s, engine)
+        seconds, lags = asyncio.run(parse_under_load(parse, sdp_string, parses, clients))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    lags.sort()
+    return OrderedDict([("parses_per_second", max(1, parses // clients) * clients / seconds),
+                        ("ticks", len(lags)),
+                        ("lag_p50_ms", lag_percentile(lags, 50)),
+                        ("lag_p99_ms", lag_percentile(lags, 99)),
+                        ("lag_max_ms", lags[-1] * 1e3 if lags else None)])
@@ -0,0 +1,40 @@
+# Measures how many bytes a parsed Sdp takes up, by walking the object graph hanging off of it and adding up
+#  sys.getsizeof of everything reachable (each object counted once).  Run from the repository root:
+#    python bench/bench_memory.py
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import Sdp
+from utest import SampleData
+
+def object_size(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(object_size(key, seen) + object_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(object_size(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += object_size(vars(obj), seen)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                size += object_size(getattr(obj, name), seen)
+    return size
+
+def measure(sdp_string, engine, count=100):
+    # Parse a bunch of copies together so strings shared between them (interned or not) are only counted once,
+    #  like they would be for a set of resident sessions.  (They all have to be alive at the same time, or ids get
+    #  reused.)
+    sdps = [Sdp.Sdp(sdp_string, engine=engine) for _ in range(count)]
+    seen = set()
+    return sum(object_size(sdp, seen) for sdp in sdps) // count
+
+if __name__ == "__main__":
+    for engine in ["pyparsing", "fast"]:
+        print("%-10s %8d bytes per parsed Sdp" % (engine, measure(SampleData.webrtc_offer, engine)))
@@ -0,0 +1,570 @@
+# Runs the benchmarks over the sdps in sdp_corpus and writes the results out as JSON: throughput (calls per second)
+#  and p50/p99 latency for building an Sdp with each engine, for the individual grammar elements and for writing
+#  an Sdp back out, along with the peak memory allocated while doing it (where tracemalloc is available, i.e.
+#  python 3; it's null otherwise).  Also how long a fresh interpreter takes to import Sdp and do its first parse
+#  (with the per module breakdown from -X importtime on python 3.7+).  Run from the repository root:
+#    python bench/bench_suite.py [--iterations N] [--max-seconds S] [--engine fast] [--sdp chrome_offer] [--output results.json]
+from __future__ import print_function
+import argparse
+import copy
+import json
+import mmap
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+from collections import OrderedDict, deque
+
+repository_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, repository_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import Sdp
+import SdpBatch
+import SdpIntern
+import SdpNegotiation
+import SdpScan
+import SdpValidation
+import PyParsingSdpDefs as grammar
+import FastSdpDefs as fast
+import pyparsing
+from sdp_corpus import build_hostile, build_plan_b, build_sip_trace, load_corpus
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+timer = timeit.default_timer
+
+def percentile(sorted_timings, percent):
+    index = int(round(percent / 100.0 * (len(sorted_timings) - 1)))
+    return sorted_timings[index]
+
+def peak_memory(fn, arg):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        fn(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# Call fn once per arg (cycling through args) until iterations calls have been made, or max_seconds have gone by
+#  (but make at least min_iterations calls)
+def time_calls(fn, args, iterations, max_seconds, min_iterations=5):
+    timings = []
+    start = timer()
+    for i in range(max(iterations, len(args))):
+        arg = args[i % len(args)]
+        before = timer()
+        fn(arg)
+        timings.append(timer() - before)
+        if len(timings) >= min_iterations and timer() - start > max_seconds:
+            break
+    timings.sort()
+    return OrderedDict([("calls", len(timings)),
+                        ("calls_per_second", len(timings) / sum(timings)),
+                        ("p50_us", percentile(timings, 50) * 1e6),
+                        ("p99_us", percentile(timings, 99) * 1e6),
+                        ("peak_memory_bytes", peak_memory(fn, args[0]))])
+
+def error_result(e):
+    return OrderedDict([("error", "%s: %s" % (type(e).__name__, e))])
+
+def bench_parse(corpus, engines, options):
+    results = OrderedDict()
+    for name, sdp_string in corpus.items():
+        results[name] = OrderedDict()
+        for engine in engines:
+            parse = lambda s: Sdp.Sdp(s, engine=engine)
+            try:
+                # A section an engine can't parse raises, and is recorded as an error for that engine
+                media_section_count = len(parse(sdp_string).media_sections)
+            except Exception as e:
+                results[name][engine] = error_result(e)
+                continue
+            result = time_calls(parse, [sdp_string], options.iterations, options.max_seconds)
+            result["media_sections"] = media_section_count
+            results[name][engine] = result
+    return results
+
+grammar_elements = OrderedDict([("application_line", ("a", grammar.application_line.parseString, fast.parse_application_line)),
+                                ("media_description_line", ("m", grammar.media_description_line.parseString, fast.parse_media_description_line)),
+                                ("connection_information_line", ("c", grammar.connection_information_line.parseString, fast.parse_connection_information_line))])
+
+def bench_grammar_elements(corpus, engines, options):
+    results = OrderedDict()
+    for element, (line_type, pyparsing_parser, fast_parser) in grammar_elements.items():
+        lines = [line for sdp_string in corpus.values() for line in fast.split_lines(sdp_string) if line[0] == line_type]
+        results[element] = OrderedDict()
+        for engine in engines:
+            parser = pyparsing_parser if engine == "pyparsing" else fast_parser
+            # Only time the lines the engine can parse, the ones it can't are counted
+            parsed_lines = []
+            for line in lines:
+                try:
+                    parser(line)
+                    parsed_lines.append(line)
+                except Exception:
+                    pass
+            result = time_calls(parser, parsed_lines, options.iterations, options.max_seconds)
+            result["unparsable_lines"] = len(lines) - len(parsed_lines)
+            results[element][engine] = result
+    return results
+
+# The rate parse_candidate has to keep up on one core, for trickle ICE at scale
+candidate_target_per_second = 200000
+
+# Sdp.parse_candidate on its own (as for trickled candidates), next to running the same lines through the pyparsing
+#  application line grammar.  The rate is timed over a batch of lines, without a timer call around each one
+def bench_parse_candidate(corpus, engines, options):
+    lines = [line for sdp_string in corpus.values() for line in fast.split_lines(sdp_string) if line.startswith("a=candidate:")]
+    if not lines:
+        return None
+    batch = lines * (10000 // len(lines) + 1)
+    seconds = min(timeit.repeat(lambda: [Sdp.parse_candidate(line) for line in batch], number=1, repeat=5))
+    results = OrderedDict([("candidates", len(lines)),
+                           ("parse_candidate", time_calls(Sdp.parse_candidate, lines, options.iterations, options.max_seconds)),
+                           ("candidates_per_second", len(batch) / seconds),
+                           ("target_per_second", candidate_target_per_second),
+                           ("meets_target", len(batch) / seconds >= candidate_target_per_second)])
+    if "pyparsing" in engines:
+        results["pyparsing_application_line"] = time_calls(grammar.application_line.parseString, lines,
+                                                           options.iterations, options.max_seconds)
+    return results
+
+# Building the codec tables of an sdp's media sections (done once when it's parsed) and then picking codecs out of them
+def index_codecs(sdp):
+    for section in sdp.media_sections:
+        section.index_codecs()
+
+def find_codecs(sdp):
+    for section in sdp.media_sections:
+        for encoding_name in ["opus", "VP8", "H264", "PCMU"]:
+            section.find_codecs(encoding_name)
+
+def bench_codecs(corpus, engines, options):
+    results = OrderedDict()
+    for name, sdp_string in corpus.items():
+        sdp = Sdp.Sdp(sdp_string, engine="fast")
+        results[name] = OrderedDict([("codecs", sum(len(section.codecs) for section in sdp.media_sections)),
+                                     ("index_codecs", time_calls(index_codecs, [sdp], options.iterations, options.max_seconds)),
+                                     ("find_codecs", time_calls(find_codecs, [sdp], options.iterations, options.max_seconds))])
+    return results
+
+# Looking up every source of a big Plan B sdp by ssrc, and what the index adds to parsing it
+def lookup_ssrcs(sdp):
+    for ssrc in sdp.ssrc_index:
+        sdp.ssrc_info(ssrc)
+
+def bench_ssrc_index(corpus, engines, options):
+    sdp_string = build_plan_b(options.sources)
+    sdp = Sdp.Sdp(sdp_string, engine="fast")
+    return OrderedDict([("sources", options.sources),
+                        ("ssrcs", len(sdp.ssrc_index)),
+                        ("parse", time_calls(lambda s: Sdp.Sdp(s, engine="fast"), [sdp_string], options.iterations, options.max_seconds)),
+                        ("parse_lazy", time_calls(lambda s: Sdp.Sdp(s, engine="fast", lazy=True), [sdp_string],
+                                                  options.iterations, options.max_seconds)),
+                        ("index_ssrcs", time_calls(lambda s: s.video.index_ssrcs(), [sdp], options.iterations, options.max_seconds)),
+                        ("lookup_all_ssrcs", time_calls(lookup_ssrcs, [sdp], options.iterations, options.max_seconds))])
+
+# Answering each offer (parsed with the fast engine) with a browser-like set of local capabilities, after compiling
+#  them once
+local_codecs = {"audio": [Sdp.Codec(None, "opus", "48000", "2", {"minptime": "10", "useinbandfec": "1"}, ("transport-cc",)),
+                          Sdp.Codec(None, "PCMU", "8000", None, {}, ()),
+                          Sdp.Codec(None, "PCMA", "8000", None, {}, ())],
+                "video": [Sdp.Codec(None, "VP8", "90000", None, {}, ("goog-remb", "transport-cc", "ccm fir", "nack", "nack pli")),
+                          Sdp.Codec(None, "H264", "90000", None, {"level-asymmetry-allowed": "1", "packetization-mode": "1",
+                                                                  "profile-level-id": "42e01f"},
+                                    ("goog-remb", "transport-cc", "ccm fir", "nack", "nack pli")),
+                          Sdp.Codec(None, "rtx", "90000", None, {}, ())]}
+local_header_extensions = ["urn:ietf:params:rtp-hdrext:ssrc-audio-level", "urn:ietf:params:rtp-hdrext:sdes:mid"]
+
+def bench_negotiate(corpus, engines, options):
+    compile_capabilities = lambda codecs: SdpNegotiation.Capabilities(codecs, local_header_extensions)
+    local_caps = compile_capabilities(local_codecs)
+    results = OrderedDict([("compile_capabilities", time_calls(compile_capabilities, [local_codecs], options.iterations,
+                                                               options.max_seconds))])
+    for name, sdp_string in corpus.items():
+        offer = Sdp.Sdp(sdp_string, engine="fast")
+        results[name] = time_calls(lambda sdp: SdpNegotiation.negotiate(sdp, local_caps), [offer], options.iterations,
+                                   options.max_seconds)
+    return results
+
+# The munging an SFU does for each participant (drop the candidates, rewrite the address, make everything sendonly,
+#  drop the last codec of each section that has more than two) on a freshly parsed sdp, next to just parsing it and
+#  writing it back out
+def munge(sdp_string):
+    sdp = Sdp.Sdp(sdp_string, engine="fast")
+    sdp.remove_attribute("candidate")
+    sdp.set_connection("198.51.100.7")
+    sdp.set_direction("sendonly")
+    for section in sdp.media_sections:
+        if len(section.codecs) > 2:
+            section.remove_codec(section.codecs[-1].pt)
+    return sdp.to_sdp()
+
+def bench_munge(corpus, engines, options):
+    results = OrderedDict()
+    for name, sdp_string in corpus.items():
+        results[name] = OrderedDict([("parse_and_write", time_calls(lambda s: Sdp.Sdp(s, engine="fast").to_sdp(), [sdp_string],
+                                                                    options.iterations, options.max_seconds)),
+                                     ("munge", time_calls(munge, [sdp_string], options.iterations, options.max_seconds))])
+    return results
+
+# Fanning one offer out to --participants participants: a copy of it per participant with its own address and audio
+#  port, written out.  The copies are made with Sdp.clone, with copy.deepcopy, or by parsing the offer again
+def fan_out(copy_offer, participants):
+    def fan_out_offer(offer):
+        for i in range(participants):
+            sdp = copy_offer(offer)
+            sdp.set_connection("198.51.%d.%d" % (i // 250, i % 250 + 1))
+            sdp.media_sections[0].set_port(10000 + 2 * i)
+            sdp.to_sdp()
+    return fan_out_offer
+
+def bench_clone(corpus, engines, options):
+    results = OrderedDict()
+    for name, sdp_string in corpus.items():
+        copies = OrderedDict([("clone", (lambda sdp: sdp.clone(), Sdp.Sdp(sdp_string, engine="fast"))),
+                              ("deepcopy", (copy.deepcopy, Sdp.Sdp(sdp_string, engine="fast"))),
+                              ("parse", (lambda s: Sdp.Sdp(s, engine="fast"), sdp_string))])
+        results[name] = OrderedDict((copy_name, time_calls(fan_out(copy_offer, options.participants), [offer],
+                                                           options.iterations, options.max_seconds))
+                                    for copy_name, (copy_offer, offer) in copies.items())
+    return results
+
+# Event loop lag while --clients coroutines parse each sdp, inline and through SdpAsync (python 3.7+ only)
+def bench_event_loop(corpus, engines, options):
+    if sys.version_info < (3, 7):
+        return error_result(RuntimeError("needs python 3.7+"))
+    import bench_event_loop
+    results = OrderedDict()
+    for name, sdp_string in corpus.items():
+        results[name] = OrderedDict((mode, bench_event_loop.measure(sdp_string, mode, options.iterations, options.clients))
+                                    for mode in ["inline", "auto", "threads", "processes"])
+    return results
+
+# The memory held by --resident parsed copies of each sdp, with the SdpIntern pools on and off, along with the pool
+#  stats.  The copies all come from the same text, so the values pool finds more to share than it would in real
+#  traffic (where ice credentials, fingerprints and ssrcs differ per session); the tokens pool is representative
+def resident_memory(sdp_string, count, **kwargs):
+    tracemalloc.start()
+    try:
+        sdps = [Sdp.Sdp(sdp_string, **dict(engine="fast", **kwargs)) for _ in range(count)]
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+def bench_resident(corpus, engines, options):
+    if tracemalloc is None:
+        return error_result(RuntimeError("needs tracemalloc (python 3)"))
+    pools = SdpIntern.pools.values()
+    max_entries = [pool.max_entries for pool in pools]
+    results = OrderedDict()
+    try:
+        for name, sdp_string in corpus.items():
+            results[name] = OrderedDict()
+            for interning in [False, True]:
+                for pool, pool_max_entries in zip(pools, max_entries):
+                    pool.__init__(pool_max_entries if interning else 0, track_stats=True)
+                results[name]["interned_bytes" if interning else "bytes"] = resident_memory(sdp_string, options.resident)
+            results[name]["pools"] = SdpIntern.stats()
+    finally:
+        for pool, pool_max_entries in zip(pools, max_entries):
+            pool.__init__(pool_max_entries)
+    return results
+
+# The pre-scan (SdpValidation.prescan) on each sdp in the corpus, which all pass it, then on hostile bodies (see
+#  sdp_corpus.build_hostile) next to what each engine does with them: how long it takes to parse them or fail, and
+#  whether it fails.  (Parsing the bigger ones with the pyparsing engine takes seconds, so they're timed as few times
+#  as --max-seconds allows)
+def rejection(fn):
+    def call(sdp_string):
+        try:
+            fn(sdp_string)
+        except Exception as e:
+            return e
+    return call
+
+def bench_prescan(corpus, engines, options):
+    results = OrderedDict()
+    for name, sdp_string in corpus.items():
+        results[name] = OrderedDict([("prescan", time_calls(SdpValidation.prescan, [sdp_string],
+                                                            options.iterations, options.max_seconds))])
+    for name, sdp_string in build_hostile(SdpValidation.default_limits, options.bundle_size).items():
+        error = rejection(SdpValidation.prescan)(sdp_string)
+        results[name] = OrderedDict([("bytes", len(sdp_string)),
+                                     ("rejected", error.reason if error is not None else None),
+                                     ("prescan", time_calls(rejection(SdpValidation.prescan), [sdp_string],
+                                                            options.iterations, options.max_seconds))])
+        for engine in engines:
+            parse = rejection(lambda s: Sdp.Sdp(s, engine=engine))
+            errors = []
+            timings = time_calls(lambda s: errors.append(parse(s)), [sdp_string], options.iterations, options.max_seconds,
+                                 min_iterations=1)
+            timings["fails"] = errors[0] is not None
+            results[name][engine] = timings
+    return results
+
+# Parsing only part of each sdp (see Sdp.Projection), for the consumers that only need that part: a media plane worker
+#  that wants the audio sections' codecs, and a billing tap that only looks at the o= and m= lines.  Next to a full
+#  parse: the time with each engine, and (python 3) the memory --resident parsed copies hold with the fast engine
+projections = OrderedDict([("full", {}),
+                           ("audio_codecs", {"include_media": {"audio"}, "include_attributes": {"rtpmap", "fmtp", "mid"}}),
+                           ("billing", {"include_attributes": ()})])
+
+def bench_projection(corpus, engines, options):
+    results = OrderedDict()
+    for name, sdp_string in corpus.items():
+        results[name] = OrderedDict()
+        for projection_name, projection in projections.items():
+            result = results[name][projection_name] = OrderedDict()
+            for engine in engines:
+                parse = lambda s: Sdp.Sdp(s, engine=engine, **projection)
+                try:
+                    parse(sdp_string)
+                except Exception as e:
+                    result[engine] = error_result(e)
+                    continue
+                result[engine] = time_calls(parse, [sdp_string], options.iterations, options.max_seconds)
+            if tracemalloc is not None:
+                result["resident_bytes"] = resident_memory(sdp_string, options.resident, **projection)
+    return results
+
+def bench_writer(method_name):
+    def bench(corpus, engines, options):
+        results = OrderedDict()
+        for name, sdp_string in corpus.items():
+            results[name] = OrderedDict()
+            for engine in engines:
+                try:
+                    sdps = [Sdp.Sdp(sdp_string, engine=engine)]
+                except Exception as e:
+                    results[name][engine] = error_result(e)
+                    continue
+                write = lambda sdp: getattr(sdp, method_name)()
+                results[name][engine] = time_calls(write, sdps, options.iterations, options.max_seconds)
+        return results
+    return bench
+
+# How the writers scale: each of them on generated Plan B sdps of about --scale-lines lines (whatever the corpus), as
+#  microseconds per line so that a writer that isn't linear shows up as a per-line time that grows with the size.
+#  The sdps have been modified (made sendonly) so that the wire format writers format every line instead of writing
+#  the raw text back out, and write and dump write to os.devnull
+def bench_write_scaling(corpus, engines, options):
+    writers = OrderedDict([("to_string", lambda sdp, null: sdp.to_string()),
+                           ("dump", lambda sdp, null: sdp.dump(null)),
+                           ("to_sdp", lambda sdp, null: sdp.to_sdp()),
+                           ("write", lambda sdp, null: sdp.write(null)),
+                           ("iter_lines", lambda sdp, null: deque(sdp.iter_lines(), 0))])
+    results = OrderedDict()
+    with open(os.devnull, "w") as null:
+        for line_count in options.scale_lines or [1000, 10000]:
+            # (13 lines per participant)
+            sdp_string = build_plan_b(max(1, line_count // 13))
+            sdp = Sdp.Sdp(sdp_string, engine="fast")
+            sdp.set_direction("sendonly")
+            lines = sdp_string.count("\n")
+            results["%d_lines" % lines] = OrderedDict()
+            for writer_name, writer in writers.items():
+                timings = time_calls(lambda sdp: writer(sdp, null), [sdp], options.iterations, options.max_seconds)
+                timings["us_per_line"] = timings["p50_us"] / lines
+                results["%d_lines" % lines][writer_name] = timings
+    return results
+
+# What a fresh interpreter has to import for: importing the package, and the first parse with each engine (which for
+#  the pyparsing engine builds the grammar)
+import_statements = OrderedDict([("import_sdp", "import Sdp"),
+                                 ("first_parse_fast", "import Sdp; Sdp.Sdp(sdp_string, engine='fast')"),
+                                 ("first_parse_pyparsing", "import Sdp; Sdp.Sdp(sdp_string, engine='pyparsing')")])
+import_timing_code = """import os, sys, timeit
+sdp_string = sys.stdin.read()
+sys.stdout = open(os.devnull, "w")
+start = timeit.default_timer()
+%s
+seconds = timeit.default_timer() - start
+sys.stdout = sys.__stdout__
+print("%%r %%r" %% (seconds, "pyparsing" in sys.modules))
+"""
+# The modules to report the cumulative import time of (from -X importtime)
+import_time_modules = ["Sdp", "FastSdpDefs", "PyParsingSdpDefs", "pyparsing"]
+
+def run_python(args, sdp_string):
+    proc = subprocess.Popen([sys.executable] + args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, cwd=repository_dir)
+    stdout, stderr = proc.communicate(sdp_string.encode("ascii"))
+    if proc.returncode != 0:
+        raise RuntimeError(stderr.decode("ascii", "replace"))
+    return stdout.decode("ascii"), stderr.decode("ascii", "replace")
+
+def module_import_times(statement, sdp_string):
+    # python -X importtime (3.7+) writes 'import time: <self us> | <cumulative us> | <module>' lines to stderr
+    if sys.version_info < (3, 7):
+        return None
+    _, stderr = run_python(["-X", "importtime", "-c", import_timing_code % statement], sdp_string)
+    times = OrderedDict()
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if line.startswith("import time:") and len(fields) == 3 and fields[2].strip() in import_time_modules:
+            times[fields[2].strip()] = int(fields[1])
+    return times
+
+def bench_import(corpus, engines, options):
+    sdp_string = list(corpus.values())[0]
+    results = OrderedDict()
+    for name, statement in import_statements.items():
+        if name.startswith("first_parse_") and name[len("first_parse_"):] not in engines:
+            continue
+        timings = []
+        for _ in range(options.import_runs):
+            stdout, _ = run_python(["-c", import_timing_code % statement], sdp_string)
+            seconds, pyparsing_imported = stdout.split()
+            timings.append(float(seconds))
+        timings.sort()
+        results[name] = OrderedDict([("runs", len(timings)),
+                                     ("p50_us", percentile(timings, 50) * 1e6),
+                                     ("min_us", timings[0] * 1e6),
+                                     ("pyparsing_imported", pyparsing_imported == "True"),
+                                     ("cumulative_import_us", module_import_times(statement, sdp_string))])
+    return results
+
+def media_types(sdp):
+    return [section.media_description_line.media_type for section in sdp.media_sections]
+
+# SdpBatch.parse_many over a batch made by cycling through the corpus, with different numbers of worker processes
+#  (0 is parsing in this process); both sending the Sdps back and only a summary of each (media_types)
+def bench_parse_many(corpus, engines, options):
+    sdp_strings = [list(corpus.values())[i % len(corpus)] for i in range(options.batch_size)]
+    workers = sorted(set(options.workers or [0, 1, multiprocessing.cpu_count()]))
+    results = OrderedDict([("cpus", multiprocessing.cpu_count())])
+    for engine in engines:
+        results[engine] = OrderedDict()
+        for transform in [None, media_types]:
+            key = "sdps" if transform is None else "transformed"
+            results[engine][key] = OrderedDict()
+            baseline = None
+            for worker_count in workers:
+                start = timer()
+                errors = sum(1 for result in SdpBatch.parse_many(sdp_strings, workers=worker_count, engine=engine,
+                                                                  transform=transform) if result.error)
+                seconds = timer() - start
+                baseline = baseline or seconds
+                results[engine][key]["workers_%d" % worker_count] = OrderedDict([("sdps_per_second", len(sdp_strings) / seconds),
+                                                                                 ("speedup", baseline / seconds),
+                                                                                 ("errors", errors)])
+    return results
+
+def read_file(path):
+    with open(path, "rb") as f:
+        while f.read(1 << 20):
+            pass
+
+def count_bodies(path):
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return sum(1 for _ in SdpScan.find_bodies(buffer))
+        finally:
+            buffer.close()
+
+# SdpScan.scan over a SIP log of about --trace-mb MB (the corpus, each sdp in an INVITE, over and over), in MB of log
+#  per second: reading the file on its own for comparison, finding the bodies without parsing them, and the whole
+#  scan with each engine and different numbers of worker processes
+def bench_scan(corpus, engines, options):
+    trace = build_sip_trace(list(corpus.values())).encode("utf-8")
+    trace_file = tempfile.NamedTemporaryFile(suffix=".log", delete=False)
+    try:
+        with trace_file:
+            for _ in range(max(1, (options.trace_mb << 20) // len(trace))):
+                trace_file.write(trace)
+        path = trace_file.name
+        megabytes = os.path.getsize(path) / 1e6
+        results = OrderedDict([("megabytes", megabytes), ("cpus", multiprocessing.cpu_count())])
+        start = timer()
+        read_file(path)
+        results["read_mb_per_second"] = megabytes / (timer() - start)
+        start = timer()
+        results["bodies"] = count_bodies(path)
+        results["find_bodies_mb_per_second"] = megabytes / (timer() - start)
+        for engine in engines:
+            results[engine] = OrderedDict()
+            for worker_count in sorted(set(options.workers or [0, 1, multiprocessing.cpu_count()])):
+                start = timer()
+                stats = SdpScan.scan([path], workers=worker_count, chunk_size=max(1, options.trace_mb // 8) << 20,
+                                     engine=engine)
+                seconds = timer() - start
+                results[engine]["workers_%d" % worker_count] = OrderedDict([("mb_per_second", megabytes / seconds),
+                                                                            ("sdps_per_second", stats.sdps / seconds),
+                                                                            ("failures", stats.failures)])
+        return results
+    finally:
+        os.remove(trace_file.name)
+
+benchmarks = OrderedDict([("import", bench_import),
+                          ("parse", bench_parse),
+                          ("grammar_elements", bench_grammar_elements),
+                          ("parse_candidate", bench_parse_candidate),
+                          ("codecs", bench_codecs),
+                          ("ssrc_index", bench_ssrc_index),
+                          ("negotiate", bench_negotiate),
+                          ("munge", bench_munge),
+                          ("clone", bench_clone),
+                          ("event_loop", bench_event_loop),
+                          ("resident", bench_resident),
+                          ("prescan", bench_prescan),
+                          ("projection", bench_projection),
+                          ("to_sdp", bench_writer("to_sdp")),
+                          ("to_string", bench_writer("to_string")),
+                          ("write_scaling", bench_write_scaling),
+                          ("parse_many", bench_parse_many),
+                          ("scan", bench_scan)])
+
+def run(options):
+    corpus = load_corpus(options.bundle_size)
+    if options.sdp:
+        corpus = OrderedDict((name, sdp_string) for name, sdp_string in corpus.items() if name in options.sdp)
+    engines = options.engine or sorted(Sdp.SdpEngines)
+    results = OrderedDict([("python", platform.python_version()),
+                           ("implementation", platform.python_implementation()),
+                           ("pyparsing", pyparsing.__version__),
+                           ("iterations", options.iterations),
+                           ("corpus", OrderedDict((name, len(sdp_string)) for name, sdp_string in corpus.items()))])
+    for name, bench in benchmarks.items():
+        if not options.benchmark or name in options.benchmark:
+            results[name] = bench(corpus, engines, options)
+    return results
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark sdp parsing and serialization over the sdp corpus")
+    parser.add_argument("--iterations", type=int, default=200, help="calls to time per benchmark")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="time limit per benchmark")
+    parser.add_argument("--engine", action="append", choices=sorted(Sdp.SdpEngines), help="engine(s) to benchmark, all by default")
+    parser.add_argument("--sdp", action="append", help="corpus entries to use, all by default")
+    parser.add_argument("--benchmark", action="append", choices=list(benchmarks), help="benchmarks to run, all by default")
+    parser.add_argument("--import-runs", type=int, default=10, help="fresh interpreters to time imports in")
+    parser.add_argument("--batch-size", type=int, default=60, help="sdps per parse_many batch")
+    parser.add_argument("--workers", type=int, action="append", help="parse_many and scan worker counts, 0, 1 and one per cpu by default")
+    parser.add_argument("--bundle-size", type=int, default=120, help="number of m-lines in the generated bundle")
+    parser.add_argument("--sources", type=int, default=1000, help="participants in the generated Plan B sdp")
+    parser.add_argument("--participants", type=int, default=100, help="copies of each sdp the clone benchmark makes")
+    parser.add_argument("--clients", type=int, default=8, help="coroutines parsing at once in the event_loop benchmark")
+    parser.add_argument("--scale-lines", type=int, action="append", help="sdp sizes (in lines) for write_scaling, 1000 and 10000 by default")
+    parser.add_argument("--trace-mb", type=int, default=16, help="size of the SIP log the scan benchmark reads")
+    parser.add_argument("--resident", type=int, default=1000, help="parsed copies of each sdp the resident benchmark holds")
+    parser.add_argument("--output", help="file to write the JSON results to, stdout by default")
+    return parser.parse_args(args)
+
+if __name__ == "__main__":
+    options = parse_args()
+    results = run(options)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2, separators=(",", ": "))
+    else:
+        print(json.dumps(results, indent=2, separators=(",", ": ")))
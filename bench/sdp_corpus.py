@@ -0,0 +1,178 @@
+# The sdps the benchmarks run against: the captured offers in bench/corpus (browser offers, a SIP trunk call and a
+#  simulcast sender) plus a generated BUNDLE with a large number of m-lines, like an SFU sends to a participant in
+#  a big conference.  (build_plan_b makes the other kind of big conference sdp, which only the ssrc_index benchmark
+#  uses, build_hostile the bodies the prescan benchmark rejects and build_sip_trace the log the scan benchmark reads.)  The files are stored with LF line endings, they're handed out with CRLF like on the wire.
+import os
+from collections import OrderedDict
+
+corpus_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+bundle_session_template = """v=0
+o=- 4611731400430051336 2 IN IP4 127.0.0.1
+s=-
+t=0 0
+a=group:BUNDLE %(mids)s
+a=msid-semantic: WMS *
+"""
+
+bundle_audio_template = """m=audio 9 UDP/TLS/RTP/SAVPF 111 126
+c=IN IP4 0.0.0.0
+a=rtcp:9 IN IP4 0.0.0.0
+a=ice-ufrag:Fk3q
+a=ice-pwd:x4RmUq0ZW7sBv2kYc9LtPj1a
+a=fingerprint:sha-256 3E:91:0C:5A:D4:77:B2:18:6F:E0:4D:A9:52:C3:8B:01:7E:F6:29:94:BD:60:1A:C5:83:4F:E2:0B:D7:39:66:A8
+a=setup:actpass
+a=mid:%(mid)s
+a=extmap:1 urn:ietf:params:rtp-hdrext:ssrc-audio-level
+a=extmap:4 urn:ietf:params:rtp-hdrext:sdes:mid
+a=sendonly
+a=msid:stream%(index)d track%(index)d
+a=rtcp-mux
+a=rtpmap:111 opus/48000/2
+a=fmtp:111 minptime=10;useinbandfec=1
+a=rtpmap:126 telephone-event/8000
+a=ssrc:%(ssrc)d cname:participant%(index)d
+"""
+
+bundle_video_template = """m=video 9 UDP/TLS/RTP/SAVPF 96 97
+c=IN IP4 0.0.0.0
+a=rtcp:9 IN IP4 0.0.0.0
+a=ice-ufrag:Fk3q
+a=ice-pwd:x4RmUq0ZW7sBv2kYc9LtPj1a
+a=fingerprint:sha-256 3E:91:0C:5A:D4:77:B2:18:6F:E0:4D:A9:52:C3:8B:01:7E:F6:29:94:BD:60:1A:C5:83:4F:E2:0B:D7:39:66:A8
+a=setup:actpass
+a=mid:%(mid)s
+a=extmap:4 urn:ietf:params:rtp-hdrext:sdes:mid
+a=extmap:10 urn:ietf:params:rtp-hdrext:sdes:rtp-stream-id
+a=sendonly
+a=msid:stream%(index)d track%(index)d
+a=rtcp-mux
+a=rtcp-rsize
+a=rtpmap:96 VP8/90000
+a=rtcp-fb:96 goog-remb
+a=rtcp-fb:96 transport-cc
+a=rtcp-fb:96 nack
+a=rtcp-fb:96 nack pli
+a=rtpmap:97 rtx/90000
+a=fmtp:97 apt=96
+a=ssrc-group:FID %(ssrc)d %(rtx_ssrc)d
+a=ssrc:%(ssrc)d cname:participant%(index)d
+a=ssrc:%(rtx_ssrc)d cname:participant%(index)d
+"""
+
+def to_wire(sdp_string):
+    return sdp_string.replace("\r\n", "\n").replace("\n", "\r\n")
+
+def build_bundle(media_section_count):
+    # Alternating audio and video m-lines, all bundled together
+    sections = []
+    for index in range(media_section_count):
+        template = bundle_audio_template if index % 2 == 0 else bundle_video_template
+        sections.append(template % {"mid": "m%d" % index,
+                                    "index": index // 2,
+                                    "ssrc": 100000 + 2 * index,
+                                    "rtx_ssrc": 100001 + 2 * index})
+    mids = " ".join("m%d" % index for index in range(media_section_count))
+    return to_wire(bundle_session_template % {"mids": mids} + "".join(sections))
+
+plan_b_session_template = """v=0
+o=- 4611731400430051336 2 IN IP4 127.0.0.1
+s=-
+t=0 0
+a=group:BUNDLE audio video
+a=msid-semantic: WMS
+"""
+
+plan_b_audio_template = """m=audio 9 UDP/TLS/RTP/SAVPF 111
+c=IN IP4 0.0.0.0
+a=mid:audio
+a=sendrecv
+a=rtcp-mux
+a=rtpmap:111 opus/48000/2
+%(ssrc_lines)s"""
+
+plan_b_video_template = """m=video 9 UDP/TLS/RTP/SAVPF 96 97
+c=IN IP4 0.0.0.0
+a=mid:video
+a=sendrecv
+a=rtcp-mux
+a=rtpmap:96 VP8/90000
+a=rtpmap:97 rtx/90000
+a=fmtp:97 apt=96
+%(ssrc_lines)s"""
+
+def plan_b_ssrc_lines(ssrc, index):
+    return "".join("a=ssrc:%d %s\n" % (ssrc, attribute) for attribute in ["cname:participant%d" % index,
+                                                                          "msid:stream%d track%d" % (index, ssrc),
+                                                                          "mslabel:stream%d" % index,
+                                                                          "label:track%d" % ssrc])
+
+def build_plan_b(source_count):
+    # A Plan B offer from an SFU: every participant's sources in one audio and one video m-line, an audio ssrc and a
+    #  video ssrc with its rtx ssrc (paired by an FID group) per participant
+    audio_lines = []
+    video_lines = []
+    for index in range(source_count):
+        ssrc = 100000 + 3 * index
+        audio_lines.append(plan_b_ssrc_lines(ssrc, index))
+        video_lines.append("a=ssrc-group:FID %d %d\n" % (ssrc + 1, ssrc + 2))
+        video_lines.append(plan_b_ssrc_lines(ssrc + 1, index) + plan_b_ssrc_lines(ssrc + 2, index))
+    return to_wire(plan_b_session_template +
+                   plan_b_audio_template % {"ssrc_lines": "".join(audio_lines)} +
+                   plan_b_video_template % {"ssrc_lines": "".join(video_lines)})
+
+def load_sdp(name):
+    with open(os.path.join(corpus_dir, name + ".sdp")) as f:
+        return to_wire(f.read())
+
+def build_hostile(limits, bundle_size=120):
+    # Bodies a hostile or broken peer could send, each one just over one of limits (an SdpValidation.Limits) or
+    #  malformed in some way, most of them built on an offer that both engines parse completely
+    base = load_sdp("safari_offer")
+    junk = "".join(chr(32 + (i * 7919) % 95) + ("\r\n" if i % 80 == 79 else "") for i in range(65536))
+    return OrderedDict([("huge_body", base + ("a=x-padding:%s\r\n" % ("x" * 1000)) * (limits.max_bytes // 1000 + 1)),
+                        ("line_flood", base + "a=x\r\n" * (limits.max_lines + limits.max_lines // 4)),
+                        ("media_flood", base + "m=audio 9 RTP/AVP 0\r\n" * (limits.max_media_sections + limits.max_media_sections // 4)),
+                        ("long_attribute", base + "a=x-long:%s\r\n" % ("x" * (limits.max_line_length * 100))),
+                        ("junk", junk),
+                        ("late_junk", build_bundle(bundle_size) + "junk\r\n"),
+                        ("out_of_order", base.replace("s=-\r\n", "", 1).replace("t=0 0\r\n", "t=0 0\r\ns=-\r\n", 1))])
+
+sip_invite_template = """INVITE sip:%(user)s@example.com SIP/2.0\r
+Via: SIP/2.0/UDP 192.0.2.1:5060;branch=z9hG4bK%(call)d\r
+From: <sip:caller@example.com>;tag=%(call)d\r
+To: <sip:%(user)s@example.com>\r
+Call-ID: %(call)d@192.0.2.1\r
+CSeq: 1 INVITE\r
+Content-Type: application/sdp\r
+Content-Length: %(length)d\r
+\r
+"""
+
+sip_ok_template = """SIP/2.0 200 OK\r
+Call-ID: %(call)d@192.0.2.1\r
+CSeq: 1 INVITE\r
+Content-Length: 0\r
+\r
+"""
+
+def build_sip_trace(sdp_strings, log_lines=10):
+    # A SIP log: an INVITE carrying each of sdp_strings and the 200 OK to it, with log_lines lines of logging after
+    #  each exchange
+    messages = []
+    for call, sdp_string in enumerate(sdp_strings):
+        messages.append(sip_invite_template % {"user": "user%d" % call, "call": call, "length": len(sdp_string)})
+        messages.append(sdp_string)
+        messages.append(sip_ok_template % {"call": call})
+        messages.extend("2024-01-01 00:00:%02d.%03d INFO call %d: state changed to %d\n" % (call % 60, line, call, line)
+                        for line in range(log_lines))
+    return "".join(messages)
+
+def load_corpus(bundle_size=120):
+    corpus = OrderedDict()
+    for file_name in sorted(os.listdir(corpus_dir)):
+        name, ext = os.path.splitext(file_name)
+        if ext == ".sdp":
+            corpus[name] = load_sdp(name)
+    corpus["bundle_%d" % bundle_size] = build_bundle(bundle_size)
+    return corpus
@@ -0,0 +1,60 @@
+# Command line tools.  From the top of the repo:
+#  python -m sdpy scan [--workers N] [--engine fast] [--json] FILE...
+#  pulls the sdp bodies out of SIP traces or logs and prints the codecs, directions and media sections in them, and
+#  how many didn't parse (see SdpScan)
+from __future__ import print_function
+import argparse
+import json
+import sys
+import time
+import SdpScan
+from Sdp import SdpEngines
+
+def format_counts(counts, limit=None):
+    return ", ".join("%s: %d" % (key, count) for key, count in counts.most_common(limit)) or "-"
+
+def print_report(stats, elapsed, out):
+    print("files: %d, %d bytes in %.2fs (%.1f MB/s)" %
+          (stats.files, stats.bytes, elapsed, stats.bytes / 1e6 / elapsed if elapsed else 0), file=out)
+    print("sdps: %d parsed, %d failed" % (stats.sdps, stats.failures), file=out)
+    print("media sections per sdp: %s" %
+          (", ".join("%d: %d" % item for item in sorted(stats.media_section_counts.items())) or "-"), file=out)
+    print("media types: %s" % format_counts(stats.media_types), file=out)
+    print("directions: %s" % format_counts(stats.directions), file=out)
+    print("codecs: %s" % format_counts(stats.codecs, 20), file=out)
+    if stats.failures:
+        print("failures: %s" % format_counts(stats.failure_types), file=out)
+        for path, offset, error in stats.failure_examples:
+            print("  %s@%d: %s" % (path, offset, error), file=out)
+
+def scan_command(options):
+    start = time.time()
+    stats = SdpScan.scan(options.files, options.workers, options.chunk_mb << 20, options.engine)
+    elapsed = time.time() - start
+    if options.json:
+        report = stats.to_dict()
+        report["seconds"] = elapsed
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        print_report(stats, elapsed, sys.stdout)
+    return 0
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m sdpy")
+    commands = parser.add_subparsers(dest="command")
+    scan = commands.add_parser("scan", help="pull the sdp bodies out of SIP traces or logs and count what's in them")
+    scan.add_argument("files", nargs="+")
+    scan.add_argument("--workers", type=int, default=None,
+                      help="worker processes (default: one per cpu, 0 to scan in this process)")
+    scan.add_argument("--chunk-mb", type=int, default=64, help="how much of a file each worker scans at a time")
+    scan.add_argument("--engine", default="fast", choices=sorted(SdpEngines))
+    scan.add_argument("--json", action="store_true", help="print the counts as json")
+    options = parser.parse_args(args)
+    if options.command == "scan":
+        return scan_command(options)
+    parser.print_help()
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,21 @@
+import io
+import mmap
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
 import unittest
 import PyParsingSdpDefs as grammar
 import Sdp as objects
+import FastSdpDefs as fast
+from SdpCache import SdpCache
+import SdpIntern
+import SdpValidation
+from SdpBatch import parse_many
+import SdpScan
+from SdpNegotiation import Capabilities, negotiate
 
 def verify_line(test_obj, parsed_res, expected_line_data):
     #print("verifying:\npyparsing object:\n%s\nexpected_data:\n%s" % (parsed_res.dump(), expected_line_data))
@@ -139,6 +154,68 @@ class SampleData(object):
                              ("PROTO", "RTP/SAVPF"),
                              ("FORMATS", ["111", "222", "333", "444"])]}
 
+    # A (trimmed down) offer as sent by a WebRTC browser
+    webrtc_offer = "\n".join(["v=0",
+                              "o=- 4611731400430051336 2 IN IP4 127.0.0.1",
+                              "s=-",
+                              "t=0 0",
+                              "a=group:BUNDLE audio video",
+                              "a=msid-semantic: WMS lgsCFqt9kN2fVKw5wXltWIwhC9ZgMP2cwKmf",
+                              "m=audio 9 UDP/TLS/RTP/SAVPF 111 103 9 0 8 126",
+                              "c=IN IP4 0.0.0.0",
+                              "a=rtcp:9 IN IP4 0.0.0.0",
+                              "a=ice-ufrag:Oyef7uvBlwafI3hT",
+                              "a=ice-pwd:T0teqPLNQQOf+5W+ls+P2p16",
+                              "a=ice-options:trickle",
+                              "a=fingerprint:sha-256 49:66:12:17:0D:1C:91:AE:57:4C:C6:36:DD:D5:97:D2:7D:62:C9:9A:7F:B9:A3:F4:70:03:E7:43:91:73:23:5E",
+                              "a=setup:actpass",
+                              "a=mid:audio",
+                              "a=extmap:1 urn:ietf:params:rtp-hdrext:ssrc-audio-level",
+                              "a=sendrecv",
+                              "a=rtcp-mux",
+                              "a=rtpmap:111 opus/48000/2",
+                              "a=rtcp-fb:111 transport-cc",
+                              "a=fmtp:111 minptime=10;useinbandfec=1",
+                              "a=rtpmap:103 ISAC/16000",
+                              "a=rtpmap:9 G722/8000",
+                              "a=rtpmap:0 PCMU/8000",
+                              "a=rtpmap:8 PCMA/8000",
+                              "a=rtpmap:126 telephone-event/8000",
+                              "a=ssrc:3570614608 cname:4TOk42mSjXCkVIa6",
+                              "a=ssrc:3570614608 msid:lgsCFqt9kN2fVKw5wXltWIwhC9ZgMP2cwKmf 35429d94-5637-4686-9ecd-7d0622261ce8",
+                              "m=video 9 UDP/TLS/RTP/SAVPF 96 97",
+                              "c=IN IP4 0.0.0.0",
+                              "a=rtcp:9 IN IP4 0.0.0.0",
+                              "a=ice-ufrag:Oyef7uvBlwafI3hT",
+                              "a=ice-pwd:T0teqPLNQQOf+5W+ls+P2p16",
+                              "a=ice-options:trickle",
+                              "a=setup:actpass",
+                              "a=mid:video",
+                              "a=recvonly",
+                              "a=rtcp-mux",
+                              "a=rtpmap:96 VP8/90000",
+                              "a=rtcp-fb:96 goog-remb",
+                              "a=rtcp-fb:96 nack pli",
+                              "a=rtpmap:97 rtx/90000",
+                              "a=fmtp:97 apt=96",
+                              "a=ssrc-group:FID 2231627014 632943048",
+                              "a=ssrc:2231627014 cname:4TOk42mSjXCkVIa6",
+                              "a=ssrc:632943048 cname:4TOk42mSjXCkVIa6",
+                              ""])
+
+    # The same offer with a data channel
+    data_channel_offer = webrtc_offer.replace("a=group:BUNDLE audio video", "a=group:BUNDLE audio video data") + \
+                         "\n".join(["m=application 9 UDP/DTLS/SCTP webrtc-datachannel",
+                                    "c=IN IP4 0.0.0.0",
+                                    "a=ice-ufrag:Oyef7uvBlwafI3hT",
+                                    "a=ice-pwd:T0teqPLNQQOf+5W+ls+P2p16",
+                                    "a=ice-options:trickle",
+                                    "a=setup:actpass",
+                                    "a=mid:data",
+                                    "a=sctp-port:5000",
+                                    "a=max-message-size:262144",
+                                    ""])
+
 class TestLineParsing(unittest.TestCase):
     def test_parse_version_line(self):
         parse_and_verify_line(self, grammar.version_line, SampleData.vline_data)
@@ -315,6 +392,10 @@ def verify_line_object(test_obj, line_object, expected_data):
             verify_line_object(test_obj, getattr(line_object, field_name.lower()), field_value)
         else:
             #print("normal field")
+            # (Numeric fields are stored as ints)
+            if field_name.lower() in line_object.int_fields:
+                field_value = [objects.to_int(item) for item in field_value] if isinstance(field_value, list) \
+                    else objects.to_int(field_value)
             test_obj.assertEqual(field_value, getattr(line_object, field_name.lower()))
 
 def build_and_verify_line_object(test_obj, line_obj_type, line_grammar, line_data):
@@ -552,5 +633,1445 @@ class TestSdpObjectCreation(unittest.TestCase):
         print(sdp.to_string())
         print(sdp.audio.direction)
 
+def object_to_data(obj):
+    # Flatten one of the objects from Sdp.py into plain lists/dicts so the objects built by the different
+    #  parsing engines can be compared
+    if hasattr(obj, "sub_lines"):
+        return [object_to_data(line) for line in obj.sub_lines]
+    if hasattr(obj, "sub_sections"):
+        return [object_to_data(section) for section in obj.sub_sections]
+    if hasattr(obj, "field_names"):
+        return dict((name, object_to_data(getattr(obj, name))) for name in obj.field_names())
+    if hasattr(obj, "fields"):
+        # A section or the sdp itself
+        return dict((field.lower(), object_to_data(getattr(obj, field.lower())))
+                    for field in obj.fields if hasattr(obj, field.lower()))
+    return obj
+
+def parse_with_both_engines(test_obj, line_obj_type, line_grammar, fast_parser, line_data):
+    line_str = build_line_str(line_data)
+    pyparsing_obj = line_obj_type(line_grammar.parseString(line_str)[0])
+    fast_obj = line_obj_type(fast_parser(line_str))
+    test_obj.assertEqual(object_to_data(pyparsing_obj), object_to_data(fast_obj))
+    verify_line_object(test_obj, fast_obj, line_data)
+
+class TestFastEngine(unittest.TestCase):
+    def test_line_objects_match_pyparsing(self):
+        for line_obj_type, line_grammar, fast_parser, line_data in [
+                (objects.VersionLine, grammar.version_line, fast.parse_version_line, SampleData.vline_data),
+                (objects.OriginatorLine, grammar.originator_line, fast.parse_originator_line, SampleData.oline_data),
+                (objects.SessionNameLine, grammar.session_name_line, fast.parse_session_name_line, SampleData.sline_data),
+                (objects.SessionInformationLine, grammar.session_information_line, fast.parse_session_information_line, SampleData.iline_data),
+                (objects.ConnectionInformationLine, grammar.connection_information_line, fast.parse_connection_information_line, SampleData.cline_data),
+                (objects.BandwidthInformationLine, grammar.bandwidth_information_line, fast.parse_bandwidth_information_line, SampleData.bline_data),
+                (objects.TimeDescriptionLine, grammar.time_description_line, fast.parse_time_description_line, SampleData.tline_data),
+                (objects.MediaDescriptionLine, grammar.media_description_line, fast.parse_media_description_line, SampleData.mline_data)]:
+            parse_with_both_engines(self, line_obj_type, line_grammar, fast_parser, line_data)
+
+    def test_application_line_objects_match_pyparsing(self):
+        for line_str in ["a=some unknown generic line",
+                         "a=sendrecv",
+                         "a=rtcp:1 IN IP4 127.0.0.1",
+                         "a=rtcp:9",
+                         "a=ice-ufrag:abcdefghi1234+ab",
+                         "a=ice-pwd:abcdefghi1234+ab",
+                         "a=group:LS 1 2",
+                         "a=mid:audio",
+                         "a=rtcp-mux",
+                         "a=rtcp-fb:111 transport-cc",
+                         "a=rtpmap:111 OPUS/48000/2",
+                         "a=rtpmap:96 VP8/90000",
+                         # Not an alphanumeric encoding name, so the grammar treats it as a generic line
+                         "a=rtpmap:126 telephone-event/8000",
+                         # Only part of the value fits the grammar
+                         "a=ice-pwd:abc-def",
+                         "a=mid",
+                         "a=candidate:1467250027 1 udp 2122260223 192.168.0.196 46243 typ host generation 0",
+                         "a=candidate:434307887 1 tcp 1518280447 192.168.0.196 9 typ host tcptype active generation 0",
+                         "a=candidate:842163049 1 udp 1677729535 198.51.100.23 46243 typ srflx raddr 192.168.0.196 rport 46243",
+                         "a=candidate:1 1 UDP 2130706431 fe80::1 5000 typ host",
+                         "a=candidate:1 1 udp 2130706431 10.0.0.1 5000 typ host generation",
+                         "a=candidate:1 1 udp 2130706431 10.0.0.1 5000 host",
+                         "a=fmtp:111 minptime=10;useinbandfec=1",
+                         "a=fmtp:102 level-asymmetry-allowed=1; packetization-mode=1",
+                         "a=fmtp:111",
+                         "a=rtcp-fb:96 nack pli",
+                         "a=rtcp-fb:* ccm tmmbr smaxpr=120",
+                         "a=rtcp-fb:96",
+                         "a=extmap:1 urn:ietf:params:rtp-hdrext:ssrc-audio-level",
+                         "a=extmap:2/recvonly urn:ietf:params:rtp-hdrext:csrc-audio-level vad=on",
+                         "a=extmap:first urn:ietf:params:rtp-hdrext:sdes:mid",
+                         "a=ssrc:3570614608 cname:4TOk42mSjXCkVIa6",
+                         "a=ssrc:3570614608 msid:lgsCFqt9kN2fVKw5wXltWIwhC9ZgMP2cwKmf 35429d94-5637-4686-9ecd-7d0622261ce8",
+                         "a=ssrc:3570614608 previous-ssrc",
+                         "a=ssrc:3570614608 cname:",
+                         "a=ssrc-group:FID 2231627014 632943048",
+                         "a=ssrc-group:SIM 1 2 3",
+                         "a=ssrc-group:FID"]:
+            pyparsing_obj = objects.ApplicationLine(grammar.application_line.parseString(line_str)[0])
+            fast_obj = objects.ApplicationLine(fast.parse_application_line(line_str))
+            self.assertEqual(object_to_data(pyparsing_obj), object_to_data(fast_obj))
+
+    def test_sdp_objects_match_pyparsing(self):
+        generic_aline_data = {"prefix": "a=",
+                              "fields": [("GENERIC_APPLICATION_LINE", {"prefix": "",
+                                                                       "fields": [("CONTENT", "some unknown generic line")]})]}
+        session_section_data = {"fields": [("VERSION_LINE", SampleData.vline_data),
+                                           ("ORIGINATOR_LINE", SampleData.oline_data),
+                                           ("SESSION_NAME_LINE", SampleData.sline_data),
+                                           ("SESSION_INFORMATION_LINE", SampleData.iline_data),
+                                           ("CONNECTION_INFORMATION_LINE", SampleData.cline_data),
+                                           ("BANDWIDTH_INFORMATION_LINES", [SampleData.bline_data]),
+                                           ("TIME_DESCRIPTION_LINES", [SampleData.tline_data]),
+                                           ("APPLICATION_LINES", [generic_aline_data])]}
+        media_section_data = {"fields": [("MEDIA_DESCRIPTION_LINE", SampleData.mline_data),
+                                         ("SESSION_INFORMATION_LINE", SampleData.iline_data),
+                                         ("CONNECTION_INFORMATION_LINE", SampleData.cline_data),
+                                         ("BANDWIDTH_INFORMATION_LINES", [SampleData.bline_data]),
+                                         ("APPLICATION_LINES", [generic_aline_data])]}
+        sdp_data = {"fields": [("SESSION_SECTION", session_section_data),
+                               ("MEDIA_SECTIONS", [media_section_data])]}
+
+        for sdp_str in [build_sdp_str(sdp_data), SampleData.webrtc_offer]:
+            pyparsing_sdp = objects.Sdp(sdp_str)
+            fast_sdp = objects.Sdp(sdp_str, engine="fast")
+            self.assertEqual(object_to_data(pyparsing_sdp), object_to_data(fast_sdp))
+
+    def test_webrtc_offer(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        self.assertEqual(len(sdp.media_sections.sub_sections), 2)
+        self.assertEqual(sdp.audio.direction, "sendrecv")
+        self.assertEqual(sdp.video.direction, "recvonly")
+        self.assertEqual(sdp.video.media_description_line.formats, [96, 97])
+
+    def test_malformed_lines(self):
+        for sdp_str in ["o=- 1 2 IN IP4 127.0.0.1\nv=0\ns=-\nt=0 0\n",
+                        "v=0\no=- 1 2 IN IP4\ns=-\nt=0 0\n",
+                        "v=0\no=- 1 2 IN IP4 127.0.0.1\ns=-\n",
+                        "v=0\no=- 1 2 IN IP4 127.0.0.1\ns=-\nt=0 0\nx=unknown\n"]:
+            self.assertRaises(ValueError, objects.Sdp, sdp_str, engine="fast")
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, objects.Sdp, SampleData.webrtc_offer, engine="unknown")
+
+    def test_fast_engine_does_not_import_pyparsing(self):
+        code = "import sys, Sdp; Sdp.Sdp(sys.stdin.read(), engine='fast'); sys.exit('pyparsing' in sys.modules)"
+        proc = subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        proc.communicate(SampleData.webrtc_offer.encode("ascii"))
+        self.assertEqual(proc.returncode, 0)
+
+class TestLazyMediaSections(unittest.TestCase):
+    def test_lazy_matches_eager(self):
+        for engine in ["pyparsing", "fast"]:
+            eager_sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine)
+            lazy_sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine, lazy=True)
+            self.assertEqual(len(lazy_sdp.media_sections), 2)
+            self.assertEqual(object_to_data(eager_sdp.session_section), object_to_data(lazy_sdp.session_section))
+            self.assertEqual(object_to_data(eager_sdp.media_sections), object_to_data(lazy_sdp.media_sections))
+
+    def test_sections_parsed_on_access(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=True)
+        self.assertEqual(sdp.media_sections.parsed_sections, [None, None])
+        self.assertEqual(sdp.video.direction, "recvonly")
+        self.assertIsNone(sdp.media_sections.parsed_sections[0])
+        self.assertIs(sdp.media_sections[1], sdp.video)
+        self.assertEqual(sdp.audio.direction, "sendrecv")
+        self.assertIs(sdp.media_sections[0], sdp.audio)
+
+    def test_malformed_section_raises_on_access(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer + "m=video 9\n", engine="fast", lazy=True)
+        self.assertEqual(sdp.audio.direction, "sendrecv")
+        self.assertRaises(ValueError, lambda: sdp.media_sections[2])
+
+# Collects what's written to it, untranslated (unlike a file opened in text mode) on both python 2 and 3
+class StringWriter(object):
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, s):
+        self.pieces.append(s)
+
+    def getvalue(self):
+        return "".join(self.pieces)
+
+class TestSerialization(unittest.TestCase):
+    def test_round_trip(self):
+        crlf_offer = SampleData.webrtc_offer.replace("\n", "\r\n")
+        for sdp_str in [SampleData.webrtc_offer, crlf_offer, SampleData.webrtc_offer.rstrip("\n")]:
+            for engine in ["pyparsing", "fast"]:
+                for lazy in [False, True]:
+                    sdp = objects.Sdp(sdp_str, engine=engine, lazy=lazy)
+                    self.assertEqual(sdp.to_sdp(), sdp_str.rstrip("\r\n") + sdp.line_ending)
+
+    def test_other_line_ending(self):
+        crlf_offer = SampleData.webrtc_offer.replace("\n", "\r\n")
+        for sdp_str, line_ending, expected in [(SampleData.webrtc_offer, "\r\n", crlf_offer),
+                                               (crlf_offer, "\n", SampleData.webrtc_offer)]:
+            for lazy in [False, True]:
+                sdp = objects.Sdp(sdp_str, engine="fast", lazy=lazy)
+                self.assertEqual(sdp.to_sdp(line_ending), expected)
+                # The sections that were modified are formatted, the rest passed through: every line has to end
+                #  the same way either way
+                sdp.media_sections[1].set_direction("sendonly")
+                res = sdp.to_sdp(line_ending)
+                self.assertEqual(res, expected.replace("a=recvonly", "a=sendonly"))
+                self.assertEqual("".join(sdp.iter_lines(line_ending)), res)
+                self.assertEqual(objects.Sdp(res, engine="fast").to_sdp(), res)
+
+    def test_data_channel(self):
+        crlf_offer = SampleData.data_channel_offer.replace("\n", "\r\n")
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(crlf_offer, engine=engine)
+            self.assertEqual(len(sdp.media_sections), 3)
+            self.assertEqual(sdp.media_sections[2].media_description_line.formats, ["webrtc-datachannel"])
+            sctp_port = sdp.media_sections[2].attribute_lines("sctp-port")[0]._sub_line
+            self.assertEqual(sctp_port.attribute_value, "5000")
+            self.assertEqual(sdp.to_sdp(), crlf_offer)
+            # The generic lines don't keep the '\r' either
+            sdp.media_sections[2].add_application_line("sctp-port:5001")
+            self.assertNotIn("\r\r", sdp.to_sdp())
+
+    def test_unparsed_lines_raise(self):
+        # (The pyparsing grammar stops at a line it can't parse, rather than raising)
+        bad_offer = SampleData.webrtc_offer.replace("m=video 9 UDP/TLS/RTP/SAVPF", "m=video 9 RTP/BOGUS")
+        self.assertRaises(ValueError, objects.Sdp, bad_offer)
+        bad_section = SampleData.webrtc_offer.replace("c=IN IP4 0.0.0.0", "c=IN IP4 nowhere", 1)
+        self.assertRaises(ValueError, objects.Sdp, bad_section)
+        self.assertRaises(ValueError, objects.Sdp(bad_section, lazy=True).media_sections.__getitem__, 0)
+
+    def test_format_lines(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        for section in [sdp.session_section] + list(sdp.media_sections):
+            for line in section.lines():
+                self.assertEqual(line.format_sdp(), line._raw)
+
+    def test_modified_lines_are_formatted(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer.replace("a=mid:video", "a=mid:video  "), engine="fast")
+        audio_sdp = sdp.audio.to_sdp("\n")
+        for app_line in sdp.video.application_lines:
+            if hasattr(app_line, "direction_application_line"):
+                app_line.direction_application_line.direction = "sendonly"
+        sdp.video.media_description_line.formats = ["96"]
+        self.assertFalse(sdp.audio.is_modified())
+        self.assertTrue(sdp.video.is_modified())
+        res = sdp.to_sdp()
+        self.assertIn(audio_sdp, res)
+        self.assertIn("m=video 9 UDP/TLS/RTP/SAVPF 96\n", res)
+        self.assertIn("a=sendonly\n", res)
+        self.assertNotIn("a=recvonly", res)
+        # Lines that weren't touched keep their raw text, even in a section that was modified
+        self.assertIn("a=mid:video  \n", res)
+
+    def test_removed_lines(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        sdp.video.application_lines.sub_lines.pop()
+        self.assertNotIn("a=ssrc:632943048", sdp.to_sdp())
+
+    def test_write(self):
+        for engine in ["pyparsing", "fast"]:
+            for lazy in [False, True]:
+                sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine, lazy=lazy)
+                sdp.video.set_direction("sendonly")
+                for line_ending in [None, "\r\n"]:
+                    f = StringWriter()
+                    sdp.write(f, line_ending)
+                    self.assertEqual(f.getvalue(), sdp.to_sdp(line_ending))
+
+    def test_iter_lines(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer.replace("\n", "\r\n"), engine="fast", lazy=True)
+        sdp.media_sections[1].set_direction("sendonly")
+        lines = list(sdp.iter_lines())
+        self.assertEqual("".join(lines), sdp.to_sdp())
+        self.assertEqual(len(lines), sdp.to_sdp().count("\n"))
+        for line in lines:
+            self.assertTrue(line.endswith("\r\n"))
+            self.assertNotIn("\n", line[:-1])
+        self.assertIn("a=sendonly\r\n", lines)
+        # The audio section was written out without being parsed
+        self.assertIsNone(sdp.media_sections.parsed_sections[0])
+
+    def test_dump(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        f = StringWriter()
+        sdp.dump(f)
+        self.assertEqual(f.getvalue(), sdp.to_string())
+        # (The payload type of an rtpmap is an int)
+        self.assertIn("      line 10:\n        rtpmap_application_line:\n          pt: 111\n          rtpmap_codec_info:\n",
+                      sdp.to_string())
+
+class TestLineObjectLayout(unittest.TestCase):
+    def test_lines_have_no_dict(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        for section in [sdp.session_section] + list(sdp.media_sections):
+            for line in section.lines():
+                self.assertFalse(hasattr(line, "__dict__"), "%s has a __dict__" % type(line).__name__)
+                for nested_line in line.nested_lines() if isinstance(line, objects.PyParsedMetaLine) else []:
+                    self.assertFalse(hasattr(nested_line, "__dict__"), "%s has a __dict__" % type(nested_line).__name__)
+
+    def test_application_line_sub_line(self):
+        app_line = objects.ApplicationLine(fast.parse_application_line("a=mid:audio"))
+        self.assertEqual(app_line.field_names(), ["mid_application_line"])
+        self.assertEqual(app_line.mid_application_line.id, "audio")
+        self.assertFalse(hasattr(app_line, "direction_application_line"))
+        app_line.mid_application_line = objects.MidApplicationLine({"ID": "video"})
+        self.assertEqual(app_line.to_sdp(), "a=mid:video")
+        self.assertRaises(AttributeError, setattr, app_line, "unknown_field", "value")
+
+    def test_pickle(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        sdp.audio.media_description_line.port = "10000"
+        sdp.freeze()
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            unpickled = pickle.loads(pickle.dumps(sdp, protocol))
+            self.assertEqual(object_to_data(unpickled), object_to_data(sdp))
+            self.assertEqual(unpickled.to_sdp(), sdp.to_sdp())
+            self.assertIn("m=audio 10000 ", unpickled.to_sdp())
+            self.assertRaises(AttributeError, setattr, unpickled.video.media_description_line, "port", "1")
+
+class TestSdpCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = SdpCache()
+        sdp = objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast")
+        self.assertIs(objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast"), sdp)
+        # Different options are cached separately
+        self.assertIsNot(objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast", lazy=True), sdp)
+        self.assertEqual(cache.stats(), {"entries": 2,
+                                         "bytes": 2 * len(SampleData.webrtc_offer),
+                                         "hits": 1,
+                                         "misses": 2,
+                                         "evictions": 0})
+
+    def test_lru_eviction(self):
+        cache = SdpCache(max_entries=2)
+        offers = [SampleData.webrtc_offer.replace("o=- 4611731400430051336 2", "o=- 4611731400430051336 %d" % i) for i in range(3)]
+        first = cache.parse(offers[0], engine="fast")
+        cache.parse(offers[1], engine="fast")
+        # Use the first one again so the second one is the least recently used
+        cache.parse(offers[0], engine="fast")
+        cache.parse(offers[2], engine="fast")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIs(cache.parse(offers[0], engine="fast"), first)
+        self.assertEqual(cache.misses, 3)
+
+    def test_byte_limit(self):
+        cache = SdpCache(max_bytes=len(SampleData.webrtc_offer) + 10)
+        cache.parse(SampleData.webrtc_offer, engine="fast")
+        cache.parse(SampleData.webrtc_offer + "a=x\n", engine="fast")
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 1)
+        # Too big to be cached at all
+        cache.parse(SampleData.webrtc_offer + "a=x\n" * 10, engine="fast")
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_limits(self):
+        cache = SdpCache()
+        sdp = objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast", limits=SdpValidation.Limits())
+        self.assertIs(objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast"), sdp)
+        # A cached sdp still has to pass the caller's limits
+        with self.assertRaises(SdpValidation.ValidationError) as raised:
+            objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast", limits=SdpValidation.Limits(max_lines=10))
+        self.assertEqual(raised.exception.reason, SdpValidation.TOO_MANY_LINES)
+        self.assertEqual(cache.hits, 1)
+
+    def test_projections(self):
+        cache = SdpCache()
+        sdp = objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast")
+        audio_only = objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast", include_media=["audio"])
+        self.assertIsNot(audio_only, sdp)
+        self.assertIsNone(audio_only.media_sections.parsed_sections[1])
+        self.assertIs(objects.Sdp.parse(SampleData.webrtc_offer, cache=cache, engine="fast", include_media=("audio",)),
+                      audio_only)
+        rtpmaps = cache.parse(SampleData.webrtc_offer, engine="fast", include_attributes=["rtpmap", "fmtp"])
+        self.assertIsNot(rtpmaps, sdp)
+        self.assertEqual(rtpmaps.projection.include_attributes, frozenset(["rtpmap", "fmtp"]))
+        self.assertIs(cache.parse(SampleData.webrtc_offer, engine="fast", include_attributes={"fmtp", "rtpmap"}),
+                      rtpmaps)
+        self.assertEqual(cache.stats()["entries"], 3)
+
+    def test_cached_sdps_are_frozen(self):
+        for lazy in [False, True]:
+            sdp = SdpCache().parse(SampleData.webrtc_offer, engine="fast", lazy=lazy)
+            self.assertTrue(sdp.is_frozen())
+            self.assertRaises(AttributeError, setattr, sdp.audio.media_description_line, "port", "10")
+            self.assertRaises(AttributeError, setattr, sdp.video, "connection_information_line", None)
+            self.assertRaises(AttributeError, setattr, sdp, "session_section", None)
+            self.assertIsInstance(sdp.audio.application_lines.sub_lines, tuple)
+            app_line = sdp.audio.application_lines.sub_lines[0]
+            self.assertRaises(AttributeError, setattr, app_line, app_line.field_names()[0], None)
+            self.assertRaises(AttributeError, setattr, sdp.audio.application_lines.sub_lines[-1]._sub_line, "content", "")
+            self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+
+class TestReparse(unittest.TestCase):
+    def renegotiated_offer(self):
+        # Bump the session version and change the video direction
+        return SampleData.webrtc_offer.replace("o=- 4611731400430051336 2", "o=- 4611731400430051336 3") \
+                                      .replace("a=recvonly", "a=sendrecv")
+
+    def test_unchanged_sections_are_reused(self):
+        for engine in ["pyparsing", "fast"]:
+            old_sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine)
+            new_sdp = old_sdp.reparse(self.renegotiated_offer())
+            self.assertEqual(new_sdp.changes, objects.SdpChanges(True, [1], []))
+            # A reused section is a clone, sharing the old section's lines
+            self.assertIsNot(new_sdp.audio, old_sdp.audio)
+            self.assertIs(new_sdp.audio.peek("media_description_line"), old_sdp.audio.peek("media_description_line"))
+            self.assertIsNot(new_sdp.video.peek("media_description_line"), old_sdp.video.peek("media_description_line"))
+            self.assertEqual(new_sdp.session_section.originator_line.session_version, "3")
+            self.assertEqual(new_sdp.video.direction, "sendrecv")
+            self.assertEqual(new_sdp.to_sdp(), self.renegotiated_offer())
+            self.assertEqual(object_to_data(new_sdp),
+                             object_to_data(objects.Sdp(self.renegotiated_offer(), engine=engine)))
+
+    def test_added_and_removed_sections(self):
+        old_sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        audio_only = SampleData.webrtc_offer[:SampleData.webrtc_offer.index("m=video")]
+        new_sdp = old_sdp.reparse(audio_only)
+        self.assertEqual(new_sdp.changes, objects.SdpChanges(False, [], [1]))
+        self.assertIs(new_sdp.session_section.peek("originator_line"), old_sdp.session_section.peek("originator_line"))
+        self.assertEqual(len(new_sdp.media_sections), 1)
+        newer_sdp = new_sdp.reparse(SampleData.webrtc_offer)
+        self.assertEqual(newer_sdp.changes, objects.SdpChanges(False, [1], []))
+        self.assertEqual(newer_sdp.video.direction, "recvonly")
+
+    def test_modified_sections_are_parsed_again(self):
+        old_sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        old_sdp.audio.media_description_line.port = 10
+        new_sdp = old_sdp.reparse(SampleData.webrtc_offer)
+        self.assertEqual(new_sdp.changes, objects.SdpChanges(False, [0], []))
+        self.assertEqual(new_sdp.audio.media_description_line.port, 9)
+
+    def test_lazy_reparse(self):
+        old_sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=True)
+        old_audio = old_sdp.audio
+        new_sdp = old_sdp.reparse(self.renegotiated_offer())
+        self.assertEqual(new_sdp.changes, objects.SdpChanges(True, [1], []))
+        self.assertIs(new_sdp.media_sections.parsed_sections[0].peek("media_description_line"),
+                      old_audio.peek("media_description_line"))
+        self.assertIsNone(new_sdp.media_sections.parsed_sections[1])
+        self.assertEqual(new_sdp.video.direction, "sendrecv")
+        self.assertEqual(new_sdp.to_sdp(), self.renegotiated_offer())
+
+    def test_changing_the_new_sdp(self):
+        for lazy in [False, True]:
+            old_sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=lazy)
+            old_sdp.audio
+            new_sdp = old_sdp.reparse(SampleData.webrtc_offer)
+            new_sdp.media_sections[0].set_port(5004)
+            new_sdp.media_sections[0].remove_codec(111)
+            new_sdp.set_connection("198.51.100.7")
+            self.assertEqual(old_sdp.to_sdp(), SampleData.webrtc_offer)
+            self.assertEqual(old_sdp.audio.media_description_line.port, 9)
+            self.assertIn("m=audio 5004 UDP/TLS/RTP/SAVPF 103 9 0 8 126", new_sdp.to_sdp())
+            # And the other way round
+            old_sdp.video.set_direction("inactive")
+            self.assertIn("a=recvonly", new_sdp.to_sdp())
+            # Lines can be changed directly in either of them
+            new_sdp.session_section.originator_line.session_version = 3
+            old_sdp.media_sections[0].media_description_line.port = 5006
+            new_sdp.media_sections[0].media_description_line.port = 5008
+            self.assertIn("o=- 4611731400430051336 3 ", new_sdp.to_sdp())
+            self.assertIn("o=- 4611731400430051336 2 ", old_sdp.to_sdp())
+            self.assertIn("m=audio 5006 ", old_sdp.to_sdp())
+            self.assertIn("m=audio 5008 ", new_sdp.to_sdp())
+
+    def test_lazy_reparse_only_parses_accessed_sections(self):
+        old_sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=True)
+        old_sdp.audio
+        new_sdp = old_sdp.reparse(SampleData.webrtc_offer)
+        self.assertEqual(new_sdp.changes, objects.SdpChanges(False, [], []))
+        # Comparing the text of the sections didn't parse the one that was never accessed
+        self.assertIsNone(old_sdp.media_sections.parsed_sections[1])
+        self.assertIsNone(new_sdp.media_sections.parsed_sections[1])
+
+class TestIndexes(unittest.TestCase):
+    def test_sdp_indexes(self):
+        for lazy in [False, True]:
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=lazy)
+            self.assertEqual(sdp.mid_index, {"audio": 0, "video": 1})
+            self.assertIs(sdp.by_mid("video"), sdp.video)
+            self.assertIsNone(sdp.by_mid("data"))
+            self.assertEqual(sdp.by_media_type("audio"), [sdp.audio])
+            self.assertEqual(sdp.by_media_type("application"), [])
+
+    def test_lazy_sections_are_not_parsed_to_index(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=True)
+        self.assertIs(sdp.by_mid("video"), sdp.media_sections[1])
+        self.assertIsNone(sdp.media_sections.parsed_sections[0])
+
+    def test_media_section_indexes(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        self.assertEqual(sdp.audio.mid, "audio")
+        self.assertEqual(sdp.audio.rtpmap(111).rtpmap_codec_info.encoding_name, "opus")
+        self.assertEqual(sdp.audio.rtpmap("0").rtpmap_codec_info.encoding_name, "PCMU")
+        self.assertEqual(sdp.audio.rtpmap(126).rtpmap_codec_info.encoding_name, "telephone-event")
+        self.assertEqual(len(sdp.audio.attribute_lines("rtpmap")), 6)
+        self.assertEqual(len(sdp.video.attribute_lines("rtcp-fb")), 2)
+        self.assertEqual(sdp.video.attribute_lines("recvonly")[0].direction_application_line.direction, "recvonly")
+        self.assertEqual(sdp.session_section.attribute_lines("group")[0].group_application_line.ids, ["audio", "video"])
+        self.assertEqual(sdp.audio.attribute_lines("candidate"), [])
+
+    def test_mid_from_generic_line(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer.replace("a=mid:video", "a=mid:sdparta_1"), engine="fast")
+        self.assertEqual(sdp.video.mid, "sdparta_1")
+        self.assertIs(sdp.by_mid("sdparta_1"), sdp.video)
+
+    def test_reindex(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        sdp.audio.application_lines.sub_lines.append(objects.ApplicationLine(fast.parse_application_line("a=rtpmap:100 G729/8000")))
+        self.assertIsNone(sdp.audio.rtpmap(100))
+        sdp.audio.reindex()
+        self.assertEqual(sdp.audio.rtpmap(100).rtpmap_codec_info.encoding_name, "G729")
+
+class TestCodecs(unittest.TestCase):
+    def test_typed_lines(self):
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine)
+            self.assertEqual(sdp.audio.fmtp(111).parameter_dict(), {"minptime": "10", "useinbandfec": "1"})
+            rtcp_fb = sdp.video.attribute_lines("rtcp-fb")[1].rtcp_fb_application_line
+            self.assertEqual([rtcp_fb.pt, rtcp_fb.type, rtcp_fb.parameters], [96, "nack", "pli"])
+            extmap = sdp.audio.attribute_lines("extmap")[0].extmap_application_line
+            self.assertEqual([extmap.id, extmap.uri], ["1", "urn:ietf:params:rtp-hdrext:ssrc-audio-level"])
+            ssrc = sdp.audio.attribute_lines("ssrc")[1].ssrc_application_line
+            self.assertEqual([ssrc.ssrc, ssrc.attribute], ["3570614608", "msid"])
+            self.assertEqual(ssrc.value, "lgsCFqt9kN2fVKw5wXltWIwhC9ZgMP2cwKmf 35429d94-5637-4686-9ecd-7d0622261ce8")
+            ssrc_group = sdp.video.attribute_lines("ssrc-group")[0].ssrc_group_application_line
+            self.assertEqual([ssrc_group.semantics, ssrc_group.ssrcs], ["FID", ["2231627014", "632943048"]])
+
+    def test_format_typed_lines(self):
+        for line_str in ["a=fmtp:111 minptime=10;useinbandfec=1",
+                         "a=rtcp-fb:96 goog-remb",
+                         "a=rtcp-fb:* ccm tmmbr smaxpr=120",
+                         "a=extmap:2/recvonly urn:ietf:params:rtp-hdrext:csrc-audio-level vad=on",
+                         "a=ssrc:3570614608 cname:4TOk42mSjXCkVIa6",
+                         "a=ssrc:3570614608 previous-ssrc",
+                         "a=ssrc-group:SIM 1 2 3"]:
+            self.assertEqual(objects.ApplicationLine(fast.parse_application_line(line_str)).format_sdp(), line_str)
+
+    def test_format_parameters(self):
+        self.assertEqual(objects.parse_format_parameters("profile-level-id=42e01f; packetization-mode=1;"),
+                         {"profile-level-id": "42e01f", "packetization-mode": "1"})
+        self.assertEqual(objects.parse_format_parameters("0-15"), {"0-15": None})
+
+    def test_codec_table(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        self.assertEqual([codec.pt for codec in sdp.audio.codecs], [111, 103, 9, 0, 8, 126])
+        opus = sdp.audio.codec(111)
+        self.assertEqual(opus, objects.Codec(111, "opus", 48000, "2", {"minptime": "10", "useinbandfec": "1"},
+                                             ("transport-cc",)))
+        self.assertEqual(sdp.audio.find_codecs("OPUS"), [opus])
+        self.assertEqual(sdp.audio.find_codecs("opus", 8000), [])
+        self.assertEqual(sdp.video.codec(96).rtcp_feedback, ("goog-remb", "nack pli"))
+        self.assertEqual(sdp.video.codec(97).parameters, {"apt": "96"})
+        self.assertIsNone(sdp.video.codec(98))
+
+    def test_dtmf(self):
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine)
+            dtmf = objects.Codec(126, "telephone-event", 8000, None, {}, ())
+            self.assertIn(dtmf, sdp.audio.codecs)
+            self.assertEqual(sdp.audio.codec(126), dtmf)
+            self.assertEqual(sdp.audio.find_codecs("telephone-event"), [dtmf])
+            self.assertIsInstance(sdp.audio.rtpmap(126), objects.RtpMapApplicationLine)
+            self.assertEqual(sdp.audio.rtpmap(126).to_sdp(), "rtpmap:126 telephone-event/8000")
+
+    def test_encoding_names_are_tokens(self):
+        # Encoding names are RFC 4566 tokens, not just letters and digits
+        for name in ["telephone-event", "flexfec-03", "x.codec_v2", "a!#$%&'*+-.^_`{|}~"]:
+            for engine in ["pyparsing", "fast"]:
+                sdp = objects.Sdp(SampleData.webrtc_offer.replace("telephone-event", name), engine=engine)
+                self.assertEqual(sdp.audio.codec(126).encoding_name, name)
+        # ('/' ends the name)
+        self.assertIsNone(objects.Sdp(SampleData.webrtc_offer.replace("telephone-event/8000", "telephone/event/8000"),
+                                      engine="fast").audio.codec(126))
+
+    def test_static_payload_types(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer.replace("a=rtpmap:0 PCMU/8000\n", ""), engine="fast")
+        self.assertEqual(sdp.audio.codec(0)[:4], (0, "PCMU", 8000, None))
+        self.assertEqual(sdp.audio.codec("0"), sdp.audio.codec(0))
+
+    def test_feedback_for_all_payload_types(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer.replace("a=rtcp-fb:96 goog-remb", "a=rtcp-fb:* goog-remb"), engine="fast")
+        self.assertEqual(sdp.video.codec(96).rtcp_feedback, ("nack pli", "goog-remb"))
+        self.assertEqual(sdp.video.codec(97).rtcp_feedback, ("goog-remb",))
+
+class TestSsrcIndex(unittest.TestCase):
+    simulcast_lines = "\n".join(["a=msid:stream0 track0",
+                                 "a=ssrc-group:SIM 1001 1002 1003",
+                                 "a=ssrc-group:FID 1001 2001",
+                                 "a=ssrc-group:FID 1002 2002",
+                                 "a=ssrc:1001 cname:camera",
+                                 "a=ssrc:1002 cname:camera",
+                                 "a=ssrc:1003 cname:camera",
+                                 "a=ssrc:2001 cname:camera",
+                                 "a=ssrc:2002 cname:camera",
+                                 ""])
+    simulcast_offer = SampleData.webrtc_offer.replace("a=ssrc-group:FID 2231627014 632943048\n", "") \
+                                             .replace("a=ssrc:2231627014 cname:4TOk42mSjXCkVIa6\n", "") \
+                                             .replace("a=ssrc:632943048 cname:4TOk42mSjXCkVIa6\n", simulcast_lines)
+
+    def test_section_ssrc_index(self):
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine)
+            self.assertEqual(sdp.audio.ssrc_info(3570614608),
+                             objects.SsrcInfo("3570614608", "4TOk42mSjXCkVIa6",
+                                              "lgsCFqt9kN2fVKw5wXltWIwhC9ZgMP2cwKmf 35429d94-5637-4686-9ecd-7d0622261ce8"))
+            self.assertEqual(sdp.video.ssrc_info("632943048"), objects.SsrcInfo("632943048", "4TOk42mSjXCkVIa6", None))
+            self.assertEqual(sdp.video.rtx_ssrc(2231627014), "632943048")
+            self.assertIsNone(sdp.video.rtx_ssrc(632943048))
+            self.assertEqual(sdp.video.simulcast_groups, [])
+
+    def test_sdp_ssrc_index(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        self.assertEqual(sdp.ssrc_index, {"3570614608": 0, "2231627014": 1, "632943048": 1})
+        self.assertIs(sdp.by_ssrc(632943048), sdp.video)
+        self.assertEqual(sdp.ssrc_info(3570614608).cname, "4TOk42mSjXCkVIa6")
+        self.assertIsNone(sdp.by_ssrc(1))
+        self.assertIsNone(sdp.ssrc_info(1))
+
+    def test_simulcast_groups(self):
+        sdp = objects.Sdp(self.simulcast_offer, engine="fast")
+        self.assertEqual(sdp.video.simulcast_groups,
+                         [objects.SimulcastGroup(("1001", "1002", "1003"), ("2001", "2002", None))])
+        # The ssrcs without an msid of their own get the section's
+        self.assertEqual(sdp.ssrc_info(1003).msid, "stream0 track0")
+
+    def test_lazy_sections_are_not_parsed_to_index(self):
+        eager_sdp = objects.Sdp(self.simulcast_offer, engine="fast")
+        for sdp in [objects.Sdp(self.simulcast_offer, engine="fast", lazy=True),
+                    objects.Sdp.from_buffer(self.simulcast_offer.encode("utf-8"), engine="fast")]:
+            self.assertEqual(sdp.ssrc_index, eager_sdp.ssrc_index)
+            self.assertEqual(sdp.media_sections.parsed_sections, [None, None])
+            self.assertEqual(sdp.ssrc_info(2002), objects.SsrcInfo("2002", "camera", "stream0 track0"))
+            self.assertEqual(sdp.media_sections.parsed_sections[0], None)
+
+class TestNegotiation(unittest.TestCase):
+    local_caps = Capabilities({"audio": [objects.Codec(None, "PCMU", 8000, None, {}, ()),
+                                         objects.Codec(None, "OPUS", 48000, "2", {"useinbandfec": "1"}, ("transport-cc", "nack"))],
+                               "video": [objects.Codec(None, "VP8", 90000, None, {}, ("nack pli",)),
+                                         objects.Codec(None, "rtx", 90000, None, {}, ())]},
+                              header_extensions=["urn:ietf:params:rtp-hdrext:ssrc-audio-level"])
+
+    def answer(self, offer_str, local_caps=None, **kwargs):
+        return negotiate(objects.Sdp(offer_str, engine="fast"), local_caps or self.local_caps, session_id=1, **kwargs)
+
+    def test_answer(self):
+        answer = self.answer(SampleData.webrtc_offer, transport_attributes=["setup:active"])
+        # The offer's payload types, in local order of preference
+        self.assertEqual(answer.audio.media_description_line.formats, [0, 111])
+        self.assertEqual(answer.audio.codec(111), objects.Codec(111, "opus", 48000, "2", {"useinbandfec": "1"}, ("transport-cc",)))
+        self.assertEqual(answer.audio.attribute_lines("extmap")[0].extmap_application_line.id, "1")
+        self.assertEqual(answer.audio.attribute_lines("setup")[0].generic_application_line.attribute_value, "active")
+        self.assertEqual(answer.audio.mid, "audio")
+        self.assertEqual(answer.audio.direction, "sendrecv")
+        self.assertEqual(answer.video.direction, "sendonly")
+        self.assertIn("rtcp-mux", answer.video.attribute_index)
+        self.assertEqual(answer.session_section.attribute_lines("group")[0].group_application_line.ids, ["audio", "video"])
+
+    def test_address(self):
+        for address, addrtype in [("198.51.100.7", "IP4"), ("2001:db8::1", "IP6")]:
+            answer = self.answer(SampleData.webrtc_offer, address=address)
+            self.assertIn("o=- 1 1 IN %s %s\r\n" % (addrtype, address), answer.to_sdp())
+            self.assertEqual(answer.audio.connection_information_line.to_sdp(), "c=IN %s %s" % (addrtype, address))
+            self.assertEqual(answer.video.connection_information_line.addrtype, addrtype)
+            self.assertEqual(answer.session_section.connection_information_line.to_sdp(), "c=IN %s %s" % (addrtype, address))
+
+    def test_dtmf(self):
+        local_caps = Capabilities({"audio": [objects.Codec(None, "opus", 48000, "2", {}, ()),
+                                             objects.Codec(None, "telephone-event", 8000, None, {}, ())]})
+        answer = self.answer(SampleData.webrtc_offer, local_caps)
+        self.assertEqual(answer.audio.media_description_line.formats, [111, 126])
+        self.assertEqual(answer.audio.codec(126), objects.Codec(126, "telephone-event", 8000, None, {}, ()))
+        self.assertIn("a=rtpmap:126 telephone-event/8000\r\n", answer.to_sdp())
+        # Matched on the clock rate too
+        local_caps = Capabilities({"audio": [objects.Codec(None, "opus", 48000, "2", {}, ()),
+                                             objects.Codec(None, "telephone-event", 48000, None, {}, ())]})
+        self.assertEqual(self.answer(SampleData.webrtc_offer, local_caps).audio.media_description_line.formats, [111])
+
+    def test_rtx(self):
+        answer = self.answer(SampleData.webrtc_offer)
+        self.assertEqual(answer.video.media_description_line.formats, [96, 97])
+        self.assertEqual(answer.video.codec(96).rtcp_feedback, ("nack pli",))
+        self.assertEqual(answer.video.codec(97).parameters, {"apt": "96"})
+        answer = self.answer(SampleData.webrtc_offer.replace("a=fmtp:97 apt=96", "a=fmtp:97 apt=98"))
+        self.assertEqual(answer.video.media_description_line.formats, [96])
+
+    def test_rejected_section(self):
+        answer = self.answer(SampleData.webrtc_offer, Capabilities({"audio": [objects.Codec(None, "opus", 48000, "2", {}, ())]}))
+        self.assertEqual(answer.video.media_description_line.port, 0)
+        self.assertEqual(answer.video.mid, "video")
+        # The rejected section doesn't have a c= line, the session's covers it
+        self.assertIsNone(getattr(answer.video, "connection_information_line", None))
+        self.assertEqual(answer.session_section.connection_information_line.to_sdp(), "c=IN IP4 0.0.0.0")
+        self.assertEqual(answer.session_section.attribute_lines("group")[0].group_application_line.ids, ["audio"])
+
+    def test_codec_profiles(self):
+        h264_offer = SampleData.webrtc_offer.replace("a=rtpmap:96 VP8/90000",
+                                                     "a=rtpmap:96 H264/90000\na=fmtp:96 profile-level-id=42e01f;packetization-mode=1")
+        for parameters, accepted in [({"profile-level-id": "42e034", "packetization-mode": "1"}, True),
+                                     ({"profile-level-id": "42e01f"}, False),
+                                     ({"profile-level-id": "640c1f", "packetization-mode": "1"}, False)]:
+            local_caps = Capabilities({"video": [objects.Codec(None, "H264", 90000, None, parameters, ())]})
+            self.assertEqual(self.answer(h264_offer, local_caps).video.codec(96) is not None, accepted)
+
+    def test_directions(self):
+        local_caps = Capabilities({"audio": [objects.Codec(None, "opus", 48000, "2", {}, ())]}, directions={"audio": "recvonly"})
+        for offered, answered in [("sendrecv", "recvonly"), ("sendonly", "recvonly"), ("recvonly", "inactive")]:
+            answer = self.answer(SampleData.webrtc_offer.replace("a=sendrecv", "a=" + offered), local_caps)
+            self.assertIn(answered, answer.audio.attribute_index)
+
+    def test_capabilities_from_sdp(self):
+        offer = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        answer = negotiate(offer, Capabilities.from_sdp(offer))
+        self.assertEqual(answer.audio.media_description_line.formats, [111, 103, 9, 0, 8, 126])
+        self.assertEqual(answer.video.media_description_line.formats, [96, 97])
+
+class TestMunging(unittest.TestCase):
+    def parse(self, engine="fast"):
+        return objects.Sdp(SampleData.webrtc_offer, engine=engine)
+
+    def without_lines(self, sdp_str, *lines):
+        for line in lines:
+            self.assertIn(line + "\n", sdp_str)
+            sdp_str = sdp_str.replace(line + "\n", "", 1)
+        return sdp_str
+
+    def test_remove_codec(self):
+        for engine in ["pyparsing", "fast"]:
+            sdp = self.parse(engine)
+            sdp.audio.remove_codec(111)
+            self.assertEqual(sdp.audio.media_description_line.formats, [103, 9, 0, 8, 126])
+            self.assertIsNone(sdp.audio.codec(111))
+            self.assertIsNone(sdp.audio.fmtp(111))
+            expected = self.without_lines(SampleData.webrtc_offer, "a=rtpmap:111 opus/48000/2", "a=rtcp-fb:111 transport-cc",
+                                          "a=fmtp:111 minptime=10;useinbandfec=1")
+            self.assertEqual(sdp.to_sdp(), expected.replace("SAVPF 111 103", "SAVPF 103"))
+            # Only the m= line had to be formatted again
+            self.assertEqual([line.is_modified() for line in sdp.audio.lines()].count(True), 1)
+            self.assertFalse(sdp.video.is_modified())
+
+    def test_remove_codec_with_rtx(self):
+        sdp = self.parse()
+        sdp.video.add_application_line("rtpmap:98 H264/90000", 10)
+        sdp.video.media_description_line.formats = ["96", "97", "98"]
+        sdp.video.reindex()
+        sdp.video.remove_codec(96)
+        self.assertEqual(sdp.video.media_description_line.formats, [98])
+        self.assertEqual(sdp.video.attribute_lines("rtcp-fb"), [])
+        self.assertEqual(sdp.video.attribute_lines("fmtp"), [])
+
+    def test_retain_formats(self):
+        sdp = self.parse()
+        sdp.audio.retain_formats([0, "8", "13"])
+        self.assertEqual(sdp.audio.media_description_line.formats, [0, 8])
+        # (126 is a generic rtpmap line)
+        self.assertEqual(len(sdp.audio.attribute_lines("rtpmap")), 2)
+        self.assertEqual([codec.encoding_name for codec in sdp.audio.codecs], ["PCMU", "PCMA"])
+        self.assertRaises(ValueError, sdp.audio.retain_formats, ["13"])
+        self.assertEqual(sdp.audio.media_description_line.formats, [0, 8])
+
+    def test_set_direction(self):
+        sdp = self.parse()
+        sdp.video.set_direction("sendonly")
+        sdp.audio.set_direction("sendrecv")
+        self.assertEqual(sdp.video.direction, "sendonly")
+        self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer.replace("a=recvonly", "a=sendonly"))
+        self.assertFalse(sdp.audio.is_modified())
+        sdp.set_direction("inactive")
+        self.assertEqual(sdp.audio.direction, "inactive")
+        self.assertEqual(sdp.to_sdp().count("a=inactive"), 2)
+        self.assertRaises(ValueError, sdp.audio.set_direction, "both")
+
+    def test_set_direction_with_data_channel(self):
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(SampleData.data_channel_offer, engine=engine)
+            data = sdp.media_sections[2]
+            self.assertTrue(sdp.audio.is_rtp)
+            self.assertFalse(data.is_rtp)
+            sdp.set_direction("sendonly")
+            self.assertEqual([section.direction for section in sdp.media_sections], ["sendonly", "sendonly", None])
+            self.assertFalse(data.is_modified())
+            self.assertTrue(sdp.to_sdp().endswith(SampleData.data_channel_offer[SampleData.data_channel_offer.index("m=application"):]))
+            self.assertRaises(ValueError, data.set_direction, "sendonly")
+            self.assertNotIn("a=sendonly", data.to_sdp())
+
+    def test_set_direction_without_direction_line(self):
+        sdp = objects.Sdp(self.without_lines(SampleData.webrtc_offer, "a=recvonly"), engine="fast")
+        sdp.video.set_direction("recvonly")
+        self.assertEqual(sdp.video.direction, "recvonly")
+        self.assertTrue(sdp.to_sdp().endswith("a=ssrc:632943048 cname:4TOk42mSjXCkVIa6\na=recvonly\n"))
+
+    def test_set_connection(self):
+        sdp = self.parse()
+        sdp.set_connection("198.51.100.7")
+        self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer.replace("c=IN IP4 0.0.0.0", "c=IN IP4 198.51.100.7"))
+        sdp.audio.set_connection("2001:db8::1")
+        self.assertEqual(sdp.audio.connection_information_line.to_sdp(), "c=IN IP6 2001:db8::1")
+        sdp.audio.set_port(5004)
+        self.assertEqual(sdp.to_sdp().count("m=audio 5004 UDP/TLS/RTP/SAVPF 111 "), 1)
+
+    def test_add_connection_line(self):
+        sdp = objects.Sdp(self.without_lines(SampleData.webrtc_offer, "c=IN IP4 0.0.0.0", "c=IN IP4 0.0.0.0"), engine="fast")
+        sdp.set_connection("198.51.100.7")
+        self.assertIn("s=-\nc=IN IP4 198.51.100.7\nt=0 0", sdp.to_sdp())
+
+    def test_remove_attribute(self):
+        sdp = self.parse()
+        self.assertEqual(sdp.remove_attribute("ssrc"), 4)
+        self.assertEqual(sdp.ssrc_index, {})
+        self.assertEqual(sdp.video.remove_attribute("ssrc"), 0)
+        self.assertNotIn("a=ssrc:", sdp.to_sdp())
+
+    def test_frozen(self):
+        sdp = self.parse()
+        sdp.freeze()
+        self.assertRaises(AttributeError, sdp.audio.remove_codec, 111)
+        self.assertRaises(AttributeError, sdp.set_direction, "inactive")
+        self.assertRaises(AttributeError, sdp.remove_attribute, "ssrc")
+        self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+
+class TestClone(unittest.TestCase):
+    def test_clone_shares_lines(self):
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine)
+            clone = sdp.clone()
+            self.assertFalse(sdp.is_frozen())
+            self.assertFalse(clone.is_frozen())
+            self.assertIsNot(clone.audio, sdp.audio)
+            self.assertEqual(clone.to_sdp(), SampleData.webrtc_offer)
+            self.assertEqual(clone.audio.codec(111), sdp.audio.codec(111))
+            self.assertEqual(clone.audio.mid, "audio")
+            # Writing the sdps out and looking things up doesn't copy any lines
+            for line_name in ["media_description_line", "connection_information_line", "application_lines"]:
+                self.assertIs(clone.audio.peek(line_name), sdp.audio.peek(line_name))
+            # Getting a line does, whichever sdp it's got from
+            self.assertIsNot(clone.audio.media_description_line, sdp.audio.media_description_line)
+            self.assertFalse(sdp.audio.media_description_line.is_frozen())
+            self.assertIsNot(clone.audio.rtpmap(111), sdp.audio.rtpmap(111))
+            self.assertIs(clone.audio.rtpmap(111), clone.audio.attribute_lines("rtpmap")[0]._sub_line)
+            self.assertIn(clone.audio.attribute_lines("rtpmap")[0], clone.audio.application_lines.sub_lines)
+            self.assertNotIn(clone.audio.attribute_lines("rtpmap")[0], sdp.audio.application_lines.sub_lines)
+
+    def test_changing_a_clone(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        first = sdp.clone()
+        second = sdp.clone()
+        first.audio.remove_codec(111)
+        first.set_connection("198.51.100.7")
+        second.video.set_direction("inactive")
+        second.audio.set_port(5004)
+        self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+        self.assertEqual(sdp.audio.media_description_line.formats[0], 111)
+        self.assertIn("SAVPF 103 9 0", first.to_sdp())
+        self.assertIn("c=IN IP4 198.51.100.7", first.to_sdp())
+        self.assertNotIn("a=inactive", first.to_sdp())
+        self.assertEqual(second.to_sdp(), SampleData.webrtc_offer.replace("a=recvonly", "a=inactive").replace(
+            "m=audio 9 ", "m=audio 5004 "))
+        # Only the lines that were got were copied
+        self.assertIs(second.audio.peek("connection_information_line"), sdp.audio.peek("connection_information_line"))
+        self.assertIs(second.session_section.peek("originator_line"), sdp.session_section.peek("originator_line"))
+
+    def test_changing_the_original(self):
+        # Fan an offer out, then keep using the offer
+        for lazy in [False, True]:
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=lazy)
+            clone = sdp.clone()
+            sdp.audio.set_port(5004)
+            sdp.video.set_direction("inactive")
+            sdp.audio.remove_codec(111)
+            sdp.audio.add_application_line("a=ptime:20")
+            sdp.set_connection("198.51.100.7")
+            self.assertEqual(clone.to_sdp(), SampleData.webrtc_offer)
+            self.assertIn("m=audio 5004 UDP/TLS/RTP/SAVPF 103 9 0 8 126", sdp.to_sdp())
+            self.assertIn("a=inactive", sdp.to_sdp())
+            self.assertIn("a=ptime:20", sdp.to_sdp())
+            self.assertIn("c=IN IP4 198.51.100.7", sdp.to_sdp())
+            # Lines can be changed directly too, and their lists are copied along with them
+            sdp.video.media_description_line.port = 5006
+            clone.video.media_description_line.formats.append(98)
+            clone.audio.rtpmap(103).rtpmap_codec_info.clock_rate = 32000
+            self.assertIn("m=video 5006 ", sdp.to_sdp())
+            self.assertIn("m=video 9 ", clone.to_sdp())
+            self.assertEqual(sdp.video.media_description_line.formats, [96, 97])
+            self.assertIn("a=rtpmap:103 ISAC/32000", clone.to_sdp())
+            self.assertIn("a=rtpmap:103 ISAC/16000", sdp.to_sdp())
+            # Cloning again shares the lines that were changed since
+            again = sdp.clone()
+            sdp.video.media_description_line.port = 5008
+            self.assertIn("m=video 5006 ", again.to_sdp())
+            self.assertIn("m=video 5008 ", sdp.to_sdp())
+
+    def test_own_line(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        clone = sdp.clone()
+        clone.audio.own_line("media_description_line").port = "5004"
+        self.assertEqual(clone.audio.media_description_line.to_sdp(), "m=audio 5004 UDP/TLS/RTP/SAVPF 111 103 9 0 8 126")
+        self.assertEqual(sdp.audio.media_description_line.port, 9)
+
+    def test_clone_of_a_clone(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        clone = sdp.clone()
+        clone.audio.set_port(5004)
+        second = clone.clone()
+        second.audio.set_port(5006)
+        self.assertFalse(clone.is_frozen())
+        self.assertIn("m=audio 5004 ", clone.to_sdp())
+        self.assertIn("m=audio 5006 ", second.to_sdp())
+
+    def test_clone_lazy(self):
+        for sdp in [objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=True),
+                    objects.Sdp.from_buffer(SampleData.webrtc_offer.encode("ascii"))]:
+            sdp.audio
+            clone = sdp.clone()
+            clone.video.set_direction("inactive")
+            clone.audio.remove_codec(111)
+            self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+            self.assertFalse(sdp.video.is_frozen())
+            self.assertIn("a=inactive", clone.to_sdp())
+            self.assertIn("SAVPF 103 9 0", clone.to_sdp())
+
+# (Without async syntax, so that this module still imports on python 2)
+@unittest.skipIf(sys.version_info < (3, 6), "asyncio parsing needs python 3.6+")
+class TestParseAsync(unittest.TestCase):
+    def setUp(self):
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_async(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def collect(self, async_iterator):
+        items = []
+        while True:
+            try:
+                items.append(self.run_async(async_iterator.__anext__()))
+            except StopAsyncIteration:
+                return items
+
+    def test_parse_async(self):
+        from SdpAsync import AsyncParser
+        for parser in [None, AsyncParser(inline_max_bytes=0), AsyncParser(inline_max_bytes=100000)]:
+            sdp = self.run_async(objects.Sdp.parse_async(SampleData.webrtc_offer, engine="fast", parser=parser))
+            self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+        sdp = self.run_async(objects.Sdp.parse_async(SampleData.webrtc_offer, engine="fast", lazy=True))
+        self.assertIsInstance(sdp.media_sections, objects.LazyMediaSections)
+
+    def test_parse_async_error(self):
+        self.assertRaises(Exception, self.run_async, objects.Sdp.parse_async("x" * 2000, engine="fast"))
+
+    def test_parse_async_options(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from SdpAsync import AsyncParser
+        limits = SdpValidation.Limits(max_media_sections=1)
+        with ProcessPoolExecutor(1) as executor:
+            # Inline, on the default executor's threads and on processes
+            for parser in [AsyncParser(inline_max_bytes=100000), AsyncParser(inline_max_bytes=0),
+                           AsyncParser(executor, inline_max_bytes=0)]:
+                with self.assertRaises(SdpValidation.ValidationError) as raised:
+                    self.run_async(objects.Sdp.parse_async(SampleData.webrtc_offer, engine="fast", parser=parser,
+                                                           limits=limits))
+                self.assertEqual(raised.exception.reason, SdpValidation.TOO_MANY_MEDIA_SECTIONS)
+                sdp = self.run_async(objects.Sdp.parse_async(SampleData.webrtc_offer, engine="fast", parser=parser,
+                                                             limits=SdpValidation.Limits(), include_media={"audio"},
+                                                             include_attributes={"rtpmap"}))
+                self.assertEqual(sdp.projection.include_media, frozenset(["audio"]))
+                self.assertIsNone(sdp.media_sections.parsed_sections[1])
+                self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+
+    def test_parse_stream_options(self):
+        from SdpAsync import parse_stream_async
+        stream = parse_stream_async([SampleData.webrtc_offer] * 2, engine="fast", include_attributes=())
+        for sdp in self.collect(stream):
+            self.assertIsNone(sdp.audio.codec(111))
+            self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+
+    def test_parse_async_processes(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from SdpAsync import AsyncParser
+        with ProcessPoolExecutor(1) as executor:
+            parser = AsyncParser(executor, inline_max_bytes=0)
+            sdp = self.run_async(objects.Sdp.parse_async(SampleData.webrtc_offer, engine="fast", parser=parser))
+        self.assertEqual(sdp.audio.codec(111).encoding_name, "opus")
+
+    def test_parse_stream(self):
+        import asyncio
+        from SdpAsync import AsyncParser, parse_stream_async
+        sdp_strings = [SampleData.webrtc_offer, SampleData.webrtc_offer.replace("a=recvonly", "a=inactive")] * 5
+        read = []
+        def source():
+            for sdp_string in sdp_strings:
+                read.append(sdp_string)
+                yield sdp_string
+        stream = parse_stream_async(source(), engine="fast", parser=AsyncParser(max_concurrency=2))
+        # Only as far ahead as max_concurrency allows
+        first = self.run_async(stream.__anext__())
+        self.assertEqual(first.to_sdp(), SampleData.webrtc_offer)
+        self.assertLessEqual(len(read), 3)
+        sdps = [first] + self.collect(stream)
+        self.assertEqual([sdp.to_sdp() for sdp in sdps], sdp_strings)
+
+        class AsyncSource(object):
+            def __init__(self):
+                self.sdp_strings = iter(sdp_strings)
+
+            def __aiter__(self):
+                return self
+
+            def __anext__(self):
+                for sdp_string in self.sdp_strings:
+                    return asyncio.sleep(0, result=sdp_string)
+                raise StopAsyncIteration
+        sdps = self.collect(parse_stream_async(AsyncSource(), engine="fast").__aiter__())
+        self.assertEqual([sdp.to_sdp() for sdp in sdps], sdp_strings)
+
+    def test_parse_stream_error(self):
+        from SdpAsync import parse_stream_async
+        stream = parse_stream_async([SampleData.webrtc_offer, "x" * 2000, SampleData.webrtc_offer], engine="fast")
+        self.assertEqual(self.run_async(stream.__anext__()).to_sdp(), SampleData.webrtc_offer)
+        self.assertRaises(Exception, self.run_async, stream.__anext__())
+
+class TestInterning(unittest.TestCase):
+    def setUp(self):
+        SdpIntern.track_stats()
+
+    def tearDown(self):
+        SdpIntern.track_stats(False)
+
+    def test_shared_values(self):
+        for engine in ["pyparsing", "fast"]:
+            first = objects.Sdp(SampleData.webrtc_offer, engine=engine)
+            second = objects.Sdp(SampleData.webrtc_offer.replace("127.0.0.1", "127.0.0.2"), engine=engine)
+            for section in ["audio", "video"]:
+                first_line, second_line = [getattr(sdp, section).media_description_line for sdp in [first, second]]
+                self.assertIs(first_line.proto, second_line.proto)
+                self.assertIs(first_line.media_type, second_line.media_type)
+            self.assertIs(first.audio.codec(111).encoding_name, second.audio.codec(111).encoding_name)
+            self.assertIs(first.audio.fmtp(111).parameters, second.audio.fmtp(111).parameters)
+            self.assertIs(first.audio.attribute_lines("rtcp-mux")[0].to_sdp(), second.audio.attribute_lines("rtcp-mux")[0].to_sdp())
+            self.assertEqual(second.session_section.originator_line.ip_addr, "127.0.0.2")
+        stats = SdpIntern.stats()
+        self.assertGreater(stats["tokens"]["hits"], 0)
+        self.assertGreater(stats["values"]["saved_bytes"], 0)
+
+    def test_numeric_fields(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast")
+        self.assertEqual(sdp.audio.media_description_line.port, 9)
+        self.assertEqual(sdp.audio.rtpmap(111).pt, 111)
+        self.assertEqual(sdp.audio.rtpmap("111").rtpmap_codec_info.clock_rate, 48000)
+        self.assertEqual(sdp.audio.find_codecs("opus", "48000"), sdp.audio.find_codecs("opus", 48000))
+        sdp.audio.media_description_line.port = "5004"
+        self.assertEqual(sdp.audio.media_description_line.port, 5004)
+        self.assertEqual(objects.to_int("*"), "*")
+        self.assertEqual(objects.to_int("9/2"), "9/2")
+
+    def test_bounded_pool(self):
+        pool = SdpIntern.InternPool(2, track_stats=True)
+        for value in ["a", "b", "c"]:
+            pool.intern(value)
+        pool.trim()
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(pool.stats()["resets"], 1)
+        first = "".join(["x", "y"])
+        self.assertIs(pool.intern(first), first)
+        self.assertIs(pool.intern("".join(["x", "y"])), first)
+        self.assertEqual(pool.stats()["hits"], 1)
+        disabled = SdpIntern.InternPool(0)
+        self.assertIsNot(disabled.intern("".join(["x", "y"])), first)
+
+class TestProjection(unittest.TestCase):
+    def test_include_attributes(self):
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine, include_attributes={"rtpmap", "mid"})
+            self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+            self.assertEqual([codec.encoding_name for codec in sdp.audio.codecs],
+                             ["opus", "ISAC", "G722", "PCMU", "PCMA", "telephone-event"])
+            self.assertEqual(sdp.audio.codec(111).parameters, {})
+            self.assertEqual(sdp.video.mid, "video")
+            app_lines = list(sdp.audio.application_lines)
+            self.assertEqual(len(app_lines), 20)
+            unparsed = [line for line in app_lines if isinstance(line, objects.UnparsedApplicationLine)]
+            self.assertEqual(len(unparsed), 13)
+            self.assertEqual(unparsed[0].to_sdp(), "a=rtcp:9 IN IP4 0.0.0.0")
+            self.assertEqual(sdp.audio.attribute_lines("sendrecv"), [unparsed[7]])
+            self.assertIsInstance(sdp.session_section.application_lines.sub_lines[0], objects.UnparsedApplicationLine)
+            self.assertEqual(sdp.ssrc_index, {})
+
+    def test_include_media(self):
+        for lazy in [False, True]:
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", lazy=lazy, include_media={"audio"})
+            self.assertEqual(sdp.media_sections.parsed_sections[1], None)
+            self.assertEqual(sdp.media_sections.parsed_sections[0] is None, lazy)
+            self.assertEqual(sdp.mid_index, {"audio": 0, "video": 1})
+            self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+            self.assertEqual(sdp.audio.mid, "audio")
+        # A section that's left out is still there if it's asked for
+        self.assertEqual(sdp.video.codec(96).encoding_name, "VP8")
+
+    def test_only_media_lines(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer.replace("\n", "\r\n"), engine="fast", include_attributes=())
+        self.assertEqual([section.media_description_line.formats for section in sdp.by_media_type("video")], [[96, 97]])
+        self.assertFalse(any(isinstance(line, objects.ApplicationLine)
+                             for section in [sdp.session_section] + list(sdp.media_sections) for line in section.lines()))
+        self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer.replace("\n", "\r\n"))
+
+    def test_munging(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", include_attributes={"rtpmap"})
+        sdp.remove_attribute("candidate")
+        self.assertEqual(sdp.remove_attribute("ssrc"), 4)
+        sdp.audio.retain_formats([0, 8])
+        sdp.set_direction("sendonly")
+        res = sdp.to_sdp()
+        self.assertNotIn("a=ssrc:", res)
+        self.assertNotIn("a=fmtp:111", res)
+        self.assertNotIn("a=rtcp-fb:111", res)
+        self.assertNotIn("a=sendrecv", res)
+        self.assertIn("a=sendonly\n", res)
+        self.assertIn("a=rtpmap:0 PCMU/8000\na=rtpmap:8 PCMA/8000\n", res)
+
+    def test_reparse_and_pickle(self):
+        sdp = objects.Sdp(SampleData.webrtc_offer, engine="fast", include_media={"video"}, include_attributes={"mid"})
+        new_sdp = sdp.reparse(SampleData.webrtc_offer.replace("a=recvonly", "a=inactive"))
+        self.assertEqual(new_sdp.changes.media_sections, [1])
+        self.assertIsInstance(new_sdp.video.application_lines.sub_lines[6], objects.UnparsedApplicationLine)
+        copy = pickle.loads(pickle.dumps(sdp.clone(), pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy.to_sdp(), SampleData.webrtc_offer)
+        self.assertIsNone(copy.media_sections.parsed_sections[0])
+        self.assertEqual(copy.audio.application_lines.sub_lines[6].to_sdp(), "a=mid:audio")
+        self.assertIsInstance(copy.audio.application_lines.sub_lines[0], objects.UnparsedApplicationLine)
+
+class TestPrescan(unittest.TestCase):
+    def assertRejected(self, sdp_str, reason, line_number=None, limits=None):
+        try:
+            SdpValidation.prescan(sdp_str, limits)
+        except SdpValidation.ValidationError as e:
+            self.assertEqual(e.reason, reason)
+            self.assertEqual(e.line_number, line_number)
+            return e
+        self.fail("%s wasn't rejected" % reason)
+
+    def test_pickle(self):
+        line_number = SampleData.webrtc_offer.count("\n") + 1
+        e = self.assertRejected(SampleData.webrtc_offer + "junk\n", SdpValidation.MALFORMED_LINE, line_number)
+        copy = pickle.loads(pickle.dumps(e))
+        self.assertEqual((copy.reason, str(copy), copy.line_number), (e.reason, str(e), line_number))
+        e = self.assertRejected(SampleData.webrtc_offer, SdpValidation.TOO_LARGE, limits=SdpValidation.Limits(max_bytes=10))
+        copy = pickle.loads(pickle.dumps(e))
+        self.assertEqual((copy.limit, copy.value), (10, len(SampleData.webrtc_offer)))
+
+    def test_valid(self):
+        crlf_offer = SampleData.webrtc_offer.replace("\n", "\r\n")
+        for sdp_str in [SampleData.webrtc_offer, crlf_offer, crlf_offer.rstrip("\r\n"), crlf_offer + "\r\n  \r\n",
+                        # Repeated time descriptions, and everything the session section can have
+                        "v=0\no=- 1 2 IN IP4 127.0.0.1\ns=-\ni=x\nu=x\ne=x\ne=y\np=x\nc=IN IP4 0.0.0.0\nb=AS:1\n"
+                        "t=0 0\nr=1 1 0\nr=2 1 0\nt=1 1\nz=0 0\nk=prompt\na=x\nm=audio 9 RTP/AVP 0\ni=x\n"
+                        "c=IN IP4 0.0.0.0\nc=IN IP4 0.0.0.1\nb=AS:1\nk=prompt\na=x\n"]:
+            SdpValidation.prescan(sdp_str)
+
+    def test_limits(self):
+        limits = SdpValidation.Limits(max_bytes=2000, max_lines=40, max_media_sections=1, max_line_length=100)
+        e = self.assertRejected(SampleData.webrtc_offer + "a=x\n" * 200, SdpValidation.TOO_LARGE, limits=limits)
+        self.assertEqual((e.limit, e.value), (2000, len(SampleData.webrtc_offer) + 800))
+        limits.max_bytes = None
+        self.assertRejected(SampleData.webrtc_offer, SdpValidation.TOO_MANY_LINES, limits=limits)
+        limits.max_lines = None
+        self.assertRejected(SampleData.webrtc_offer, SdpValidation.TOO_MANY_MEDIA_SECTIONS, limits=limits)
+        limits.max_media_sections = None
+        e = self.assertRejected(SampleData.webrtc_offer, SdpValidation.LINE_TOO_LONG, 13, limits=limits)
+        self.assertTrue(str(e).startswith("Line 13 ('a=fingerprint:sha-256 49:66:12:17:0D:1C:...') is 117 characters"))
+        limits.max_line_length = None
+        SdpValidation.prescan(SampleData.webrtc_offer, limits)
+        # (The line ending doesn't count)
+        SdpValidation.prescan(SampleData.webrtc_offer.replace("\n", "\r\n"), SdpValidation.Limits(max_line_length=117))
+        self.assertRejected("v=0\r\n" + "a" * 11 + "\r\n", SdpValidation.LINE_TOO_LONG, 2,
+                            SdpValidation.Limits(max_line_length=10))
+
+    def test_malformed(self):
+        self.assertRejected("\x00\x01\x02junk", SdpValidation.MALFORMED_LINE, 1)
+        self.assertRejected(SampleData.webrtc_offer + "junk\n", SdpValidation.MALFORMED_LINE, 47)
+        self.assertRejected(SampleData.webrtc_offer.replace("a=mid:audio", " a=mid:audio"), SdpValidation.MALFORMED_LINE, 15)
+        self.assertRejected(SampleData.webrtc_offer + "x=1\n", SdpValidation.UNKNOWN_LINE_TYPE, 47)
+
+    def test_order(self):
+        offer = SampleData.webrtc_offer
+        self.assertRejected(offer.replace("s=-\n", "").replace("t=0 0\n", "t=0 0\ns=-\n"), SdpValidation.OUT_OF_ORDER, 4)
+        self.assertRejected(offer.replace("a=mid:audio", "v=0"), SdpValidation.OUT_OF_ORDER, 15)
+        self.assertRejected(offer.replace("t=0 0\n", "r=1 1 0\nt=0 0\n"), SdpValidation.OUT_OF_ORDER, 4)
+        self.assertRejected(offer.replace("o=", "v=0\no=", 1), SdpValidation.OUT_OF_ORDER, 2)
+        self.assertRejected(offer.replace("t=0 0\n", ""), SdpValidation.MISSING_LINE, 6)
+        self.assertRejected("v=0\no=- 1 2 IN IP4 127.0.0.1\ns=-\n", SdpValidation.MISSING_LINE, 4)
+        self.assertRejected("", SdpValidation.MISSING_LINE, 1)
+
+    def test_parse_with_limits(self):
+        limits = SdpValidation.Limits(max_media_sections=1)
+        for engine in ["pyparsing", "fast"]:
+            self.assertRaises(SdpValidation.ValidationError, objects.Sdp, SampleData.webrtc_offer, engine=engine, limits=limits)
+            self.assertRaises(ValueError, objects.Sdp, SampleData.webrtc_offer + "junk\n", engine=engine,
+                              limits=SdpValidation.default_limits)
+            sdp = objects.Sdp(SampleData.webrtc_offer, engine=engine, limits=SdpValidation.default_limits)
+            self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+
+class FramerateApplicationLine(objects.PyParsedLine):
+    __slots__ = ("framerate",)
+    attribute_name = "framerate"
+    sdp_format = "framerate:{0.framerate}"
+
+class TestAttributeRegistry(unittest.TestCase):
+    framerate_grammar = grammar.Suppress(grammar.Literal("framerate:")) + grammar.Word(grammar.nums + ".")("FRAMERATE")
+
+    def tearDown(self):
+        grammar.application_line_attributes.pop("framerate", None)
+        fast.value_attribute_parsers.pop("framerate", None)
+        objects.SdpObjectMapping.pop("FRAMERATE_APPLICATION_LINE", None)
+        del objects.pending_attribute_grammars[:]
+
+    def parse_both(self, line_str):
+        pyparsing_obj = objects.ApplicationLine(grammar.application_line.parseString(line_str)[0])
+        fast_obj = objects.ApplicationLine(fast.parse_application_line(line_str))
+        self.assertEqual(object_to_data(pyparsing_obj), object_to_data(fast_obj))
+        return fast_obj
+
+    def test_register_attribute(self):
+        self.assertTrue(hasattr(self.parse_both("a=framerate:29.97"), "generic_application_line"))
+        objects.register_attribute("framerate", self.framerate_grammar, FramerateApplicationLine)
+        app_line = self.parse_both("a=framerate:29.97")
+        self.assertEqual(app_line.framerate_application_line.framerate, "29.97")
+        self.assertEqual(app_line.attribute_name, "framerate")
+        app_line.framerate_application_line.framerate = "30"
+        self.assertEqual(app_line.format_sdp(), "a=framerate:30")
+        # A value that doesn't fit is still a generic line
+        self.assertTrue(hasattr(self.parse_both("a=framerate:fast"), "generic_application_line"))
+
+        sdp_str = SampleData.webrtc_offer.replace("a=mid:video", "a=mid:video\na=framerate:30")
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(sdp_str, engine=engine)
+            self.assertEqual(sdp.video.attribute_lines("framerate")[0].framerate_application_line.framerate, "30")
+            self.assertEqual(sdp.to_sdp(), sdp_str)
+
+    def test_register_attribute_with_fast_parser(self):
+        def parse_framerate(value):
+            return {"FRAMERATE": value.strip()} if value.strip() else None
+        objects.register_attribute("framerate", self.framerate_grammar, FramerateApplicationLine, fast_parser=parse_framerate)
+        self.assertEqual(self.parse_both("a=framerate:25").framerate_application_line.framerate, "25")
+        self.assertTrue(hasattr(self.parse_both("a=framerate:"), "generic_application_line"))
+
+    def test_register_attribute_does_not_import_pyparsing(self):
+        # (utest imports the grammar, so the line class is defined again here)
+        code = "\n".join(["import sys, Sdp",
+                          "class FramerateApplicationLine(Sdp.PyParsedLine):",
+                          "    __slots__ = ('framerate',)",
+                          "    attribute_name = 'framerate'",
+                          "    sdp_format = 'framerate:{0.framerate}'",
+                          "def framerate_grammar(grammar):",
+                          "    return grammar.Suppress(grammar.Literal('framerate:')) + grammar.Word(grammar.nums + '.')('FRAMERATE')",
+                          "Sdp.register_attribute('framerate', framerate_grammar, FramerateApplicationLine,",
+                          "                       fast_parser=lambda value: {'FRAMERATE': value})",
+                          "sdp = Sdp.Sdp(sys.stdin.read(), engine='fast')",
+                          "assert sdp.video.attribute_lines('framerate')[0].framerate_application_line.framerate == '30'",
+                          "assert 'pyparsing' not in sys.modules",
+                          "sdp = Sdp.Sdp(sdp.to_sdp(), engine='pyparsing')",
+                          "assert sdp.video.attribute_lines('framerate')[0].framerate_application_line.framerate == '30'"])
+        proc = subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        proc.communicate(SampleData.webrtc_offer.replace("a=mid:video", "a=mid:video\na=framerate:30").encode("ascii"))
+        self.assertEqual(proc.returncode, 0)
+
+def media_types(sdp):
+    return [section.media_description_line.media_type for section in sdp.media_sections]
+
+class TestParseMany(unittest.TestCase):
+    sdp_strs = [SampleData.webrtc_offer,
+                "v=0\no=- 1 2 IN IP4\ns=-\nt=0 0\n",
+                SampleData.webrtc_offer.split("m=video")[0]]
+
+    def test_parse_many(self):
+        results = list(parse_many(self.sdp_strs, workers=2, chunksize=1, engine="fast"))
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0].value.to_sdp(), SampleData.webrtc_offer)
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].value)
+        self.assertTrue(results[1].error.startswith("ValueError"))
+        self.assertEqual(len(results[2].value.media_sections), 1)
+
+    def test_transform(self):
+        for workers in [0, 2]:
+            results = list(parse_many(self.sdp_strs, workers=workers, engine="fast", transform=media_types))
+            self.assertEqual([result.value for result in results], [["audio", "video"], None, ["audio"]])
+
+    def test_lazy_pyparsing_sdps(self):
+        results = list(parse_many(self.sdp_strs[:1], workers=1, lazy=True))
+        self.assertEqual(results[0].value.video.mid, "video")
+
+class TestIterSections(unittest.TestCase):
+    def test_iter_sections(self):
+        for engine in ["pyparsing", "fast"]:
+            for lines in [io.StringIO(SampleData.webrtc_offer.decode("ascii") if str is bytes else SampleData.webrtc_offer),
+                          io.BytesIO(SampleData.webrtc_offer.encode("ascii"))]:
+                sections = list(objects.iter_sections(lines, engine=engine))
+                self.assertEqual([type(section) for section in sections],
+                                 [objects.SessionSection, objects.MediaSection, objects.MediaSection])
+                self.assertEqual(sections[2].mid, "video")
+                self.assertEqual("".join(section.to_sdp() for section in sections), SampleData.webrtc_offer)
+
+    def test_lines_without_line_endings(self):
+        sections = list(objects.iter_sections(SampleData.webrtc_offer.splitlines(), engine="fast"))
+        self.assertEqual("".join(section.to_sdp() for section in sections), SampleData.webrtc_offer.replace("\n", "\r\n"))
+
+    def test_sections_are_yielded_as_they_are_read(self):
+        lines = SampleData.webrtc_offer.splitlines(True)
+        read = []
+        def read_lines():
+            for line in lines:
+                read.append(line)
+                yield line
+        sections = objects.iter_sections(read_lines(), engine="fast")
+        session_section = next(sections)
+        self.assertTrue(read[-1].startswith("m=audio"))
+        self.assertEqual(session_section.version_line.version_number, "0")
+        audio = next(sections)
+        self.assertTrue(read[-1].startswith("m=video"))
+        self.assertEqual(audio.mid, "audio")
+
+class TestFromBuffer(unittest.TestCase):
+    def test_buffer_types(self):
+        data = SampleData.webrtc_offer.encode("ascii")
+        for engine in ["pyparsing", "fast"]:
+            for buffer in [data, bytearray(data), memoryview(data), memoryview(b"xx" + data)[2:]]:
+                sdp = objects.Sdp.from_buffer(buffer, engine=engine)
+                self.assertEqual(object_to_data(sdp), object_to_data(objects.Sdp(SampleData.webrtc_offer, engine=engine)))
+                self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+
+    def test_mmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(SampleData.webrtc_offer.encode("ascii"))
+            f.flush()
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                sdp = objects.Sdp.from_buffer(buffer, engine="fast")
+                self.assertEqual(sdp.session_section.originator_line.ip_addr, "127.0.0.1")
+                self.assertEqual(sdp.video.media_description_line.formats, [96, 97])
+                self.assertEqual(sdp.to_sdp(), SampleData.webrtc_offer)
+            finally:
+                buffer.close()
+
+    def test_sections_are_decoded_on_access(self):
+        sdp = objects.Sdp.from_buffer(SampleData.webrtc_offer.encode("ascii"), engine="fast")
+        self.assertIsInstance(sdp.media_sections, objects.BufferMediaSections)
+        self.assertEqual(sdp.mid_index, {"audio": 0, "video": 1})
+        self.assertEqual(sdp.media_sections.parsed_sections, [None, None])
+        self.assertEqual(sdp.by_mid("video").direction, "recvonly")
+        self.assertIsNone(sdp.media_sections.parsed_sections[0])
+
+class TestScan(unittest.TestCase):
+    offer = SampleData.webrtc_offer.replace("\n", "\r\n")
+    bad_body = "v=0\r\no=- 1 2 IN IP4\r\ns=-\r\nt=0 0\r\n"
+    invite = "INVITE sip:bob@example.com SIP/2.0\r\nContent-Type: application/sdp\r\nContent-Length: %d\r\n\r\n"
+    ok = "SIP/2.0 200 OK\r\nContent-Length: 0\r\n\r\n"
+
+    def build_log(self):
+        # Bodies at the start of the file, in SIP messages, back to back, after a log line and at the very end
+        #  (without a line ending)
+        parts = [self.offer, self.ok, self.invite % len(self.offer), self.offer, self.offer,
+                 "12:00:00 INFO something happened\n", self.invite % len(self.bad_body), self.bad_body, self.ok,
+                 SampleData.webrtc_offer.rstrip("\n")]
+        bodies = [self.offer, self.offer, self.offer, self.bad_body, SampleData.webrtc_offer.rstrip("\n")]
+        return "".join(parts).encode("ascii"), bodies
+
+    def test_find_bodies(self):
+        data, bodies = self.build_log()
+        spans = list(SdpScan.find_bodies(data))
+        self.assertEqual([data[start:end].decode("ascii") for start, end in spans], bodies)
+        # However the buffer is split up, each body is found once
+        for chunk_size in [1, 7, 100, 1000]:
+            chunked = [span for start in range(0, len(data), chunk_size)
+                       for span in SdpScan.find_bodies(data, start, min(start + chunk_size, len(data)))]
+            self.assertEqual(chunked, spans)
+
+    def write_log(self):
+        data, bodies = self.build_log()
+        f = tempfile.NamedTemporaryFile(suffix=".log", delete=False)
+        with f:
+            f.write(data)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_scan(self):
+        path = self.write_log()
+        for workers in [0, 2]:
+            stats = SdpScan.scan([path], workers=workers, chunk_size=100)
+            self.assertEqual((stats.files, stats.sdps, stats.failures), (1, 4, 1))
+            self.assertEqual(dict(stats.failure_types), {"ValueError": 1})
+            self.assertEqual(stats.failure_examples[0][:2], (path, self.build_log()[0].index(self.bad_body.encode("ascii"))))
+            self.assertEqual(dict(stats.media_section_counts), {2: 4})
+            self.assertEqual(dict(stats.directions), {"sendrecv": 4, "recvonly": 4})
+            self.assertEqual(stats.codecs["opus/48000/2"], 4)
+            self.assertEqual(stats.codecs["telephone-event/8000"], 4)
+            self.assertEqual(stats.codecs["rtx/90000"], 4)
+
+    def test_command_line(self):
+        path = self.write_log()
+        output = subprocess.check_output([sys.executable, "-m", "sdpy", "scan", "--workers", "0", "--json", path],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        report = json.loads(output.decode("utf-8"))
+        self.assertEqual((report["sdps"], report["failures"]), (4, 1))
+        self.assertEqual(report["media_types"], {"audio": 4, "video": 4})
+
+    @unittest.skipIf(sys.version_info < (3, 4), "assertLogs needs python 3.4+")
+    def test_missing_fields_are_logged(self):
+        # And not printed, which would get in the way of the report
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            with self.assertLogs("Sdp", "DEBUG") as logs:
+                objects.Sdp(SampleData.webrtc_offer, engine="fast")
+            self.assertEqual(sys.stdout.getvalue(), "")
+        finally:
+            sys.stdout = stdout
+        self.assertIn("DEBUG:Sdp:Field missing: BANDWIDTH_INFORMATION_LINES", logs.output)
+
+class TestCandidates(unittest.TestCase):
+    srflx_candidate = "a=candidate:842163049 1 udp 1677729535 198.51.100.23 46243 typ srflx raddr 192.168.0.196 rport 46243 generation 0 network-id 1"
+
+    def test_parse_candidate(self):
+        candidate = objects.parse_candidate(self.srflx_candidate)
+        self.assertIsInstance(candidate, objects.CandidateApplicationLine)
+        self.assertEqual([candidate.foundation, candidate.component, candidate.transport, candidate.priority],
+                         ["842163049", "1", "udp", "1677729535"])
+        self.assertEqual([candidate.address, candidate.port, candidate.type], ["198.51.100.23", 46243, "srflx"])
+        self.assertEqual([candidate.raddr, candidate.rport], ["192.168.0.196", 46243])
+        self.assertFalse(hasattr(candidate, "tcptype"))
+        self.assertEqual(candidate.extension("network-id"), "1")
+        self.assertIsNone(candidate.extension("ufrag"))
+        self.assertEqual(candidate.format_sdp(), self.srflx_candidate[2:])
+        # Without the a=, like in a trickled RTCIceCandidate
+        self.assertEqual(objects.parse_candidate(self.srflx_candidate[2:]).format_sdp(), self.srflx_candidate[2:])
+
+    def test_tcp_candidate(self):
+        candidate = objects.parse_candidate("candidate:434307887 1 tcp 1518280447 192.168.0.196 9 typ host tcptype active")
+        self.assertEqual(candidate.tcptype, "active")
+        candidate.port = "10"
+        self.assertEqual(candidate.format_sdp(), "candidate:434307887 1 tcp 1518280447 192.168.0.196 10 typ host tcptype active")
+
+    def test_invalid_candidates(self):
+        for line in ["a=candidate:1 1 udp 2130706431 10.0.0.1 5000 host",
+                     "a=candidate:1 1 udp 2130706431 10.0.0.1 port typ host",
+                     "a=rtpmap:111 opus/48000/2"]:
+            self.assertRaises(ValueError, objects.parse_candidate, line)
+
+    def test_candidates_in_sdp(self):
+        sdp_str = SampleData.webrtc_offer.replace("a=mid:audio", "a=mid:audio\n" + self.srflx_candidate)
+        for engine in ["pyparsing", "fast"]:
+            sdp = objects.Sdp(sdp_str, engine=engine)
+            app_line = sdp.audio.attribute_lines("candidate")[0]
+            self.assertEqual(app_line.candidate_application_line.raddr, "192.168.0.196")
+            self.assertEqual(sdp.to_sdp(), sdp_str)
+            # parse_candidate builds the same line
+            self.assertEqual(objects.parse_candidate(self.srflx_candidate).__getstate__(),
+                             app_line.candidate_application_line.__getstate__())
+
 if __name__ == '__main__':
     unittest.main()